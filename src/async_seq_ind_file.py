@@ -0,0 +1,234 @@
+import asyncio
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from record import GradesRecord
+from seq_ind_file import SeqIndFile
+from write_ahead_log import OPERATION_ADD, OPERATION_UPDATE, OPERATION_DELETE
+
+
+class AsyncSeqIndFile:
+    """Asyncio facade of sequential-indexed file, requests made in one iteration of event loop are served together by bounded pool of threads"""
+    def __init__(self, seq_ind_file: SeqIndFile, workers: typing.Optional[int] = None, max_pending: typing.Optional[int] = None):
+        self.seq_ind_file = seq_ind_file
+        workers = workers if workers is not None else seq_ind_file.config["ASYNC_WORKERS"]
+        max_pending = max_pending if max_pending is not None else seq_ind_file.config["ASYNC_MAX_PENDING"]
+        workers = workers if seq_ind_file.latches is not None else 1  # file which is not latched is used by one thread only
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="seq-ind-file")
+        self.pending = asyncio.Semaphore(max_pending)  # requests waiting for their result, callers wait once it is exhausted
+        self.batches: typing.List[typing.Union[typing.Dict[str, typing.List[asyncio.Future]], typing.List[typing.Tuple[int, typing.Union[GradesRecord, str], asyncio.Future]]]] = []  # runs of consecutive lookups and of consecutive writes in order they were made
+        self.tasks: typing.Set[asyncio.Task] = set()
+        self.last_write: typing.Optional[asyncio.Task] = None  # batches of writes are applied in order they were made
+        self.running_reads: typing.Set[asyncio.Task] = set()  # batches of lookups made after last batch of writes
+        self.dispatch_scheduled = False
+        self.read_batches = 0
+        self.write_batches = 0
+
+    async def get_record(self, key: str) -> typing.Optional[GradesRecord]:
+        """
+        Get record with matching key, lookups of the same key or of keys on the same main area page made in one
+        iteration of event loop with no write between them share a single page read
+        :param key: Key of record to be returned
+        :return: Record with matching key, None if there is no such record
+        """
+        async with self.pending:
+            future = asyncio.get_running_loop().create_future()
+            if not self.batches or not isinstance(self.batches[-1], dict):
+                self.batches.append({})
+            self.batches[-1].setdefault(key, []).append(future)
+            self.schedule_dispatch()
+            return await future
+
+    async def add_record(self, record: GradesRecord) -> None:
+        """
+        Add new record to file, additions made in one iteration of event loop are added as one batch
+        :param record: Record to be added
+        :return: None
+        """
+        await self.write(OPERATION_ADD, record)
+
+    async def update_record(self, new_record: GradesRecord) -> None:
+        """
+        Update record with key matching to new one
+        :param new_record: New record to replace the old one with matching key
+        :return: None
+        """
+        await self.write(OPERATION_UPDATE, new_record)
+
+    async def delete_record(self, key: str) -> None:
+        """
+        Delete record with matching key
+        :param key: Key of record to be deleted
+        :return: None
+        """
+        await self.write(OPERATION_DELETE, key)
+
+    async def scan(self, start_key: typing.Optional[str] = None, end_key: typing.Optional[str] = None, reverse: bool = False,
+                   limit: typing.Optional[int] = None) -> typing.List[GradesRecord]:
+        """
+        Get records with keys in range, range is read by a thread of pool once writes made before it are applied
+        :param start_key: Smallest key, None to start at the beginning of file
+        :param end_key: Greatest key, None to go to the end of file
+        :param reverse: Records in descending order of keys
+        :param limit: Maximum number of records, None for no limit
+        :return: Records ordered by key
+        """
+        async with self.pending:
+            self.dispatch()
+            return await self.start(self.run_scan(start_key, end_key, reverse, limit))
+
+    async def write(self, operation: int, record: typing.Union[GradesRecord, str]) -> None:
+        """
+        Queue write and wait until it is applied
+        :param operation: Operation of write
+        :param record: Record, key of deleted record
+        :return: None
+        """
+        async with self.pending:
+            future = asyncio.get_running_loop().create_future()
+            if not self.batches or not isinstance(self.batches[-1], list):
+                self.batches.append([])
+            self.batches[-1].append((operation, record, future))
+            self.schedule_dispatch()
+            await future
+
+    def schedule_dispatch(self) -> None:
+        """
+        Dispatch queued requests once callers running in current iteration of event loop queued theirs
+        :return: None
+        """
+        if not self.dispatch_scheduled:
+            self.dispatch_scheduled = True
+            asyncio.get_running_loop().call_soon(self.dispatch)
+
+    def dispatch(self) -> None:
+        """
+        Send queued runs of lookups and of writes to pool as one batch each, in order they were made
+        :return: None
+        """
+        self.dispatch_scheduled = False
+        batches, self.batches = self.batches, []
+        for batch in batches:
+            if isinstance(batch, dict):
+                self.start(self.run_reads(batch))
+            else:
+                self.start(self.run_writes(batch), write=True)
+
+    def start(self, awaitable: typing.Awaitable, write: bool = False) -> asyncio.Task:
+        """
+        Run batch as task once batches it has to follow finished, lookups follow last batch of writes and writes
+        follow every batch before them, reference to task is kept until it finishes
+        :param awaitable: Batch to run
+        :param write: Batch changes file
+        :return: Task of batch
+        """
+        previous = ([self.last_write] if self.last_write is not None else []) + (list(self.running_reads) if write else [])
+        task = asyncio.get_running_loop().create_task(self.run_after(previous, awaitable))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        if write:
+            self.last_write, self.running_reads = task, set()
+        else:
+            self.running_reads.add(task)
+            task.add_done_callback(self.running_reads.discard)
+        return task
+
+    @staticmethod
+    async def run_after(previous: typing.List[asyncio.Task], awaitable: typing.Awaitable) -> typing.Any:
+        """
+        Wait for batches to finish and run batch
+        :param previous: Batches to wait for
+        :param awaitable: Batch to run
+        :return: Result of batch
+        """
+        await asyncio.gather(*previous, return_exceptions=True)
+        return await awaitable
+
+    async def run_reads(self, reads: typing.Dict[str, typing.List[asyncio.Future]]) -> None:
+        """
+        Look up batch of keys in pool and resolve futures of their callers
+        :param reads: Futures waiting for every key
+        :return: None
+        """
+        self.read_batches += 1
+        try:
+            records = await asyncio.get_running_loop().run_in_executor(self.executor, self.seq_ind_file.get_records, list(reads))
+        except Exception as error:
+            records, failure = {}, error
+        else:
+            failure = None
+        for key, futures in reads.items():
+            for future in futures:
+                if future.done():
+                    continue
+                if failure is not None:
+                    future.set_exception(failure)
+                else:
+                    future.set_result(records[key])
+
+    async def run_scan(self, start_key: typing.Optional[str], end_key: typing.Optional[str], reverse: bool,
+                       limit: typing.Optional[int]) -> typing.List[GradesRecord]:
+        """
+        Read range of records in pool
+        :param start_key: Smallest key, None to start at the beginning of file
+        :param end_key: Greatest key, None to go to the end of file
+        :param reverse: Records in descending order of keys
+        :param limit: Maximum number of records, None for no limit
+        :return: Records ordered by key
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, lambda: list(self.seq_ind_file.scan(start_key, end_key, reverse=reverse, limit=limit)))
+
+    async def run_writes(self, writes: typing.List[typing.Tuple[int, typing.Union[GradesRecord, str], asyncio.Future]]) -> None:
+        """
+        Apply batch of writes in pool and resolve futures of their callers
+        :param writes: Writes in order they were made
+        :return: None
+        """
+        self.write_batches += 1
+        results = await asyncio.get_running_loop().run_in_executor(self.executor, self.apply_writes, writes)
+        for (_, _, future), error in zip(writes, results):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(None)
+
+    def apply_writes(self, writes: typing.List[typing.Tuple[int, typing.Union[GradesRecord, str], asyncio.Future]]) -> typing.List[typing.Optional[Exception]]:
+        """
+        Apply writes in order, consecutive additions are added with a single batched update of every page
+        :param writes: Writes in order they were made
+        :return: Error of every write, None if it succeeded
+        """
+        results, position = [], 0
+        while position < len(writes):
+            operation, record, _ = writes[position]
+            end = position + 1
+            if operation == OPERATION_ADD:
+                while end < len(writes) and writes[end][0] == OPERATION_ADD:
+                    end += 1
+            try:
+                if operation == OPERATION_ADD:
+                    self.seq_ind_file.add_records([record for _, record, _ in writes[position:end]])
+                elif operation == OPERATION_UPDATE:
+                    self.seq_ind_file.update_record(record)
+                else:
+                    self.seq_ind_file.delete_record(record)
+            except Exception as error:
+                results += [error] * (end - position)
+            else:
+                results += [None] * (end - position)
+            position = end
+        return results
+
+    async def close(self) -> None:
+        """
+        Wait for queued requests, close file and stop pool
+        :return: None
+        """
+        while self.tasks or self.batches:
+            if self.batches:
+                self.dispatch()
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        await asyncio.get_running_loop().run_in_executor(self.executor, self.seq_ind_file.close)
+        self.executor.shutdown()
@@ -0,0 +1,132 @@
+import threading
+import typing
+from record import GradesRecord
+
+
+class DeltaLog:
+    """Changes made to file while it is reorganized in background, kept in order and as latest state of every key"""
+    def __init__(self):
+        self.log: typing.List[typing.Tuple[str, typing.Optional[GradesRecord]]] = []
+        self.records: typing.Dict[str, typing.Optional[GradesRecord]] = {}
+
+    def __len__(self) -> int:
+        return len(self.log)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.records
+
+    def put(self, record: GradesRecord) -> None:
+        """
+        Log added or updated record
+        :param record: New state of record
+        :return: None
+        """
+        self.log.append((record.key, record))
+        self.records[record.key] = record
+
+    def delete(self, key: str) -> None:
+        """
+        Log deletion of record
+        :param key: Key of deleted record
+        :return: None
+        """
+        self.log.append((key, None))
+        self.records[key] = None
+
+    def get(self, key: str) -> typing.Optional[GradesRecord]:
+        """
+        Get logged state of record
+        :param key: Key of record
+        :return: Logged record, None if record was deleted or is not in log
+        """
+        return self.records.get(key)
+
+    def changes(self, start: int = 0, end: typing.Optional[int] = None) -> typing.List[typing.Tuple[str, typing.Optional[GradesRecord]]]:
+        """
+        Get logged changes in order they were made
+        :param start: Position of first change in log
+        :param end: Position after last change, None for end of log
+        :return: Key and new state of record, None for deleted records
+        """
+        return self.log[start:end]
+
+    def overlay(self, records: typing.Iterable[GradesRecord], start_key: typing.Optional[str], end_key: typing.Optional[str],
+                reverse: bool = False) -> typing.Generator[GradesRecord, None, None]:
+        """
+        Merge logged changes with records read from file, logged state of a key replaces all records with that key
+        :param records: Records ordered by key from file
+        :param start_key: Smallest key of range, None for no bound
+        :param end_key: Greatest key of range, None for no bound
+        :param reverse: Records are ordered by key descending
+        :return: Records ordered by key
+        """
+        changes = [(key, record) for key, record in sorted(self.records.items(), key=lambda change: change[0])
+                   if (start_key is None or key >= start_key) and (end_key is None or key <= end_key)]
+        if reverse:
+            changes.reverse()
+        position, replaced_key = 0, None
+        for record in records:
+            while position < len(changes) and (changes[position][0] >= record.key if reverse else changes[position][0] <= record.key):
+                replaced_key, change = changes[position]
+                position += 1
+                if change is not None:
+                    yield change
+            if record.key != replaced_key:
+                yield record
+        for _, change in changes[position:]:
+            if change is not None:
+                yield change
+
+
+class BackgroundReorganization:
+    """Reorganization running in worker thread, file it reads from is not modified until new files are swapped in"""
+    def __init__(self, build: typing.Callable[["BackgroundReorganization"], typing.Any]):
+        self.delta = DeltaLog()
+        self.lock = threading.Lock()  # guards reads of old file shared by worker and foreground operations
+        self.result = None
+        self.error: typing.Optional[BaseException] = None
+        self.thread = threading.Thread(target=self.run, args=(build,), daemon=True)
+        self.thread.start()
+
+    def run(self, build: typing.Callable[["BackgroundReorganization"], typing.Any]) -> None:
+        """
+        Build new files, error is kept to be raised in foreground
+        :param build: Function building new files
+        :return: None
+        """
+        try:
+            self.result = build(self)
+        except BaseException as error:
+            self.error = error
+
+    def done(self) -> bool:
+        """
+        Check if new files are built
+        :return: True if worker finished, False otherwise
+        """
+        return not self.thread.is_alive()
+
+    def wait(self) -> typing.Any:
+        """
+        Wait for worker to finish
+        :return: Result of build function
+        """
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def locked(self, iterator: typing.Iterable) -> typing.Generator:
+        """
+        Advance iterator reading old file only while holding lock
+        :param iterator: Iterator reading old file
+        :return: Items of iterator
+        """
+        iterator = iter(iterator)
+        while True:
+            with self.lock:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
@@ -0,0 +1,373 @@
+import argparse
+import bisect
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import typing
+from array import array
+from config import CONFIG, Config
+from record import GradesRecord
+from seq_ind_file import SeqIndFile
+
+SCAN_LENGTH = 100
+ZIPF_EXPONENT = 1.1
+PERCENTILES = {"p50": 0.5, "p99": 0.99, "p999": 0.999}
+REGRESSION_THRESHOLD = 0.1
+
+Operation = typing.Tuple[typing.Callable[[typing.Any], typing.Any], typing.Any]
+
+
+def key_of(number: int, config: Config) -> str:
+    """
+    Get key of record
+    :param number: Number of key
+    :param config: Settings of file
+    :return: Key padded to length of keys
+    """
+    return str(number).rjust(len(str(config["MAX_KEY"])), "0")
+
+
+def random_keys(count: int, rng: random.Random, config: Config) -> typing.List[str]:
+    """
+    Draw distinct keys uniformly from key space
+    :param count: Number of keys
+    :param rng: Source of randomness
+    :param config: Settings of file
+    :return: Keys in random order
+    """
+    if count > config["MAX_KEY"]:
+        raise ValueError(f"Scale {count} does not fit into key space of MAX_KEY {config['MAX_KEY']}")
+    return [key_of(number, config) for number in rng.sample(range(config["MAX_KEY"]), count)]
+
+
+def zipf_ranks(count: int, population: int, rng: random.Random) -> typing.Iterator[int]:
+    """
+    Draw ranks following Zipf distribution, rank 0 is the most frequent
+    :param count: Number of ranks
+    :param population: Number of distinct ranks
+    :param rng: Source of randomness
+    :return: Ranks
+    """
+    cumulative = list(itertools.accumulate(1 / (rank + 1) ** ZIPF_EXPONENT for rank in range(population)))
+    for _ in range(count):
+        yield bisect.bisect_left(cumulative, rng.random() * cumulative[-1])
+
+
+def uniform_insert(seq_ind_file: SeqIndFile, scale: int, rng: random.Random) -> typing.Iterator[Operation]:
+    """
+    Insert records with keys drawn uniformly into empty file
+    :param seq_ind_file: File to run workload on
+    :param scale: Number of records
+    :param rng: Source of randomness
+    :return: Operations of workload
+    """
+    for key in random_keys(scale, rng, seq_ind_file.config):
+        yield seq_ind_file.add_record, GradesRecord(key)
+
+
+def sequential_insert(seq_ind_file: SeqIndFile, scale: int, rng: random.Random) -> typing.Iterator[Operation]:
+    """
+    Insert records in ascending order of keys into empty file
+    :param seq_ind_file: File to run workload on
+    :param scale: Number of records
+    :param rng: Source of randomness
+    :return: Operations of workload
+    """
+    step = max(seq_ind_file.config["MAX_KEY"] // scale, 1)
+    for number in range(scale):
+        yield seq_ind_file.add_record, GradesRecord(key_of(number * step, seq_ind_file.config))
+
+
+def zipf_lookup(seq_ind_file: SeqIndFile, scale: int, rng: random.Random) -> typing.Iterator[Operation]:
+    """
+    Look up keys of loaded file, few keys receive most lookups
+    :param seq_ind_file: File to run workload on
+    :param scale: Number of loaded records and of lookups
+    :param rng: Source of randomness
+    :return: Operations of workload
+    """
+    keys = preload(seq_ind_file, scale, rng)
+    for rank in zipf_ranks(scale, len(keys), rng):
+        yield seq_ind_file.get_record, keys[rank]
+
+
+def range_scan(seq_ind_file: SeqIndFile, scale: int, rng: random.Random) -> typing.Iterator[Operation]:
+    """
+    Read SCAN_LENGTH records from uniformly drawn keys of loaded file
+    :param seq_ind_file: File to run workload on
+    :param scale: Number of loaded records, there are scale / SCAN_LENGTH scans
+    :param rng: Source of randomness
+    :return: Operations of workload
+    """
+    keys = preload(seq_ind_file, scale, rng)
+    for _ in range(max(scale // SCAN_LENGTH, 1)):
+        yield (lambda start_key: list(seq_ind_file.scan(start_key, limit=SCAN_LENGTH))), rng.choice(keys)
+
+
+def update_heavy(seq_ind_file: SeqIndFile, scale: int, rng: random.Random) -> typing.Iterator[Operation]:
+    """
+    Update and look up keys of loaded file in equal proportion
+    :param seq_ind_file: File to run workload on
+    :param scale: Number of loaded records and of operations
+    :param rng: Source of randomness
+    :return: Operations of workload
+    """
+    keys = preload(seq_ind_file, scale, rng)
+    for _ in range(scale):
+        key = rng.choice(keys)
+        yield (seq_ind_file.update_record, GradesRecord(key)) if rng.random() < 0.5 else (seq_ind_file.get_record, key)
+
+
+def delete_heavy(seq_ind_file: SeqIndFile, scale: int, rng: random.Random) -> typing.Iterator[Operation]:
+    """
+    Delete half of operations, insert and look up the rest, file is loaded with half of key space of workload
+    :param seq_ind_file: File to run workload on
+    :param scale: Number of loaded records and of operations
+    :param rng: Source of randomness
+    :return: Operations of workload
+    """
+    keys = random_keys(2 * scale, rng, seq_ind_file.config)
+    present, absent = keys[:scale], keys[scale:]
+    seq_ind_file.bulk_load(GradesRecord(key) for key in present)
+    for _ in range(scale):
+        draw = rng.random()
+        if draw < 0.5 and present:
+            position = rng.randrange(len(present))
+            present[position], present[-1] = present[-1], present[position]
+            key = present.pop()
+            absent.append(key)
+            yield seq_ind_file.delete_record, key
+        elif draw < 0.75 and absent:
+            position = rng.randrange(len(absent))
+            absent[position], absent[-1] = absent[-1], absent[position]
+            key = absent.pop()
+            present.append(key)
+            yield seq_ind_file.add_record, GradesRecord(key)
+        else:
+            yield seq_ind_file.get_record, rng.choice(present or absent)
+
+
+def preload(seq_ind_file: SeqIndFile, scale: int, rng: random.Random) -> typing.List[str]:
+    """
+    Bulk load records with keys drawn uniformly, loading is not measured
+    :param seq_ind_file: File to load
+    :param scale: Number of records
+    :param rng: Source of randomness
+    :return: Keys of loaded records in random order
+    """
+    keys = random_keys(scale, rng, seq_ind_file.config)
+    seq_ind_file.bulk_load(GradesRecord(key) for key in keys)
+    return keys
+
+
+WORKLOADS: typing.Dict[str, typing.Callable[[SeqIndFile, int, random.Random], typing.Iterator[Operation]]] = {
+    "uniform_insert": uniform_insert,
+    "sequential_insert": sequential_insert,
+    "zipf_lookup": zipf_lookup,
+    "range_scan": range_scan,
+    "update_heavy": update_heavy,
+    "delete_heavy": delete_heavy,
+}
+KEYS_PER_RECORD = {"delete_heavy": 2}  # distinct keys drawn per record of scale, 1 for other workloads
+
+
+def check_key_space(workloads: typing.Iterable[str], scale: int, config: Config = CONFIG) -> None:
+    """
+    Check that key space of MAX_KEY has enough distinct keys for every workload, so that no workload fails midway
+    :param workloads: Names of workloads
+    :param scale: Number of records of every workload
+    :param config: Settings of files
+    :return: None
+    """
+    for name in workloads:
+        required = KEYS_PER_RECORD.get(name, 1) * scale
+        if required > config["MAX_KEY"]:
+            raise ValueError(f"Workload {name} at scale {scale} needs {required} distinct keys, but MAX_KEY is {config['MAX_KEY']}, "
+                             f"set MAX_KEY to at least {10 ** len(str(required)) - 1}")
+
+
+def io_counters(seq_ind_file: SeqIndFile) -> typing.Dict[str, typing.Any]:
+    """
+    Get counters of page transfers, buffer pool, overflow chains and reorganizations of file
+    :param seq_ind_file: File to get counters of
+    :return: Current values of counters
+    """
+    database = seq_ind_file.database
+    counters = database.counters
+    return {"page_reads": {"main": counters.main_reads, "overflow": counters.overflow_reads},
+            "page_writes": {"main": counters.main_writes, "overflow": counters.overflow_writes},
+            "cache": {"hits": database.cache_hits, "misses": database.cache_misses},
+            "chains": {"walked": counters.chains_walked, "overflow_pages": counters.chain_hops},
+            "reorganizations": seq_ind_file.reorganizations, "reorganization_time": seq_ind_file.reorganization_time}
+
+
+def difference(after: typing.Any, before: typing.Any) -> typing.Any:
+    """
+    Subtract counters, nested counters are subtracted by name
+    :param after: Counters at the end
+    :param before: Counters at the beginning
+    :return: Change of counters
+    """
+    if isinstance(after, dict):
+        return {name: difference(value, before[name]) for name, value in after.items()}
+    return after - before
+
+
+def percentile(sorted_latencies: typing.Sequence[float], fraction: float) -> float:
+    """
+    Get percentile of latencies by nearest rank
+    :param sorted_latencies: Latencies in ascending order
+    :param fraction: Fraction of latencies at or below percentile
+    :return: Percentile
+    """
+    return sorted_latencies[max(math.ceil(fraction * len(sorted_latencies)) - 1, 0)] if sorted_latencies else 0.0
+
+
+def run_workload(name: str, scale: int, seed: int = 0, config: Config = CONFIG) -> typing.Dict[str, typing.Any]:
+    """
+    Run workload on new file in temporary directory, preloading is not measured while final flush is counted as
+    page transfers but not as latency of any operation
+    :param name: Name of workload
+    :param scale: Number of records
+    :param seed: Seed of randomness
+    :param config: Settings of file
+    :return: Throughput, latency percentiles in microseconds, page transfers by area, buffer pool hits and misses,
+             overflow pages read per walked chain and reorganizations
+    """
+    rng = random.Random(seed)
+    latencies = array("d")
+    with tempfile.TemporaryDirectory(prefix="benchmark-") as directory:
+        seq_ind_file = SeqIndFile(*(os.path.join(directory, file_name) for file_name in ("database.dat", "overflow.dat", "index_file.dat")), config=config)
+        operations = WORKLOADS[name](seq_ind_file, scale, rng)
+        operation, argument = next(operations)  # workload is prepared before its first operation
+        before = io_counters(seq_ind_file)
+        start = time.perf_counter()
+        while True:
+            operation_start = time.perf_counter()
+            operation(argument)
+            latencies.append(time.perf_counter() - operation_start)
+            try:
+                operation, argument = next(operations)
+            except StopIteration:
+                break
+        seq_ind_file.flush()
+        elapsed = time.perf_counter() - start
+        counters = difference(io_counters(seq_ind_file), before)
+        seq_ind_file.close()
+    chains = counters["chains"]
+    counters["overflow_pages_per_chain"] = chains["overflow_pages"] / chains["walked"] if chains["walked"] else 0.0
+
+    latencies = sorted(latencies)
+    return {"scale": scale, "operations": len(latencies), "time": elapsed, "throughput": len(latencies) / elapsed,
+            "latency_us": {percentile_name: percentile(latencies, fraction) * 1e6 for percentile_name, fraction in PERCENTILES.items()}, **counters}
+
+
+def run_suite(workloads: typing.Iterable[str], scale: int, seed: int = 0, config: Config = CONFIG) -> typing.Dict[str, typing.Any]:
+    """
+    Run workloads one after another, each on its own file
+    :param workloads: Names of workloads
+    :param scale: Number of records of every workload
+    :param seed: Seed of randomness
+    :param config: Settings of files
+    :return: Settings and results of every workload
+    """
+    workloads = list(workloads)
+    check_key_space(workloads, scale, config)
+    results = {}
+    for name in workloads:
+        results[name] = run_workload(name, scale, seed, config)
+        print(f"{name}: {results[name]['throughput']:.0f} OPERATIONS/S, P99: {results[name]['latency_us']['p99']:.0f} US", file=sys.stderr)
+    return {"config": dict(config), "scale": scale, "seed": seed, "workloads": results}
+
+
+def metrics(result: typing.Dict[str, typing.Any]) -> typing.Dict[str, typing.Tuple[float, bool]]:
+    """
+    Get compared metrics of workload, metrics missing from results of older runs are left out
+    :param result: Result of workload
+    :return: Value of every metric and whether greater value is better
+    """
+    values = {"throughput": (result["throughput"], True)}
+    values.update({f"latency_us.{name}": (value, False) for name, value in result["latency_us"].items()})
+    for direction in ("page_reads", "page_writes"):
+        values.update({f"{direction}.{area}": (value, False) for area, value in result[direction].items()})
+    if "cache" in result:
+        values["cache_misses"] = (result["cache"]["misses"], False)
+        values["overflow_pages_per_chain"] = (result["overflow_pages_per_chain"], False)
+    values["reorganization_time"] = (result["reorganization_time"], False)
+    return values
+
+
+def compare(baseline: typing.Dict[str, typing.Any], current: typing.Dict[str, typing.Any],
+            threshold: float = REGRESSION_THRESHOLD) -> typing.List[typing.Tuple[str, str, float, float, float]]:
+    """
+    Find metrics of workloads present in both runs which got worse by more than threshold
+    :param baseline: Results of earlier run
+    :param current: Results of later run
+    :param threshold: Allowed relative change
+    :return: Workload, metric, baseline value, current value and relative change of every regression
+    """
+    regressions = []
+    for name in baseline["workloads"].keys() & current["workloads"].keys():
+        current_metrics = metrics(current["workloads"][name])
+        for metric, (old, higher_is_better) in metrics(baseline["workloads"][name]).items():
+            if metric not in current_metrics:
+                continue
+            new = current_metrics[metric][0]
+            change = (new - old) / old if old else (math.inf if new else 0.0)
+            if (-change if higher_is_better else change) > threshold:
+                regressions.append((name, metric, old, new, change))
+    return sorted(regressions)
+
+
+def main(arguments: typing.Optional[typing.List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark sequential-indexed file with named workloads",
+                                     epilog="Scale is limited by key space of MAX_KEY, e.g. run at 10^7 records with "
+                                            "--scale 10000000 --set MAX_KEY=99999999")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run workloads and save results as JSON")
+    run_parser.add_argument("--workloads", default=",".join(WORKLOADS), help="comma-separated names of workloads")
+    run_parser.add_argument("--scale", type=int, default=1000, help="number of records of every workload")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE", help="override setting with JSON value")
+    run_parser.add_argument("--output", default="-", help="path of results, standard output by default")
+    compare_parser = commands.add_parser("compare", help="compare two results and list regressions")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="allowed relative change")
+    arguments = parser.parse_args(arguments)
+
+    if arguments.command == "run":
+        workloads = arguments.workloads.split(",")
+        unknown = set(workloads) - WORKLOADS.keys()
+        if unknown:
+            parser.error(f"unknown workloads: {', '.join(sorted(unknown))}")
+        overrides = dict(setting.split("=", 1) for setting in arguments.set)
+        config = CONFIG.replace(**{name: json.loads(value) for name, value in overrides.items()})
+        try:
+            check_key_space(workloads, arguments.scale, config)
+        except ValueError as error:
+            parser.error(str(error))
+        results = json.dumps(run_suite(workloads, arguments.scale, arguments.seed, config), indent=4)
+        if arguments.output == "-":
+            print(results)
+        else:
+            with open(arguments.output, "w") as output:
+                output.write(results)
+        return 0
+
+    with open(arguments.baseline, "r") as baseline, open(arguments.current, "r") as current:
+        regressions = compare(json.load(baseline), json.load(current), arguments.threshold)
+    for name, metric, old, new, change in regressions:
+        print(f"REGRESSION {name} {metric}: {old:.6g} -> {new:.6g} ({change:+.1%})")
+    if not regressions:
+        print("NO REGRESSIONS")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
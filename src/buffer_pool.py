@@ -0,0 +1,163 @@
+import contextlib
+import threading
+import typing
+from page import Page
+from collections import OrderedDict
+
+
+class Frame:
+    """Single page held in buffer pool"""
+    def __init__(self, page: Page):
+        self.page = page
+        self.dirty = False
+        self.pin_count = 0
+
+
+class BufferPool:
+    """Bounded LRU pool of decoded pages shared by main area and overflow, pages are written back on eviction or flush"""
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.frames: "OrderedDict[typing.Tuple[str, int], Frame]" = OrderedDict()
+        self.areas: typing.Dict[str, typing.Tuple[typing.Callable, typing.Callable]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.mutex: typing.ContextManager = contextlib.nullcontext()  # guards frames once pool is shared by threads
+
+    def make_thread_safe(self) -> None:
+        """
+        Guard frames with a lock, so that pool can be used by many threads at once
+        :return: None
+        """
+        if isinstance(self.mutex, contextlib.nullcontext):
+            self.mutex = threading.RLock()
+
+    def register_area(self, area: str, reader: typing.Callable[[int], Page], writer: typing.Callable[[int, Page], None]) -> None:
+        """
+        Register functions used to physically read and write pages of area
+        :param area: Name of area
+        :param reader: Function reading page at index from disk
+        :param writer: Function writing page at index to disk
+        :return: None
+        """
+        self.areas[area] = (reader, writer)
+
+    def pin(self, area: str, page_index: int) -> Page:
+        """
+        Get page and protect it from eviction until it is unpinned
+        :param area: Name of area
+        :param page_index: Index of page
+        :return: Decoded page, None if page is past end of file
+        """
+        with self.mutex:
+            key = (area, page_index)
+            frame = self.frames.get(key)
+            if frame is not None:
+                self.hits += 1
+                self.frames.move_to_end(key)
+                frame.pin_count += 1
+                return frame.page
+
+            self.misses += 1
+            reader, _ = self.areas[area]
+            page = reader(page_index)
+            if page is None or self.capacity <= 0:  # pages past end of file are never cached
+                return page
+            self.evict(self.capacity - 1)
+            frame = Frame(page)
+            frame.pin_count += 1
+            self.frames[key] = frame
+            return page
+
+    def unpin(self, area: str, page_index: int, page: typing.Optional[Page] = None) -> None:
+        """
+        Release pinned page, store new contents if provided
+        :param area: Name of area
+        :param page_index: Index of page
+        :param page: New contents of page, None if page was not modified
+        :return: None
+        """
+        with self.mutex:
+            frame = self.frames.get((area, page_index))
+            if frame is not None and frame.pin_count > 0:
+                frame.pin_count -= 1
+            if page is not None:
+                self.write_page(area, page_index, page)
+
+    def read_page(self, area: str, page_index: int) -> Page:
+        """
+        Read page at index from area
+        :param area: Name of area
+        :param page_index: Index of page
+        :return: Decoded page, None if page is past end of file
+        """
+        page = self.pin(area, page_index)
+        self.unpin(area, page_index)
+        return page
+
+    def write_page(self, area: str, page_index: int, page: Page) -> None:
+        """
+        Write page at index to area, page reaches disk on eviction or flush
+        :param area: Name of area
+        :param page_index: Index of page
+        :param page: Page to be written
+        :return: None
+        """
+        with self.mutex:
+            if self.capacity <= 0:
+                _, writer = self.areas[area]
+                writer(page_index, page)
+                return
+
+            key = (area, page_index)
+            frame = self.frames.get(key)
+            if frame is None:
+                self.evict(self.capacity - 1)
+                frame = Frame(page)
+                self.frames[key] = frame
+            else:
+                frame.page = page
+                self.frames.move_to_end(key)
+            frame.dirty = True
+
+    def evict(self, max_frames: int) -> None:
+        """
+        Evict least recently used unpinned pages until at most max_frames are held
+        :param max_frames: Number of frames to keep
+        :return: None
+        """
+        with self.mutex:
+            for key in list(self.frames):
+                if len(self.frames) <= max_frames:
+                    break
+                frame = self.frames[key]
+                if frame.pin_count > 0:
+                    continue
+                if frame.dirty:
+                    _, writer = self.areas[key[0]]
+                    writer(key[1], frame.page)
+                del self.frames[key]
+
+    def flush(self, area: typing.Optional[str] = None) -> None:
+        """
+        Write back all dirty pages, pages stay in pool
+        :param area: Area to flush, None flushes all areas
+        :return: None
+        """
+        with self.mutex:
+            for key in sorted(self.frames):
+                frame = self.frames[key]
+                if frame.dirty and (area is None or key[0] == area):
+                    _, writer = self.areas[key[0]]
+                    writer(key[1], frame.page)
+                    frame.dirty = False
+
+    def invalidate(self, area: typing.Optional[str] = None) -> None:
+        """
+        Drop pages without writing them back
+        :param area: Area to drop, None drops all areas
+        :return: None
+        """
+        with self.mutex:
+            for key in list(self.frames):
+                if area is None or key[0] == area:
+                    del self.frames[key]
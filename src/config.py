@@ -0,0 +1,50 @@
+import json
+import types
+import typing
+
+CONFIG_PATH = "configs/config.json"
+
+
+class Config(typing.Mapping[str, typing.Any]):
+    """Settings of file, never changed once created so that files with different settings can be used side by side"""
+    def __init__(self, settings: typing.Mapping[str, typing.Any]):
+        self.settings = types.MappingProxyType(dict(settings))
+
+    @classmethod
+    def load(cls, path: str = CONFIG_PATH) -> "Config":
+        """
+        Read settings from JSON file
+        :param path: Path of JSON file
+        :return: Loaded settings
+        """
+        with open(path, "r") as json_config:
+            return cls(json.load(json_config))
+
+    def __getitem__(self, name: str) -> typing.Any:
+        return self.settings[name]
+
+    def __iter__(self) -> typing.Iterator[str]:
+        return iter(self.settings)
+
+    def __len__(self) -> int:
+        return len(self.settings)
+
+    def __reduce__(self):
+        return Config, (dict(self.settings),)
+
+    def __repr__(self) -> str:
+        return f"Config({dict(self.settings)})"
+
+    def replace(self, **changes: typing.Any) -> "Config":
+        """
+        Get copy of settings with some of them changed
+        :param changes: New values of settings
+        :return: New settings
+        """
+        unknown = set(changes) - set(self.settings)
+        if unknown:
+            raise KeyError(f"Unknown settings: {', '.join(sorted(unknown))}")
+        return Config({**self.settings, **changes})
+
+
+CONFIG = Config.load()
@@ -1,27 +1,21 @@
+import glob
+import os
 import matplotlib.pyplot as plt
 import numpy as np
 from matplotlib import cm
+from sweep import load_results
 
-for experiment in ["10000", "1000", "delete_1000", "update_1000"]:
+for results_path in sorted(glob.glob("data/experiment/experiment_results_*.json")):
 
-    RESULTS_PATH = f"data/experiment/experiment_results_{experiment}.txt"
+    experiment = os.path.basename(results_path)[len("experiment_results_"):-len(".json")]
+    data = load_results(os.path.splitext(results_path)[0])
 
-    with open(RESULTS_PATH, "r") as results, open("data/experiment/results.txt", "w") as output:
-        for line in results.readlines():
-            line_list = line.split(" ")
-            output.write(line_list[1][:-1] + " " + line_list[5][:-1] + " " + line_list[8][:-1] + " " + line_list[10])
+    alphas = np.array(sorted({probe["alpha"] for probe in data}))
+    max_pages = np.array(sorted({probe["max_overflow_pages"] for probe in data}))
 
-    data = []
-    with open("data/experiment/results.txt", "r") as results:
-        for line in results.readlines():
-            line = line.rstrip("\n").split(" ")
-            data.append([float(line[0]), int(line[1]), float(line[2]), float(line[3])])
-
-    alphas = np.arange(0.1, 0.8, 0.1)
-    max_pages = np.arange(1, 10, 1)
-
-    disk_operations = [probe[2] for probe in data]
-    time = [probe[3] for probe in data]
+    data.sort(key=lambda probe: (probe["alpha"], probe["max_overflow_pages"]))
+    disk_operations = [probe["disk_operations"] for probe in data]
+    time = [probe["time"] for probe in data]
     X, Y = np.meshgrid(max_pages, alphas)
     disk_operations = np.array(disk_operations).reshape(len(alphas), len(max_pages))
     time = np.array(time).reshape(len(alphas), len(max_pages))
@@ -1,180 +1,521 @@
-import os
-import json
+import contextlib
+import copy
+import threading
 import typing
-from record import GradesRecord
-
-CONFIG_PATH = "configs/config.json"
-with open(CONFIG_PATH, "r") as json_config:
-    CONFIG = json.load(json_config)
-
-RECORD_SIZE = CONFIG["RECORD_SIZE"]
-BLOCKING_FACTOR = CONFIG["BLOCKING_FACTOR"]
-INITIAL_NO_OF_PAGES = CONFIG["INITIAL_NO_OF_PAGES"]
-MAX_KEY = CONFIG["MAX_KEY"]
-MAX_OVERFLOW_PAGE_NO = CONFIG["MAX_OVERFLOW_PAGE_NO"]
-ALPHA = CONFIG["ALPHA"]
+from array import array
+from record import GradesRecord, TextRecordCodec, BinaryRecordCodec, TEXT_FORMAT_VERSION, BINARY_FORMAT_VERSION, create_record_codec
+from config import CONFIG, Config
+from file_header import FileHeader, HEADER_SIZE, HEADER_STRUCT
+from buffer_pool import BufferPool
+from page import Page
+from overflow_filter import OverflowFilters
+from page_journal import PageJournal
+from page_store import PageStore, SequentialPageWriter, create_page_store
+from superblock import Superblock, superblock_path
+from latch import PageLatches
+from metrics import IOCounters
+from tracing import Tracer, trace, traced
+
 PRINT_DEBUG = CONFIG["PRINT_DEBUG"]
 PRINT_VERBOSE_RECORDS = CONFIG["PRINT_VERBOSE_RECORDS"]
-PRINT_DISK_OPERATIONS = CONFIG["PRINT_DISK_OPERATIONS"]
-PAGE_SIZE = RECORD_SIZE * BLOCKING_FACTOR
-PADDING_SYMBOL = b"\0" if CONFIG["PADDING_SYMBOL"] == "null" else CONFIG["PADDING_SYMBOL"].encode()
+
+
+def create_codec(config: Config) -> typing.Union[TextRecordCodec, BinaryRecordCodec]:
+    """
+    Create codec of record format selected in settings
+    :param config: Settings of file
+    :return: Record codec
+    """
+    padding_symbol = b"\0" if config["PADDING_SYMBOL"] == "null" else config["PADDING_SYMBOL"].encode()
+    format_version = {"text": TEXT_FORMAT_VERSION, "binary": BINARY_FORMAT_VERSION}[config["RECORD_FORMAT"]]
+    return create_record_codec(format_version, config["RECORD_SIZE"], padding_symbol, len(str(config["MAX_KEY"])))
+
+
+def read_file_header(store: PageStore, codec: typing.Union[TextRecordCodec, BinaryRecordCodec]) -> FileHeader:
+    """
+    Read header of existing main area or overflow file and check that its record format matches config
+    :param store: Store of file
+    :param codec: Record codec of config
+    :return: Header of file
+    """
+    data = store.read_header()
+    if len(data) < HEADER_STRUCT.size:
+        raise ValueError(f"{store.path} is too short to hold sequential-indexed file header")
+    try:
+        header = FileHeader.from_bytes(data)
+    except ValueError as error:
+        raise ValueError(f"{store.path} is not a sequential-indexed file") from error
+    if header.format_version != codec.version:
+        raise ValueError(f"{store.path} has record format version {header.format_version}, config uses version {codec.version}")
+    if header.record_size != codec.record_size:
+        raise ValueError(f"{store.path} has record size {header.record_size}, config has {codec.record_size}")
+    return header
 
 
 class Overflow:
     """Overflow area of the file"""
-    def __init__(self, path: str):
-        self.path = path
+    AREA = "overflow"
+
+    def __init__(self, path: str, buffer_pool: BufferPool, create: bool = True, config: Config = CONFIG,
+                 counters: typing.Optional[IOCounters] = None):
+        self.config = config
+        self.codec = create_codec(config)
+        self.page_size = self.codec.record_size * config["BLOCKING_FACTOR"]
+        self.store: PageStore = create_page_store(path, self.page_size, config["PAGE_STORE_MODE"], config["MMAP_CHUNK_PAGES"], HEADER_SIZE, create)
+        self.buffer_pool = buffer_pool
+        self.buffer_pool.register_area(self.AREA, self.read_page_from_disk, self.write_page_to_disk)
         self.current_page_index = 0
         self.current_offset = 0
-        self.current_disk_operations = 0
-        self.clear_overflow()
+        self.append_page = Page(self.codec, self.page_size)  # page at current_page_index, written only when full
+        self.free_slot_head = (-1, -1)
+        self.number_of_free_slots = 0
+        self.buckets: typing.Dict[int, int] = {}  # overflow page being filled with chains of every physical page of main area
+        self.counters = counters if counters is not None else IOCounters()
+        self.latches: typing.Optional[PageLatches] = None
+        self.tracer: typing.Optional[Tracer] = None
+        if create:
+            self.clear_overflow()
+
+    def load_superblock(self, superblock: Superblock) -> None:
+        """
+        Restore state of overflow of reopened file, append page is read back if it is not empty
+        :param superblock: Superblock of file
+        :return: None
+        """
+        read_file_header(self.store, self.codec)
+        self.current_page_index, self.current_offset = superblock.overflow_cursor
+        self.free_slot_head = superblock.free_slot_head
+        self.number_of_free_slots = superblock.number_of_free_slots
+        self.buckets = dict(superblock.buckets)
+        if self.current_offset:
+            self.append_page = self.read_page_from_disk(self.current_page_index)
 
     def clear_overflow(self) -> None:
         """
         Remove contents in overflow path
         :return: None
         """
-        open(self.path, "w").close()
+        self.store.truncate()
+        self.write_header()
+
+    def write_header(self) -> None:
+        """
+        Write header of overflow file with head of list of free slots
+        :return: None
+        """
+        self.store.write_header(FileHeader(self.codec.version, self.codec.record_size, self.free_slot_head).to_bytes())
+
+    @property
+    def path(self) -> str:
+        """Path of overflow file"""
+        return self.store.path
 
-    def read_page(self, page_index: int) -> bytes:
+    def structure(self) -> typing.ContextManager:
+        """
+        Guard pages shared by chains of many pages of main area and allocation of slots, writers keep the guard
+        until their operation ends
+        :return: Context holding the guard, no-op if file is not latched
+        """
+        return self.latches.structure() if self.latches is not None else contextlib.nullcontext()
+
+    def read_page(self, page_index: int) -> typing.Optional[Page]:
         """
         Read page at index from overflow
         :param page_index: Index to read page from
-        :return: Page in bytes
+        :return: Decoded page, None if page is past end of overflow
+        """
+        with self.structure():
+            if page_index == self.current_page_index and len(self.append_page):
+                return self.append_page
+            return self.buffer_pool.read_page(self.AREA, page_index)
+
+    def write_page(self, page_index: int, page: Page) -> None:
+        """
+        Write page at index to overflow
+        :param page_index: Index to write page at
+        :param page: Page to be written
+        :return: None
+        """
+        with self.structure():
+            if page_index == self.current_page_index:
+                self.append_page = page
+                return
+            self.buffer_pool.write_page(self.AREA, page_index, page)
+
+    def read_chain_page(self, page_index: int) -> Page:
+        """
+        Read page of overflow while walking a chain, counted to measure locality of chains
+        :param page_index: Index to read page from
+        :return: Decoded page
         """
-        self.current_disk_operations += 1
-        with open(self.path, "br") as overflow:
-            overflow.seek(page_index * PAGE_SIZE, os.SEEK_SET)
-            return overflow.read(PAGE_SIZE)
+        self.counters.chain_hops += 1
+        return self.read_page(page_index)
 
-    def write_page(self, page_index: int, page: bytes) -> None:
+    def flush(self) -> None:
+        """
+        Write append page to buffer pool even though it is not full and save list of free slots to header
+        :return: None
         """
-        Read page at index to overflow
+        if len(self.append_page) and self.append_page.dirty:
+            self.buffer_pool.write_page(self.AREA, self.current_page_index, self.append_page)
+            self.append_page.dirty = False
+        self.write_header()
+
+    @traced("overflow.read")
+    def read_page_from_disk(self, page_index: int) -> typing.Optional[Page]:
+        """
+        Read and decode page at index from overflow file, bypassing buffer pool
+        :param page_index: Index to read page from
+        :return: Decoded page, None if page is past end of overflow
+        """
+        self.counters.overflow_reads += 1
+        with self.store.view_page(page_index) as data:
+            self.counters.bytes_moved += len(data)
+            return Page.from_bytes(data, self.codec, self.page_size) if data else None
+
+    @traced("overflow.write")
+    def write_page_to_disk(self, page_index: int, page: Page) -> None:
+        """
+        Encode and write page at index to overflow file, bypassing buffer pool
         :param page_index: Index to write page at
         :param page: Page to be written
         :return: None
         """
-        self.current_disk_operations += 1
-        with open(self.path, "br+") as overflow:
-            overflow.seek(page_index * PAGE_SIZE, os.SEEK_SET)
-            overflow.write(page)
+        data = page.to_bytes()
+        self.counters.overflow_writes += 1
+        self.counters.bytes_moved += len(data)
+        self.store.write_page(page_index, data)
+        page.dirty = False
 
-    def get_new_pointer(self) -> typing.Tuple[int, int]:
+    def get_new_pointer(self, home_page: typing.Optional[int] = None) -> typing.Tuple[int, int]:
         """
-        Get current pointer of overflow
+        Get pointer where next record will be added, free slots are used before the end of overflow
+        :param home_page: Physical index of page of main area where the chain of record starts, None to append record
         :return: Page and offset of current pointer
         """
-        return self.current_page_index, self.current_offset
+        with self.structure():
+            if self.config["OVERFLOW_ALLOCATION"] == "bucket" and home_page is not None:
+                return self.get_bucket_pointer(home_page)
+            if self.free_slot_head != (-1, -1):
+                return self.free_slot_head
+            return self.current_page_index, self.current_offset
+
+    def get_bucket_pointer(self, home_page: int) -> typing.Tuple[int, int]:
+        """
+        Get pointer where next record of chains of page of main area will be added, a new page is started when its
+        page is full and free slots are used only once overflow grew past its limit
+        :param home_page: Physical index of page of main area where the chain of record starts
+        :return: Page and offset of pointer
+        """
+        with self.structure():
+            page_index = self.buckets.get(home_page)
+            if page_index is not None and len(page := self.read_page(page_index)) < self.config["BLOCKING_FACTOR"]:
+                return page_index, len(page)
+            if self.free_slot_head != (-1, -1) and self.current_page_index > self.config["MAX_OVERFLOW_PAGE_NO"]:
+                return self.free_slot_head
+            return self.current_page_index + (1 if len(self.append_page) else 0), 0
 
-    def add_record(self, record: GradesRecord) -> typing.Tuple[int, int]:
+    def add_record(self, record: GradesRecord, home_page: typing.Optional[int] = None) -> typing.Tuple[int, int]:
         """
-        Add record to overflow and return its pointer
+        Add record to overflow and return its pointer, with bucket allocation records of chains of the same page of
+        main area are put together in pages of their own
         :param record: Record to add
+        :param home_page: Physical index of page of main area where the chain of record starts, None to append record
         :return: Pointer of newly added record
         """
-        page = self.read_page(self.current_page_index)
-        page = page[:self.current_offset * RECORD_SIZE] + record.to_bytes() + page[self.current_offset * RECORD_SIZE:]
-        self.write_page(self.current_page_index, page)
+        if self.config["OVERFLOW_ALLOCATION"] == "bucket" and home_page is not None:
+            return self.add_record_to_bucket(record, home_page)
+
         pointer = self.get_new_pointer()
+        if self.free_slot_head != (-1, -1):
+            return self.reuse_free_slot(record)
+
+        self.append_page.append(record)
         self.current_offset += 1
-        if self.current_offset == BLOCKING_FACTOR:
+        if self.current_offset == self.config["BLOCKING_FACTOR"]:
+            self.close_append_page()
+        return pointer
+
+    def add_record_to_bucket(self, record: GradesRecord, home_page: int) -> typing.Tuple[int, int]:
+        """
+        Add record to overflow page of chains of page of main area
+        :param record: Record to add
+        :param home_page: Physical index of page of main area where the chain of record starts
+        :return: Pointer of newly added record
+        """
+        pointer = self.get_bucket_pointer(home_page)
+        if pointer == self.free_slot_head:
+            return self.reuse_free_slot(record)
+        if pointer[0] >= self.current_page_index:  # bucket is full or does not exist yet
+            if len(self.append_page):  # bucket never shares page with records appended in arrival order
+                self.close_append_page()
             self.current_page_index += 1
-            self.current_offset = 0
+            self.buckets[home_page] = pointer[0]
+            page = Page(self.codec, self.page_size)
+        else:
+            page = self.read_page(pointer[0])
+        page.append(record)
+        self.write_page(pointer[0], page)
+        return pointer
+
+    def reuse_free_slot(self, record: GradesRecord) -> typing.Tuple[int, int]:
+        """
+        Put record in first slot of list of free slots
+        :param record: Record to add
+        :return: Pointer of newly added record
+        """
+        pointer = self.free_slot_head
+        page = self.read_page(pointer[0])
+        self.free_slot_head = page.record_at(pointer[1]).pointer
+        self.number_of_free_slots -= 1
+        page.replace(pointer[1], record)
+        self.write_page(pointer[0], page)
         return pointer
 
+    def close_append_page(self) -> None:
+        """
+        Write append page and start new one after it
+        :return: None
+        """
+        full_page_index, full_page = self.current_page_index, self.append_page
+        self.current_page_index += 1
+        self.current_offset = 0
+        self.append_page = Page(self.codec, self.page_size)
+        self.write_page(full_page_index, full_page)
+
+    def free_slot(self, pointer: typing.Tuple[int, int]) -> None:
+        """
+        Put slot of record which is no longer part of any chain on list of free slots, the slot keeps deleted record
+        pointing to next free slot
+        :param pointer: Page and offset of record
+        :return: None
+        """
+        page = self.read_page(pointer[0])
+        record = page.record_at(pointer[1])
+        record.deleted = True
+        record.pointer = self.free_slot_head
+        page.replace(pointer[1], record)
+        self.write_page(pointer[0], page)
+        self.free_slot_head = pointer
+        self.number_of_free_slots += 1
+
+    def number_of_records(self) -> int:
+        """
+        Get number of records in overflow, slots left empty in pages of buckets are counted as well
+        :return: Number of occupied slots
+        """
+        return self.current_page_index * self.config["BLOCKING_FACTOR"] + self.current_offset - self.number_of_free_slots
+
+    def is_full(self) -> bool:
+        """
+        Check if overflow grew past its limit and has no free slots left
+        :return: True if file should be reorganized, False otherwise
+        """
+        return self.free_slot_head == (-1, -1) and self.current_page_index > self.config["MAX_OVERFLOW_PAGE_NO"]
+
 
 class Database:
     """Area of the file where records are stored (main area + overflow)"""
-    def __init__(self, database_path: str, overflow_path: str):
-        global MAX_OVERFLOW_PAGE_NO
-        global ALPHA
-        with open(CONFIG_PATH, "r") as json_config:
-            CONFIG = json.load(json_config)
-        MAX_OVERFLOW_PAGE_NO = CONFIG["MAX_OVERFLOW_PAGE_NO"]
-        ALPHA = CONFIG["ALPHA"]
-        self.path = database_path
-        self.overflow = Overflow(overflow_path)
+    AREA = "main"
+
+    def __init__(self, database_path: str, overflow_path: str, initialize: bool = True, superblock: typing.Optional[Superblock] = None,
+                 config: Config = CONFIG):
+        create = superblock is None
+        self.config = config
+        self.codec = create_codec(config)
+        self.page_size = self.codec.record_size * config["BLOCKING_FACTOR"]
+        self.store: PageStore = create_page_store(database_path, self.page_size, config["PAGE_STORE_MODE"], config["MMAP_CHUNK_PAGES"], HEADER_SIZE, create)
+        self.buffer_pool = BufferPool(config["BUFFER_POOL_SIZE"])
+        self.buffer_pool.register_area(self.AREA, self.read_page_from_disk, self.write_page_to_disk)
+        self.counters = IOCounters()
+        self.overflow = Overflow(overflow_path, self.buffer_pool, create, config, self.counters)
+        self.overflow_filters = OverflowFilters(config["OVERFLOW_FILTER_BITS"], config["OVERFLOW_FILTER_HASHES"])
+        self.page_map = array("q")  # physical page of every page of main area, in order of keys
+        self.free_pages: typing.List[int] = []
+        self.next_physical_page = 0
         self.number_of_records = 0
-        self.current_disk_operations = 0
-        self.disk_operations = 0
+        self.records_lock = threading.Lock()  # guards number of records changed by concurrent writers
+        self.latches: typing.Optional[PageLatches] = None
+        self.tracer: typing.Optional[Tracer] = None
         self.dummy_record_key = None
         self.dummy_record = None
+        self.superblock_clean = False  # superblock on disk describes files
+        self.epoch = 0  # epoch of last superblock written
+        if not create:
+            self.load_superblock(superblock)
+            return
         self.clear_database()
-        self.initialize_empty_pages()
-        self.add_dummy_record()
-        self.dummy_record = True
+        if initialize:
+            self.initialize_empty_pages()
+            self.add_dummy_record()
+            self.dummy_record = True
+
+    @property
+    def superblock_path(self) -> str:
+        """Path of superblock of file"""
+        return superblock_path(self.path)
+
+    def load_superblock(self, superblock: Superblock) -> None:
+        """
+        Restore state of reopened file from its superblock, pages are read only when they are needed
+        :param superblock: Superblock of file
+        :return: None
+        """
+        read_file_header(self.store, self.codec)
+        if (superblock.format_version, superblock.blocking_factor, superblock.record_size) != (self.codec.version, self.config["BLOCKING_FACTOR"], self.codec.record_size):
+            raise ValueError(f"{self.path} has record format {superblock.format_version}, blocking factor {superblock.blocking_factor} and "
+                             f"record size {superblock.record_size}, which do not match config")
+        self.page_map = array("q", superblock.page_map)
+        self.free_pages = list(superblock.free_pages)
+        self.next_physical_page = superblock.next_physical_page
+        self.number_of_records = superblock.number_of_records
+        self.dummy_record, self.dummy_record_key = superblock.dummy_record, superblock.dummy_record_key
+        self.overflow_filters = OverflowFilters.from_bytes(superblock.filters, superblock.filter_bits, superblock.filter_hashes)
+        self.overflow.load_superblock(superblock)
+        self.superblock_clean = superblock.clean
+        self.epoch = superblock.epoch
+
+    def write_superblock(self, log_position: int = 0, log_epoch: int = 0) -> None:
+        """
+        Save state of file to superblock of next epoch, pages have to be written back first
+        :param log_position: Number of entries of write-ahead log reflected in files
+        :param log_epoch: Epoch of write-ahead log
+        :return: None
+        """
+        superblock = Superblock(self.codec.version, self.config["BLOCKING_FACTOR"], self.codec.record_size)
+        superblock.number_of_records = self.number_of_records
+        superblock.page_map = self.page_map
+        superblock.free_pages = array("q", self.free_pages)
+        superblock.next_physical_page = self.next_physical_page
+        superblock.overflow_cursor = (self.overflow.current_page_index, self.overflow.current_offset)
+        superblock.free_slot_head = self.overflow.free_slot_head
+        superblock.number_of_free_slots = self.overflow.number_of_free_slots
+        superblock.buckets = self.overflow.buckets
+        superblock.dummy_record, superblock.dummy_record_key = self.dummy_record, self.dummy_record_key
+        superblock.epoch, superblock.log_epoch, superblock.log_position = self.epoch + 1, log_epoch, log_position
+        superblock.filter_bits, superblock.filter_hashes = self.overflow_filters.bits, self.overflow_filters.hashes
+        superblock.filters = self.overflow_filters.to_bytes()
+        superblock.write(self.superblock_path)
+        self.superblock_clean = True
+        self.epoch = superblock.epoch
+
+    def use_tracer(self, tracer: typing.Optional[Tracer]) -> None:
+        """
+        Record spans of page transfers and chain walks of main area and overflow
+        :param tracer: Tracer, None to stop tracing
+        :return: None
+        """
+        self.tracer = tracer
+        self.overflow.tracer = tracer
+
+    def use_latches(self, latches: PageLatches) -> None:
+        """
+        Latch pages read and written during operations of threads, buffer pool is guarded as well
+        :param latches: Latches of file
+        :return: None
+        """
+        self.latches = latches
+        self.overflow.latches = latches
+        self.buffer_pool.make_thread_safe()
+
+    def use_journal(self, journal: typing.Optional[PageJournal]) -> None:
+        """
+        Save pages of main area and overflow to journal before they are overwritten in place
+        :param journal: Journal of file, None to stop journaling
+        :return: None
+        """
+        self.store.journal = journal
+        self.overflow.store.journal = journal
+
+    def count_records(self, change: int) -> None:
+        """
+        Change number of records in file
+        :param change: Number of added records, negative for removed ones
+        :return: None
+        """
+        with self.records_lock:
+            self.number_of_records += change
+
+    def mark_modified(self) -> None:
+        """
+        Mark superblock as stale before files are first modified after it was written
+        :return: None
+        """
+        if self.superblock_clean:
+            Superblock.mark_dirty(self.superblock_path)
+            self.superblock_clean = False
 
     def clear_database(self) -> None:
         """
         Remove contents in database path
         :return: None
         """
-        open(self.path, "w").close()
+        self.store.truncate()
+        self.store.write_header(FileHeader(self.codec.version, self.codec.record_size).to_bytes())
+
+    @property
+    def path(self) -> str:
+        """Path of main area file"""
+        return self.store.path
 
-    def initialize_empty_pages(self, number_of_pages: int = INITIAL_NO_OF_PAGES) -> None:
+    def initialize_empty_pages(self, number_of_pages: typing.Optional[int] = None) -> None:
         """
         Initialize main area with empty pages
-        :param number_of_pages: Number of empty pages
+        :param number_of_pages: Number of empty pages, None for INITIAL_NO_OF_PAGES
         :return: None
         """
+        number_of_pages = number_of_pages if number_of_pages is not None else self.config["INITIAL_NO_OF_PAGES"]
+        self.store.reserve(self.store.position(number_of_pages))
         for i in range(number_of_pages):
-            empty_page = PADDING_SYMBOL*PAGE_SIZE
+            empty_page = Page(self.codec, self.page_size)
             self.write_page(i, empty_page)
 
+    def load_sorted_records(self, records: typing.Iterable[GradesRecord], fill_size: float, expected_number_of_pages: typing.Optional[int] = None) -> typing.Generator[typing.Tuple[int, str], None, None]:
+        """
+        Write records sorted by key to empty main area page after page, records are encoded straight into write buffer
+        without pointers, buffer is written in large sequential chunks and file is synced once at the end
+        :param records: Non-deleted records sorted by key
+        :param fill_size: Number of bytes of page filled before next page is started
+        :param expected_number_of_pages: Number of pages used to reserve space in file, None to skip it
+        :return: Index and first key of every new page, pages are written only when generator is exhausted
+        """
+        if expected_number_of_pages is not None:
+            self.store.reserve(self.store.position(expected_number_of_pages))
+        writer = SequentialPageWriter(self.store, self.config["REORGANIZATION_WRITE_BUFFER_PAGES"], self.codec.padding)
+        page_index, page_size, number_of_records = 0, 0, 0
+        for record in records:
+            if page_size >= fill_size:
+                page_index, page_size = writer.next_page(), 0
+            if page_size == 0:
+                yield page_index, record.key
+            page_size += self.codec.encode_into(writer.buffer, writer.page_position + page_size, record, (-1, -1))
+            number_of_records += 1
+        writer.close()
+        self.store.sync()
+
+        self.page_map = array("q", range(page_index + 1))
+        self.next_physical_page = page_index + 1
+        self.number_of_records = number_of_records
+        self.counters.main_writes += page_index + 1
+        self.counters.bytes_moved += (page_index + 1) * self.page_size
+
     def add_dummy_record(self) -> None:
         """
         Add dummy record with first possible key to beginning of database
         :return: None
         """
-        self.dummy_record_key = "".rjust(len(str(MAX_KEY)), "0")
+        self.dummy_record_key = "".rjust(len(str(self.config["MAX_KEY"])), "0")
         dummy_record = GradesRecord(self.dummy_record_key)
         self.add_record(dummy_record, 0)
 
-    def generate_record_from_string_list(self, record: typing.List[str]) -> GradesRecord:
-        """
-        Generate new record from provided list of strings
-        :param record: List of strings
-        :return: New record created from the list
-        """
-        key = record[0]
-        pointer = (-1, -1) if (record[1].split(":")[0], record[1].split(":")[1]) == ("x", "x") else (int(record[1].split(":")[0]), int(record[1].split(":")[1]))
-        id = int(record[2])
-        grades = [record[i] for i in [3, 4, 5]]
-        deleted = bool(int(record[6].split(":")[1]))
-
-        return GradesRecord(key, id, grades, pointer, deleted)
-
-    def get_record_by_key(self, key: str, page: bytes) -> typing.Optional[GradesRecord]:
+    def get_record_by_key(self, key: str, page: Page) -> typing.Optional[GradesRecord]:
         """
         Retrieve record from the page by key
         :param key: Key of record
-        :param page: Page where the record will be searched for
+        :param page: Page of main area where the record will be searched for
         :return: Record if present, None otherwise
         """
-        page = page.decode().split("\n")
-        found_records = [s for s in page if s.startswith(key)]
-
-        assert len(found_records) <= 1, "Multiple records with same key found!"
-        if len(found_records) == 0:
-            return None
-
-        record = found_records[0].split(" ")
-        return self.generate_record_from_string_list(record)
-
-    def get_record_at_offset(self, offset: int, page: bytes) -> typing.Optional[GradesRecord]:
-        """
-        Retrieve record from the page at offset
-        :param offset: Offset in the page
-        :param page: Page where the record will be searched for
-        :return: Record at offset
-        """
-        page = page.replace(PADDING_SYMBOL, b"")
-        page = page.decode().split("\n")
-        page = [record for record in page if record]
-        if not page or len(page) <= offset:
-            return None
-        record = page[offset].split(" ")
-        return self.generate_record_from_string_list(record)
+        return page.find(key)
 
     def add_record(self, record: GradesRecord, page_index: int) -> bool:
         """
@@ -184,89 +525,371 @@ class Database:
         :return: True if file should be reorganized, False otherwise
         """
         page = self.read_page(page_index)
-        self.number_of_records += 1
-        self.current_disk_operations = 0
-        self.overflow.current_disk_operations = 0
+        self.count_records(1)
 
         if self.dummy_record is not None and record.key == self.dummy_record_key:
             self.dummy_record = False
             self.update_record(record, 0)
             return False
 
-        if self.page_size(page + record.to_bytes()) > PAGE_SIZE:
-            record_str = str(record).rstrip("\n")
+        if not page.fits(record) or self.follows_chain({page_index: page}, page_index, record.key):
             self.set_overflow(page, page_index, record)
-            if PRINT_DEBUG: print(f"OVERFLOW: {record_str}")
-            if PRINT_DISK_OPERATIONS: print(f"DISK OPERATIONS: {self.current_disk_operations + self.overflow.current_disk_operations}")
-            self.disk_operations += self.overflow.current_disk_operations
-            return self.overflow.current_page_index > MAX_OVERFLOW_PAGE_NO
-
-        offset = self.get_offset(page, record)
-        page = self.update_page(page, offset, record)
-        record_str = str(record).rstrip("\n")
+            return self.overflow.is_full()
+
+        offset = page.offset_of(record.key)
+        page.insert(offset, record)
         self.write_page(page_index, page)
-        if PRINT_DEBUG: print(f"ADDING RECORD: {record_str} to page {page_index} at offset {offset}")
-        if PRINT_DISK_OPERATIONS: print(f"DISK OPERATIONS: {self.current_disk_operations + self.overflow.current_disk_operations}")
-        return self.overflow.current_page_index > MAX_OVERFLOW_PAGE_NO
+        return self.overflow.is_full()
+
+    def add_records(self, records: typing.List[GradesRecord], page_index: int) -> bool:
+        """
+        Add records belonging to the same page at index, page is read and written once and records which do
+        not fit are merged into overflow chains with every touched page written once
+        :param records: New records sorted by key
+        :param page_index: Page number where the records should be inserted to
+        :return: True if file should be reorganized, False otherwise
+        """
+        if records and self.dummy_record is not None and records[0].key == self.dummy_record_key:
+            self.add_record(records[0], 0)
+            records = records[1:]
+
+        main_pages = {page_index: self.read_page(page_index)}
+        page = main_pages[page_index]
+        changed_main_pages = {page_index}
+        spilled_records = []
+        self.count_records(len(records))
+        for record in records:
+            if page.fits(record) and not self.follows_chain(main_pages, page_index, record.key):
+                page.insert(page.offset_of(record.key), record)
+            else:
+                spilled_records.append(record)
+
+        chains = {}
+        for record in spilled_records:
+            previous_location = self.find_previous_record_in_main_area(main_pages, page_index, record.key)
+            chains.setdefault(previous_location, []).append(record)
+
+        overflow_pointer_updates = {}
+        for (previous_page_index, previous_offset), chain_records in chains.items():
+            previous_page = main_pages[previous_page_index]
+            previous_record = previous_page.record_at(previous_offset)
+            home_page = self.page_map[previous_page_index]
+            for record in chain_records:
+                self.overflow_filters.add(home_page, record.key)
+            new_pointer = self.merge_into_chain(previous_record, home_page, chain_records, overflow_pointer_updates)
+            if new_pointer is not None:
+                previous_record.pointer = new_pointer
+                previous_page.replace(previous_offset, previous_record)
+                changed_main_pages.add(previous_page_index)
+
+        for overflow_page_index, pointers in overflow_pointer_updates.items():
+            overflow_page = self.overflow.read_page(overflow_page_index)
+            for offset, pointer in pointers.items():
+                overflow_record = overflow_page.record_at(offset)
+                overflow_record.pointer = pointer
+                overflow_page.replace(offset, overflow_record)
+            self.overflow.write_page(overflow_page_index, overflow_page)
+        for changed_page_index in sorted(changed_main_pages):
+            self.write_page(changed_page_index, main_pages[changed_page_index])
+
+        return self.overflow.is_full()
+
+    def find_previous_record_in_main_area(self, main_pages: typing.Dict[int, Page], page_index: int, key: str) -> typing.Optional[typing.Tuple[int, int]]:
+        """
+        Get location of last record in main area with key not greater than key, whose overflow chain holds
+        following keys, pages read are kept in main_pages
+        :param main_pages: Pages of main area already read, by index
+        :param page_index: Index of page where the key belongs according to index
+        :param key: Key to be resolved
+        :return: Page index and offset of preceding record in main area, None if there is no such record
+        """
+        if page_index not in main_pages:
+            main_pages[page_index] = self.read_page(page_index)
+        offset = main_pages[page_index].offset_of(key) - 1
+        while offset < 0:
+            page_index -= 1
+            if page_index < 0:
+                return None
+            if page_index not in main_pages:
+                main_pages[page_index] = self.read_page(page_index)
+            offset = len(main_pages[page_index]) - 1
+        return page_index, offset
+
+    def follows_chain(self, main_pages: typing.Dict[int, Page], page_index: int, key: str) -> bool:
+        """
+        Check if preceding record in main area has overflow chain, key has to be put in that chain to keep keys
+        ordered, as chain can hold keys greater than key once records of page were removed or rewritten
+        :param main_pages: Pages of main area already read, by index
+        :param page_index: Index of page where the key belongs according to index
+        :param key: Key to be resolved
+        :return: True if key belongs to overflow chain, False otherwise
+        """
+        previous_location = self.find_previous_record_in_main_area(main_pages, page_index, key)
+        if previous_location is None:
+            return False
+        previous_page_index, previous_offset = previous_location
+        return main_pages[previous_page_index].record_at(previous_offset).pointer != (-1, -1)
+
+    @traced("chain.merge")
+    def merge_into_chain(self, first_record: GradesRecord, home_page: int, records: typing.List[GradesRecord], pointer_updates: typing.Dict[int, typing.Dict[int, typing.Tuple[int, int]]]) -> typing.Optional[typing.Tuple[int, int]]:
+        """
+        Merge sorted records into overflow chain of record in main area, chain is walked once and new records are
+        appended in descending order so that each of them already knows the pointer to its successor
+        :param first_record: Record of main area starting the chain
+        :param home_page: Physical index of page of main area holding first record
+        :param records: Records sorted by key to put in chain
+        :param pointer_updates: Collected new pointers of existing overflow records, by page and offset
+        :return: New pointer of first record, None if it does not change
+        """
+        chain = []  # existing overflow records up to first one greater than all new records
+        pointer = first_record.pointer
+        overflow_page_index, overflow_page = None, None
+        if pointer != (-1, -1):
+            self.counters.chains_walked += 1
+        while pointer != (-1, -1):
+            if pointer[0] != overflow_page_index:
+                overflow_page_index, overflow_page = pointer[0], self.overflow.read_chain_page(pointer[0])
+            overflow_record = overflow_page.record_at(pointer[1])
+            chain.append((pointer, overflow_record))
+            if overflow_record.key > records[-1].key:
+                break
+            pointer = overflow_record.pointer
+
+        entries = [[None, first_record, False]] + [[location, record, False] for location, record in chain]  # location, record, is new
+        for record in records:
+            position = len(entries)
+            while entries[position - 1][1].key > record.key:
+                position -= 1
+            entries.insert(position, [None, record, True])
+
+        successor = (-1, -1)
+        for entry in reversed(entries[1:]):
+            if entry[2]:
+                entry[1].pointer = successor
+                entry[0] = self.overflow.add_record(entry[1], home_page)
+            successor = entry[0]
+
+        new_first_pointer = None
+        for (location, _, is_new), (following_location, _, following_is_new) in zip(entries, entries[1:]):
+            if is_new or not following_is_new:
+                continue
+            if location is None:
+                new_first_pointer = following_location
+            else:
+                pointer_updates.setdefault(location[0], {})[location[1]] = following_location
+        return new_first_pointer
+
+    def locate_record(self, key: str, page_number: int, main_pages: typing.Optional[typing.Dict[int, Page]] = None) -> typing.Optional[typing.Tuple[GradesRecord, Page, int, int, bool, typing.Optional[tuple]]]:
+        """
+        Find non-deleted record with key in main area or in overflow chain of preceding record, chain is walked only
+        if overflow filter of the page says the key may be there
+        :param key: Key of record
+        :param page_number: Page number of key according to index
+        :param main_pages: Pages of main area already read, by index, None to read them again
+        :return: Record, page, number of page, offset, is in overflow and page, number of page, offset, is in overflow
+        of record pointing to it (None in main area); None if record does not exist
+        """
+        main_pages = main_pages if main_pages is not None else {}
+        location = self.find_previous_record_in_main_area(main_pages, page_number, key)
+        if location is None:
+            return None
+        page_index, offset = location
+        page = main_pages[page_index]
+        record = page.record_at(offset)
+        if record.key == key and not record.deleted:
+            return record, page, page_index, offset, False, None
+        if record.pointer == (-1, -1) or not self.overflow_filters.may_contain(self.page_map[page_index], key):
+            return None
+
+        return self.walk_chain(key, record, (page, page_index, offset, False))
+
+    @traced("chain.walk")
+    def walk_chain(self, key: str, record: GradesRecord, previous: tuple) -> typing.Optional[typing.Tuple[GradesRecord, Page, int, int, bool, typing.Optional[tuple]]]:
+        """
+        Find non-deleted record with key in overflow chain starting at record, chain is sorted so walk stops at
+        first greater key
+        :param key: Key of record
+        :param record: Record at which chain starts
+        :param previous: Page, number of page, offset and is in overflow of record at which chain starts
+        :return: Record, page, number of page, offset, is in overflow and location of record pointing to it; None if
+        record is not in chain
+        """
+        overflow_page_index, overflow_page = None, None
+        self.counters.chains_walked += 1
+        while record.pointer != (-1, -1):
+            if record.pointer[0] != overflow_page_index:
+                overflow_page_index, overflow_page = record.pointer[0], self.overflow.read_chain_page(record.pointer[0])
+            offset = record.pointer[1]
+            record = overflow_page.record_at(offset)
+            if record.key > key:
+                return None
+            if record.key == key and not record.deleted:
+                return record, overflow_page, overflow_page_index, offset, True, previous
+            previous = (overflow_page, overflow_page_index, offset, True)
+        return None
+
+    def get_record(self, key: str, page_number: int, main_pages: typing.Optional[typing.Dict[int, Page]] = None) -> typing.Optional[GradesRecord]:
+        """
+        Get non-deleted record with key
+        :param key: Key of record
+        :param page_number: Page number of key according to index
+        :param main_pages: Pages of main area already read, by index, None to read them again
+        :return: Record if present, None otherwise
+        """
+        if self.dummy_record and key == self.dummy_record_key:
+            return None
+        location = self.locate_record(key, page_number, main_pages)
+        return location[0] if location is not None else None
+
+    def get_records(self, keys: typing.List[str], page_number: int) -> typing.Dict[str, typing.Optional[GradesRecord]]:
+        """
+        Get non-deleted records with keys belonging to the same page, pages of main area are read once for all keys
+        :param keys: Keys of records
+        :param page_number: Page number of keys according to index
+        :return: Record of every key, None if it is not present
+        """
+        main_pages = {}
+        return {key: self.get_record(key, page_number, main_pages) for key in keys}
 
     def update_record(self, new_record: GradesRecord, page_number: int) -> None:
         """
         Update record at page index, records are compared by key
         :param new_record: New record with same key as old record
-        :param page_number: Page number where the record will be searched for
+        :param page_number: Page number of key according to index
         :return: None
         """
-        self.current_disk_operations = 0
-        self.overflow.current_disk_operations = 0
-
-        for record, record_page, record_page_number, offset, in_overflow in self.get_all_records(page_number):
-            if record.key == new_record.key:
-                record_str = str(record).rstrip("\n")
-                if PRINT_DEBUG: print(f"UPDATING RECORD: {record_str}, {'in overflow ' if in_overflow else 'in main area'} in page {record_page_number} at offset {offset}")
-                record.id = new_record.id
-                record.grades = new_record.grades
-                record_page = self.update_page(record_page, offset, record, replace=True)
-                accessor = self.overflow if in_overflow else self
-                accessor.write_page(record_page_number, record_page)
-                break
-
-        if PRINT_DISK_OPERATIONS: print(f"DISK OPERATIONS: {self.current_disk_operations + self.overflow.current_disk_operations}")
-        self.disk_operations += self.overflow.current_disk_operations
+        if (location := self.locate_record(new_record.key, page_number)) is not None:
+            record, record_page, record_page_number, offset, in_overflow, _ = location
+            record.id = new_record.id
+            record.grades = new_record.grades
+            record_page.replace(offset, record)
+            accessor = self.overflow if in_overflow else self
+            accessor.write_page(record_page_number, record_page)
 
     def delete_record(self, key: str, page_number: int) -> None:
         """
-        Delete record with key at page index
+        Delete record with key at page index, record in overflow is unlinked from its chain and its slot is reused,
+        record in main area is removed unless a chain starts at it or it is the dummy one
         :param key: Key of record to be deleted
-        :param page_number: Page number where the record will be searched for
+        :param page_number: Page number of key according to index
         :return: None
         """
-        self.current_disk_operations = 0
-        self.overflow.current_disk_operations = 0
-
-        for record, record_page, record_page_number, offset, in_overflow in self.get_all_records(page_number):
-            if record.key == key:
-                record_str = str(record).rstrip("\n")
-                if PRINT_DEBUG: print(f"DELETING RECORD: {record_str}, {'in overflow ' if in_overflow else 'in main area'} in page {record_page_number} at offset {offset}")
+        if (location := self.locate_record(key, page_number)) is not None:
+            record, record_page, record_page_number, offset, in_overflow, previous = location
+            if in_overflow:
+                previous_page, previous_page_number, previous_offset, previous_in_overflow = previous
+                previous_record = previous_page.record_at(previous_offset)
+                previous_record.pointer = record.pointer
+                previous_page.replace(previous_offset, previous_record)
+                accessor = self.overflow if previous_in_overflow else self
+                accessor.write_page(previous_page_number, previous_page)
+                self.overflow.free_slot((record_page_number, offset))
+                self.count_records(-1)
+            elif record.pointer == (-1, -1) and record.key != self.dummy_record_key:
+                record_page.remove(offset)
+                self.write_page(record_page_number, record_page)
+                self.count_records(-1)
+            else:
                 record.deleted = True
-                record_page = self.update_page(record_page, offset, record, replace=True)
-                accessor = self.overflow if in_overflow else self
-                accessor.write_page(record_page_number, record_page)
+                record_page.replace(offset, record)
+                self.write_page(record_page_number, record_page)
+
+    def find_damaged_ranges(self, fraction: float) -> typing.List[typing.Tuple[int, int]]:
+        """
+        Get ranges of pages of main area with longest overflow chains, which together hold at least fraction of
+        records in overflow, every range is extended over following empty pages
+        :param fraction: Part of overflow records to be reclaimed
+        :return: Ranges of pages as first page and page after the last one, in ascending order
+        """
+        chain_lengths = {page_index: self.overflow_filters.chain_length(physical_page) for page_index, physical_page in enumerate(self.page_map)}
+        total_length = sum(chain_lengths.values())
+        damaged_pages, reclaimed = [], 0
+        for page_index in sorted(chain_lengths, key=lambda page_index: -chain_lengths[page_index]):
+            if reclaimed >= fraction * total_length or not chain_lengths[page_index]:
                 break
+            damaged_pages.append(page_index)
+            reclaimed += chain_lengths[page_index]
 
-        if PRINT_DISK_OPERATIONS: print(f"DISK OPERATIONS: {self.current_disk_operations + self.overflow.current_disk_operations}")
-        self.disk_operations += self.overflow.current_disk_operations
+        ranges = []
+        for page_index in sorted(damaged_pages):
+            if ranges and page_index <= ranges[-1][1]:
+                ranges[-1][1] = max(ranges[-1][1], page_index + 1)
+            else:
+                ranges.append([page_index, page_index + 1])
+            while ranges[-1][1] < len(self.page_map) and not len(self.read_page(ranges[-1][1])):
+                ranges[-1][1] += 1
+        return [(first_page, end_page) for first_page, end_page in ranges]
 
-    def read_page(self, page_index: int) -> bytes:
+    def rewrite_pages(self, first_page: int, end_page: int, alpha: float) -> typing.Tuple[typing.List[str], typing.Optional[str]]:
+        """
+        Rewrite non-deleted records of range of pages with their overflow chains into new pages filled up to alpha,
+        physical pages of range are reused, overflow slots of chains are reclaimed and pages after range are shifted
+        :param first_page: First page of range
+        :param end_page: Page after the last page of range, it must not be empty
+        :param alpha: Fraction of page filled before next page is started
+        :return: First keys of new pages after the first one, smallest key allowed in page following range
+        """
+        with trace(self.tracer, "reorganize.scan", always=True, pages=end_page - first_page):
+            records, overflow_slots = [], []
+            for page_index in range(first_page, end_page):
+                page = self.read_page(page_index)
+                for record, _, page_number, offset, in_overflow in self.get_records_of_page(page_index, page):
+                    if in_overflow:
+                        overflow_slots.append((page_number, offset))
+                    if record.deleted:
+                        self.count_records(-1)
+                        continue
+                    new_record = copy.deepcopy(record)
+                    new_record.add_overflow((-1, -1))
+                    records.append(new_record)
+            for overflow_slot in overflow_slots:
+                self.overflow.free_slot(overflow_slot)
+
+        with trace(self.tracer, "reorganize.page_build", always=True):
+            new_pages = [Page(self.codec, self.page_size)]
+            for record in records:
+                if new_pages[-1].size() >= self.page_size * alpha:
+                    new_pages.append(Page(self.codec, self.page_size))
+                new_pages[-1].append(record)
+
+            old_physical_pages = list(self.page_map[first_page:end_page])
+            for physical_page in old_physical_pages:
+                self.overflow_filters.remove(physical_page)
+            new_physical_pages = old_physical_pages[:len(new_pages)]
+            new_physical_pages += [self.allocate_page() for _ in range(len(new_pages) - len(new_physical_pages))]
+            self.free_pages.extend(old_physical_pages[len(new_pages):])
+            self.page_map[first_page:end_page] = array("q", new_physical_pages)
+            for page_index, page in enumerate(new_pages, first_page):
+                self.write_page(page_index, page)
+
+        if PRINT_DEBUG: print(f"REWRITING PAGES {first_page}-{end_page - 1} INTO {len(new_pages)} PAGES")
+        new_keys = [page.records[0].key for page in new_pages[1:]]
+        following_key = str(int(records[-1].key) + 1).rjust(len(str(self.config["MAX_KEY"])), "0") if records else None
+        return new_keys, following_key
+
+    def read_page(self, page_index: int) -> typing.Optional[Page]:
         """
         Read page at index
         :param page_index: Index of page from which it will be read
-        :return: Page in bytes
+        :return: Decoded page, None if page is past end of main area
+        """
+        if not 0 <= page_index < len(self.page_map):
+            return None
+        if self.latches is not None:
+            self.latches.hold(self.AREA, page_index)
+        return self.buffer_pool.read_page(self.AREA, self.page_map[page_index])
+
+    @traced("main.read")
+    def read_page_from_disk(self, page_index: int) -> typing.Optional[Page]:
+        """
+        Read and decode page at physical index from database file, bypassing buffer pool
+        :param page_index: Physical index of page from which it will be read
+        :return: Decoded page, None if page is past end of main area
         """
-        self.current_disk_operations += 1
-        self.disk_operations += 1
-        with open(self.path, "rb") as database:
-            database.seek(page_index * PAGE_SIZE, os.SEEK_SET)
-            return database.read(PAGE_SIZE)
+        self.counters.main_reads += 1
+        with self.store.view_page(page_index) as data:
+            self.counters.bytes_moved += len(data)
+            return Page.from_bytes(data, self.codec, self.page_size) if data else None
 
     def read_all_pages(self) -> None:
         """
@@ -274,79 +897,115 @@ class Database:
         :return: None
         """
         i = 0
-        while page := self.read_page(i):
+        while (page := self.read_page(i)) is not None:
             print(f"PAGE {i}:")
-            print(page.decode())
+            print(self.codec.page_to_string(page.to_bytes()))
             i += 1
 
-    def write_page(self, page_index: int, page: bytes) -> None:
+    def write_page(self, page_index: int, page: Page) -> None:
         """
         Write new page at index or replace old when if it exists
         :param page_index: Index of page where it will be written
         :param page: New page to be written
         :return: None
         """
-        self.current_disk_operations += 1
-        self.disk_operations += 1
-        with open(self.path, "rb+") as database:
-            database.seek(page_index * PAGE_SIZE, os.SEEK_SET)
-            database.write(page)
+        if self.latches is not None:
+            self.latches.hold(self.AREA, page_index)
+        while len(self.page_map) <= page_index:
+            self.page_map.append(self.allocate_page())
+        self.buffer_pool.write_page(self.AREA, self.page_map[page_index], page)
 
-    def update_page(self, page: bytes, offset: int, record: GradesRecord, replace: bool = False) -> bytes:
+    def allocate_page(self) -> int:
         """
-        Update a page at offset
-        :param page: Page to be updated
-        :param offset: Offset at which to update the page
-        :param record: Record to write in page at offset
-        :param replace: True if existing record should be replaced, False if it should be appended
-        :return: Updated page
+        Get physical page for new page of main area, pages released by partial reorganization are used first
+        :return: Physical index of page
         """
-        if not replace:
-            page = page[:offset * RECORD_SIZE] + record.to_bytes() + page[offset * RECORD_SIZE:]
-            return page[:PAGE_SIZE]
-        else:
-            page = page[:offset * RECORD_SIZE] + record.to_bytes() + page[offset * RECORD_SIZE + RECORD_SIZE:]
-            return page
+        if self.free_pages:
+            return self.free_pages.pop()
+        self.next_physical_page += 1
+        return self.next_physical_page - 1
 
-    def page_size(self, page: bytes) -> int:
+    @traced("main.write")
+    def write_page_to_disk(self, page_index: int, page: Page) -> None:
         """
-        Return size of a page
-        :param page: Page to get size of
-        :return: Size of page
+        Encode and write page at physical index to database file, bypassing buffer pool
+        :param page_index: Physical index of page where it will be written
+        :param page: New page to be written
+        :return: None
+        """
+        data = page.to_bytes()
+        self.counters.main_writes += 1
+        self.counters.bytes_moved += len(data)
+        self.store.write_page(page_index, data)
+        page.dirty = False
+
+    def flush(self) -> None:
+        """
+        Write back all dirty pages of main area and overflow
+        :return: None
+        """
+        self.overflow.flush()
+        self.buffer_pool.flush()
+
+    def sync(self) -> None:
+        """
+        Write back all dirty pages and make main area and overflow files durable
+        :return: None
+        """
+        self.flush()
+        self.store.sync()
+        self.overflow.store.sync()
+
+    def move(self, database_path: str, overflow_path: str) -> None:
+        """
+        Write back all pages and atomically move main area and overflow files to new paths
+        :param database_path: New path of main area
+        :param overflow_path: New path of overflow
+        :return: None
         """
-        return len(page.replace(PADDING_SYMBOL, b""))
+        self.flush()
+        self.store.move(database_path)
+        self.overflow.store.move(overflow_path)
 
-    def get_offset(self, page: bytes, record: GradesRecord) -> int:
+    def close(self) -> None:
         """
-        Get offset of record in page
-        :param page: Page where the record is present
-        :param record: Record to get offset of
-        :return: Offset of record in page
+        Write back all pages and close main area and overflow files
+        :return: None
         """
-        key = record.key.encode()
-        page = page.replace(PADDING_SYMBOL, b"")
-        if len(set(page)) <= 1:  # page is empty
-            return 0
-        page_keys = [k.split(b" ")[0] for k in page.split(b"\n")][:-1]
-        page_keys = [k for k in page_keys if k]  # remove empty strings
+        self.flush()
+        self.store.close()
+        self.overflow.store.close()
+
+    @property
+    def disk_operations(self) -> int:
+        """Number of pages read and written in main area and overflow"""
+        return self.counters.disk_operations
+
+    def snapshot_counters(self) -> typing.Tuple[int, ...]:
+        """
+        Get current values of counters reported in stats of operations
+        :return: Values of OperationStats.FIELDS
+        """
+        counters = self.counters
+        return (counters.main_reads, counters.main_writes, counters.overflow_reads, counters.overflow_writes,
+                counters.chain_hops, self.buffer_pool.hits, counters.bytes_moved)
+
+    @property
+    def cache_hits(self) -> int:
+        """Number of page reads served from buffer pool"""
+        return self.buffer_pool.hits
 
-        for i, page_key in enumerate(page_keys):
-            if key < page_key:
-                return i
-        return len(page_keys)
+    @property
+    def cache_misses(self) -> int:
+        """Number of page reads which had to go to disk"""
+        return self.buffer_pool.misses
 
-    def get_last_offset_of_page(self, page: bytes) -> int:
+    def number_of_main_pages(self) -> int:
         """
-        Get offset of last existing record in page
-        :param page: Page to get last offset
-        :return: Offset of last existing record
+        Get number of pages in main area, including pages which so far exist only in buffer pool
+        :return: Number of pages in main area
         """
-        page = page.replace(PADDING_SYMBOL, b"")
-        if len(set(page)) <= 1:  # page is empty
-            return 0
-        page_keys = [k.split(b" ")[0] for k in page.split(b"\n")][:-1]
-        page_keys = [k for k in page_keys if k]  # remove empty strings
-        return len(page_keys)-1
+        return len(self.page_map)
 
     def number_of_pages(self) -> int:
         """
@@ -356,12 +1015,13 @@ class Database:
         accessors, pages = [self, self.overflow], 0
         for accessor in accessors:
             i = 0
-            while accessor.read_page(i):
+            while accessor.read_page(i) is not None:
                 i += 1
             pages += i
         return pages
 
-    def set_overflow(self, page: bytes, current_page_index: int, overflow_record: GradesRecord) -> None:
+    @traced("chain.insert")
+    def set_overflow(self, page: Page, current_page_index: int, overflow_record: GradesRecord) -> None:
         """
         Set overflow of record which is supposed to be added to a page
         :param page: Page of main area where the file should be added to
@@ -369,22 +1029,24 @@ class Database:
         :param overflow_record: Record to be added to file
         :return: None
         """
-        overflow_pointer = self.overflow.get_new_pointer()
         record_to_update_page_index, record_to_update_offset = self.resolve_previous_record_in_main_area(page, current_page_index, overflow_record)
         if record_to_update_page_index != current_page_index:
             page = self.read_page(record_to_update_page_index)
-            record_to_update_offset = self.get_last_offset_of_page(page)
+            record_to_update_offset = page.last_offset()
 
-        while record_to_update := self.get_record_at_offset(record_to_update_offset, page) is None:
+        while page.record_at(record_to_update_offset) is None:
             record_to_update_page_index -= 1
             page = self.read_page(record_to_update_page_index)
-            record_to_update_offset = self.get_last_offset_of_page(page)
+            record_to_update_offset = page.last_offset()
 
-        record_to_update = self.get_record_at_offset(record_to_update_offset, page)
+        record_to_update = page.record_at(record_to_update_offset)
+        home_page = self.page_map[record_to_update_page_index]
+        self.overflow_filters.add(home_page, overflow_record.key)
+        overflow_pointer = self.overflow.get_new_pointer(home_page)
 
         if record_to_update.pointer == (-1, -1):  # record currently points to nothing
             record_to_update.pointer = overflow_pointer
-            page = self.update_page(page, record_to_update_offset, record_to_update, replace=True)
+            page.replace(record_to_update_offset, record_to_update)
             self.write_page(record_to_update_page_index, page)
         else:  # traverse the list
             update_record_in_main_area = True
@@ -394,8 +1056,9 @@ class Database:
 
             next_record_page_index = record_to_update.pointer[0]
             next_record_offset = record_to_update.pointer[1]
-            next_page = self.overflow.read_page(next_record_page_index)
-            next_record = self.get_record_at_offset(next_record_offset, next_page)
+            self.counters.chains_walked += 1
+            next_page = self.overflow.read_chain_page(next_record_page_index)
+            next_record = next_page.record_at(next_record_offset)
 
             while overflow_record > next_record and next_record.pointer != (-1, -1):  # go through the list
                 update_record_in_main_area = False
@@ -403,30 +1066,28 @@ class Database:
                 previous_page = next_page
                 previous_page_index, previous_offset = next_record_page_index, next_record_offset
 
-
                 next_record_page_index = next_record.pointer[0]
                 next_record_offset = next_record.pointer[1]
                 if next_record_page_index != previous_page_index:
-                    next_page = self.overflow.read_page(next_record_page_index)
-                next_record = self.get_record_at_offset(next_record_offset, next_page)
+                    next_page = self.overflow.read_chain_page(next_record_page_index)
+                next_record = next_page.record_at(next_record_offset)
 
             if next_record < overflow_record and next_record.pointer == (-1, -1):  # if end of list is still lower than new record
                 next_record.pointer = overflow_pointer
-                next_page = self.update_page(next_page, next_record_offset, next_record, replace=True)
-
+                next_page.replace(next_record_offset, next_record)
                 self.overflow.write_page(next_record_page_index, next_page)
             else:
                 previous_record.pointer = overflow_pointer
-                previous_page = self.update_page(previous_page, previous_offset, previous_record, replace=True)
+                previous_page.replace(previous_offset, previous_record)
                 if update_record_in_main_area:
                     self.write_page(previous_page_index, previous_page)
                 else:
                     self.overflow.write_page(previous_page_index, previous_page)
                 overflow_record.pointer = (next_record_page_index, next_record_offset)
 
-        self.overflow.add_record(overflow_record)
+        self.overflow.add_record(overflow_record, home_page)
 
-    def resolve_previous_record_in_main_area(self, page: bytes, current_page_index: int, record: GradesRecord) -> typing.Tuple[int, int]:
+    def resolve_previous_record_in_main_area(self, page: Page, current_page_index: int, record: GradesRecord) -> typing.Tuple[int, int]:
         """
         Get page index and offset of preceding record in main area
         :param page: Page where the record is stored
@@ -434,31 +1095,43 @@ class Database:
         :param record: Record to be resolved
         :return: Page index and offset of preceding record in main area
         """
-        offset = self.get_offset(page, record) - 1
+        offset = page.offset_of(record.key) - 1
         if offset == -1:
             current_page_index -= 1
         return current_page_index, offset
 
-    def get_all_records(self, starting_page_num: int = 0) -> typing.Generator:
+    def get_all_records(self, starting_page_num: int = 0, starting_offset: int = 0) -> typing.Generator:
         """
-        Yield all records in file
+        Yield all records in file in order of keys, every page is decoded once
         :param starting_page_num: Page to start
-        :return: Record, number of page, current offset, is in overflow
-        """
-        while page := self.read_page(starting_page_num):
-            for offset in range(BLOCKING_FACTOR):
-                record = self.get_record_at_offset(offset, page)
-                if record is not None:
-                    yield record, page, starting_page_num, offset, False
-                    overflow_page_index, overflow_page = None, None
-                    while record.pointer != (-1, -1):
-                        previous_page_index = overflow_page_index
-                        overflow_page_index, overflow_offset = record.pointer[0], record.pointer[1]  # TODO: fix this not to read page each time
-                        if previous_page_index != overflow_page_index:
-                            overflow_page = self.overflow.read_page(overflow_page_index)
-                        record = self.get_record_at_offset(overflow_offset, overflow_page)
-                        yield record, overflow_page, overflow_page_index, overflow_offset, True
+        :param starting_offset: Offset of record in main area of starting page to start
+        :return: Record, page, number of page, current offset, is in overflow
+        """
+        while (page := self.read_page(starting_page_num)) is not None:
+            yield from self.get_records_of_page(starting_page_num, page, starting_offset)
             starting_page_num += 1
+            starting_offset = 0
+
+    def get_records_of_page(self, page_index: int, page: Page, starting_offset: int = 0) -> typing.Generator:
+        """
+        Yield records of page of main area in order of keys, each followed by its overflow chain
+        :param page_index: Index of page
+        :param page: Page of main area
+        :param starting_offset: Offset of record to start
+        :return: Record, page, number of page, current offset, is in overflow
+        """
+        for offset, record in enumerate(page.records[starting_offset:], starting_offset):
+            yield record, page, page_index, offset, False
+            overflow_page_index, overflow_page = None, None
+            if record.pointer != (-1, -1):
+                self.counters.chains_walked += 1
+            while record.pointer != (-1, -1):
+                previous_page_index = overflow_page_index
+                overflow_page_index, overflow_offset = record.pointer[0], record.pointer[1]
+                if previous_page_index != overflow_page_index:
+                    overflow_page = self.overflow.read_chain_page(overflow_page_index)
+                record = overflow_page.record_at(overflow_offset)
+                yield record, overflow_page, overflow_page_index, overflow_offset, True
 
     def print_all_records(self, starting_page_num: int = 0, only_existing: bool = True) -> None:
         """
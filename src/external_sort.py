@@ -0,0 +1,58 @@
+import heapq
+import itertools
+import os
+import tempfile
+import typing
+from record import GradesRecord, BinaryRecordCodec
+
+RUN_READ_RECORDS = 1024
+
+
+def write_run(records: typing.List[GradesRecord], directory: str, codec: BinaryRecordCodec) -> str:
+    """
+    Write sorted run of records to temporary file
+    :param records: Records sorted by key
+    :param directory: Directory of temporary file
+    :param codec: Codec of records in run
+    :return: Path of run
+    """
+    run_file, path = tempfile.mkstemp(suffix=".run", dir=directory)
+    with os.fdopen(run_file, "wb") as run:
+        run.write(b"".join(codec.encode(record) for record in records))
+    return path
+
+
+def read_run(path: str, codec: BinaryRecordCodec) -> typing.Generator[GradesRecord, None, None]:
+    """
+    Yield records of sorted run, run is removed when it is exhausted
+    :param path: Path of run
+    :param codec: Codec of records in run
+    :return: Records of run
+    """
+    try:
+        with open(path, "rb") as run:
+            while chunk := run.read(RUN_READ_RECORDS * codec.record_size):
+                for offset in range(len(chunk) // codec.record_size):
+                    yield codec.decode_at(chunk, offset)
+    finally:
+        os.remove(path)
+
+
+def sort_records(records: typing.Iterable[GradesRecord], buffer_records: int, key_length: int, directory: typing.Optional[str] = None) -> typing.Iterator[GradesRecord]:
+    """
+    Sort records by key, spilling sorted runs to disk and merging them when they do not fit in buffer
+    :param records: Records in any order
+    :param buffer_records: Maximum number of records sorted in memory at once
+    :param key_length: Number of digits of keys
+    :param directory: Directory for temporary runs, system default if None
+    :return: Records sorted by key, records with equal keys keep input order
+    """
+    records = iter(records)
+    codec = BinaryRecordCodec(key_length)
+    runs = []
+    while chunk := list(itertools.islice(records, buffer_records)):
+        chunk.sort(key=lambda record: record.key)
+        if not runs and len(chunk) < buffer_records:  # everything fits in memory
+            return iter(chunk)
+        runs.append(write_run(chunk, directory, codec))
+    return heapq.merge(*[read_run(run, codec) for run in runs], key=lambda record: record.key)
@@ -0,0 +1,29 @@
+import struct
+import typing
+
+HEADER_SIZE = 64
+MAGIC = b"SEQIND"
+HEADER_STRUCT = struct.Struct("<6sBHii")  # magic, record format version, record size, first free slot page and offset
+
+
+class FileHeader:
+    """Header stored at the beginning of main area and overflow files"""
+    def __init__(self, format_version: int, record_size: int, free_slot: typing.Tuple[int, int] = (-1, -1)):
+        self.format_version = format_version
+        self.record_size = record_size
+        self.free_slot = free_slot  # head of list of free slots threaded through their pointers, used by overflow
+
+    def to_bytes(self) -> bytes:
+        return HEADER_STRUCT.pack(MAGIC, self.format_version, self.record_size, *self.free_slot).ljust(HEADER_SIZE, b"\0")
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "FileHeader":
+        """
+        Parse header from beginning of file
+        :param data: First bytes of file
+        :return: Parsed header
+        """
+        magic, format_version, record_size, free_slot_page, free_slot_offset = HEADER_STRUCT.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("File does not start with sequential-indexed file header")
+        return cls(format_version, record_size, (free_slot_page, free_slot_offset))
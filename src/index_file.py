@@ -1,35 +1,34 @@
 import bisect
-import json
 import math
+import mmap
+import os
+import struct
+import typing
+from array import array
 from record import GradesRecord
+from config import CONFIG, Config
+from page_journal import PageJournal
+from tracing import Tracer, traced
 
-CONFIG_PATH = "configs/config.json"
-with open(CONFIG_PATH, "r") as json_config:
-    CONFIG = json.load(json_config)
-
-MAX_KEY = CONFIG["MAX_KEY"]
-INITIAL_NO_OF_PAGES = CONFIG["INITIAL_NO_OF_PAGES"]
-
-
-class Index:
-    """Single index - key and page number"""
-    def __init__(self, key: str, page_number: int):
-        self.key = key
-        self.page_number = page_number
-
-    def __str__(self):
-        return self.key + " " + str(self.page_number) + "\n"
-
-    def __lt__(self, other):
-        return self.key < other.key
+INDEX_HEADER = struct.Struct("<8sQ")  # magic, number of entries
+INDEX_MAGIC = b"SEQINDIX"
+ENTRY_TYPECODE = "q"
 
 
 class IndexFile:
-    """File with indexes"""
-    def __init__(self, path: str):
+    """File with indexes, kept as two parallel arrays of keys and page numbers sorted by key"""
+    def __init__(self, path: str, create: bool = True, config: Config = CONFIG):
         self.path = path
-        self.entries = []
-        self.clear_index_file()
+        self.config = config
+        self.keys: typing.Sequence[int] = array(ENTRY_TYPECODE)
+        self.pages: typing.Sequence[int] = array(ENTRY_TYPECODE)
+        self.map: typing.Optional[mmap.mmap] = None
+        self.tracer: typing.Optional[Tracer] = None
+        self.journal: typing.Optional[PageJournal] = None
+        if create:
+            self.clear_index_file()
+        else:
+            self.load_from_file()
 
     def clear_index_file(self) -> None:
         """
@@ -38,45 +37,118 @@ class IndexFile:
         """
         open(self.path, "w").close()
 
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __iter__(self) -> typing.Iterator[typing.Tuple[str, int]]:
+        for key, page_number in zip(self.keys, self.pages):
+            yield str(key).rjust(len(str(self.config["MAX_KEY"])), "0"), page_number
+
     def dump_to_file(self) -> None:
         """
-        Save current indexed to file
+        Save current indexes to file, keys and page numbers are stored as raw arrays which can be memory-mapped
         :return: None
         """
-        with open(self.path, "w") as index_file:
-            for entry in self.entries:
-                index_file.write(str(entry))
+        if not isinstance(self.keys, array):  # memory-mapped entries were not modified
+            return
+        if self.journal is not None and os.path.exists(self.path):
+            self.journal.protect(self.path, 0, os.path.getsize(self.path))
+        with open(self.path, "wb") as index_file:
+            index_file.write(INDEX_HEADER.pack(INDEX_MAGIC, len(self.keys)))
+            index_file.write(bytes(memoryview(self.keys)))
+            index_file.write(bytes(memoryview(self.pages)))
+            index_file.flush()
+            os.fsync(index_file.fileno())
+
+    def use_journal(self, journal: typing.Optional[PageJournal]) -> None:
+        """
+        Save index file to journal before it is rewritten
+        :param journal: Journal of file, None to stop journaling
+        :return: None
+        """
+        self.journal = journal
+
+    def load_from_file(self) -> None:
+        """
+        Memory-map index file, arrays are copied only when a new index is added
+        :return: None
+        """
+        with open(self.path, "rb") as index_file:
+            self.map = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, number_of_entries = INDEX_HEADER.unpack_from(self.map)
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"{self.path} is not an index file")
+        entries = memoryview(self.map)[INDEX_HEADER.size:].cast(ENTRY_TYPECODE)
+        self.keys = entries[:number_of_entries]
+        self.pages = entries[number_of_entries:2 * number_of_entries]
+
+    def make_writable(self) -> None:
+        """
+        Copy memory-mapped entries to arrays before modifying them
+        :return: None
+        """
+        if isinstance(self.keys, array):
+            return
+        self.keys, self.pages = array(ENTRY_TYPECODE, self.keys), array(ENTRY_TYPECODE, self.pages)
 
     def initialize_indexes(self) -> None:
         """
         Initialize indexes at file creation
         :return: None
         """
-        for page_no, key in enumerate(range(0, MAX_KEY, math.ceil(MAX_KEY/INITIAL_NO_OF_PAGES))):
-            new_index = Index(str(key).rjust(len(str(MAX_KEY)), "0"), page_no)
-            self.entries.append(new_index)
+        max_key = self.config["MAX_KEY"]
+        for page_no, key in enumerate(range(0, max_key, math.ceil(max_key/self.config["INITIAL_NO_OF_PAGES"]))):
+            self.add_index(str(key), page_no)
 
     def add_index(self, key: str, page_index: int) -> None:
         """
-        Add new index to file
+        Add new index to file, entries stay sorted by key
         :param key: Key of record
         :param page_index: Page of record
         :return: None
         """
-        index = Index(key, page_index)
-        self.entries.append(index)
-
+        self.make_writable()
+        key = int(key)
+        position = bisect.bisect_right(self.keys, key)
+        if position == len(self.keys):  # indexes are usually added in ascending order
+            self.keys.append(key)
+            self.pages.append(page_index)
+        else:
+            self.keys.insert(position, key)
+            self.pages.insert(position, page_index)
+
+    def replace_pages(self, first_page: int, end_page: int, new_keys: typing.List[str], following_key: typing.Optional[str]) -> None:
+        """
+        Replace indexes of range of pages rewritten into new pages, first page keeps its key and pages after range
+        are shifted
+        :param first_page: First page of range
+        :param end_page: Page after the last page of range
+        :param new_keys: First keys of new pages after the first one
+        :param following_key: Smallest key allowed in page following range, None to keep its key
+        :return: None
+        """
+        self.make_writable()
+        start = bisect.bisect_left(self.pages, first_page)
+        end = bisect.bisect_left(self.pages, end_page)
+        shift = len(new_keys) + 1 - (end_page - first_page)
+        for position in range(end, len(self.pages)):
+            self.pages[position] += shift
+        if following_key is not None and end < len(self.keys):
+            self.keys[end] = max(self.keys[end], int(following_key))
+        self.keys[start + 1:end] = array(ENTRY_TYPECODE, [int(key) for key in new_keys])
+        self.pages[start + 1:end] = array(ENTRY_TYPECODE, range(first_page + 1, first_page + 1 + len(new_keys)))
+
+    @traced("index.lookup")
     def get_page_of_key(self, key: str) -> int:
         """
         Get page number of record with matching key
         :param key: Key of record to get page of
         :return: Page of record
         """
-        assert self.entries, "There are no entries in index file"
+        assert len(self.keys), "There are no entries in index file"
 
-        keys = [entry.key for entry in self.entries]
-        previous_index = bisect.bisect_left(keys, key) - 1
-        return self.entries[previous_index].page_number
+        previous_index = bisect.bisect_right(self.keys, int(key)) - 1
+        return self.pages[max(previous_index, 0)]
 
     def get_page_to_insert(self, record: GradesRecord) -> int:
         """
@@ -84,9 +156,26 @@ class IndexFile:
         :param record: Record to get page number for
         :return: Page number of last smallest key or 0 if there are no entries yet
         """
-        if not self.entries:
+        if not len(self.keys):
             return 0
 
-        sorted_entries = sorted(self.entries, key=lambda entry: entry.key)
-        previous_index = bisect.bisect_left(sorted_entries, record)-1
-        return sorted_entries[previous_index].page_number
+        return self.get_page_of_key(record.key)
+
+    def move(self, new_path: str) -> None:
+        """
+        Atomically move index file to new path
+        :param new_path: New path of index file
+        :return: None
+        """
+        os.replace(self.path, new_path)
+        self.path = new_path
+
+    def close(self) -> None:
+        """
+        Release memory-mapped index file
+        :return: None
+        """
+        if self.map is not None:
+            self.make_writable()
+            self.map.close()
+            self.map = None
@@ -0,0 +1,173 @@
+import contextlib
+import threading
+import typing
+
+KEY_LATCH_STRIPES = 64
+
+
+class ReadWriteLatch:
+    """Latch held by many readers or by one writer, waiting writer blocks new readers, writer may take it again"""
+    def __init__(self):
+        self.condition = threading.Condition(threading.Lock())
+        self.readers = 0
+        self.writer: typing.Optional[int] = None  # ident of thread holding latch exclusively
+        self.writer_depth = 0
+        self.waiting_writers = 0
+
+    def acquire_shared(self) -> None:
+        with self.condition:
+            if self.writer == threading.get_ident():
+                self.writer_depth += 1
+                return
+            while self.writer is not None or self.waiting_writers:
+                self.condition.wait()
+            self.readers += 1
+
+    def release_shared(self) -> None:
+        with self.condition:
+            if self.writer == threading.get_ident():
+                self.writer_depth -= 1
+                return
+            self.readers -= 1
+            if not self.readers:
+                self.condition.notify_all()
+
+    def acquire_exclusive(self) -> None:
+        with self.condition:
+            if self.writer == threading.get_ident():
+                self.writer_depth += 1
+                return
+            self.waiting_writers += 1
+            while self.writer is not None or self.readers:
+                self.condition.wait()
+            self.waiting_writers -= 1
+            self.writer, self.writer_depth = threading.get_ident(), 1
+
+    def release_exclusive(self) -> None:
+        with self.condition:
+            self.writer_depth -= 1
+            if not self.writer_depth:
+                self.writer = None
+                self.condition.notify_all()
+
+    @contextlib.contextmanager
+    def shared(self) -> typing.Iterator[None]:
+        self.acquire_shared()
+        try:
+            yield
+        finally:
+            self.release_shared()
+
+    @contextlib.contextmanager
+    def exclusive(self) -> typing.Iterator[None]:
+        self.acquire_exclusive()
+        try:
+            yield
+        finally:
+            self.release_exclusive()
+
+
+class PageLatches:
+    """Latches of pages of file, latches taken during an operation of thread are held until the operation ends"""
+    def __init__(self):
+        self.latches: typing.Dict[typing.Tuple[str, int], ReadWriteLatch] = {}
+        self.mutex = threading.Lock()  # guards creation of latches
+        self.structure_lock = threading.RLock()  # guards overflow allocator and chains modified by writers
+        self.local = threading.local()
+
+    def latch(self, area: str, page_index: int) -> ReadWriteLatch:
+        """
+        Get latch of page, latch is created on first use
+        :param area: Name of area
+        :param page_index: Index of page
+        :return: Latch of page
+        """
+        key = (area, page_index)
+        if (latch := self.latches.get(key)) is None:
+            with self.mutex:
+                latch = self.latches.setdefault(key, ReadWriteLatch())
+        return latch
+
+    @contextlib.contextmanager
+    def operation(self, write: bool) -> typing.Iterator[None]:
+        """
+        Run operation of thread, latches taken by it are released at its end
+        :param write: Operation changes pages, so latches are taken exclusively
+        :return: None
+        """
+        self.local.write = write
+        self.local.held = []
+        self.local.holds_structure = False
+        try:
+            yield
+        finally:
+            held, self.local.held = self.local.held, None
+            if self.local.holds_structure:
+                self.structure_lock.release()
+            for latch in reversed(held):
+                latch.release_exclusive() if write else latch.release_shared()
+
+    def hold(self, area: str, page_index: int) -> None:
+        """
+        Take latch of page for current operation of thread, pages read outside of operations are not latched
+        :param area: Name of area
+        :param page_index: Index of page
+        :return: None
+        """
+        held = getattr(self.local, "held", None)
+        if held is None:
+            return
+        latch = self.latch(area, page_index)
+        if latch in held:
+            return
+        latch.acquire_exclusive() if self.local.write else latch.acquire_shared()
+        held.append(latch)
+
+    @contextlib.contextmanager
+    def structure(self) -> typing.Iterator[None]:
+        """
+        Hold structure lock, write operation of thread keeps it until the operation ends, it is taken after latches
+        of pages of main area and no page is latched while holding it
+        :return: None
+        """
+        if getattr(self.local, "held", None) is not None and self.local.write:
+            if not self.local.holds_structure:
+                self.structure_lock.acquire()
+                self.local.holds_structure = True
+            yield
+            return
+        with self.structure_lock:
+            yield
+
+    def release_structure(self) -> None:
+        """
+        Release structure lock held by write operation of thread before it latches further pages, overflow pages it
+        changed have to be written back already
+        :return: None
+        """
+        if getattr(self.local, "held", None) is not None and self.local.holds_structure:
+            self.local.holds_structure = False
+            self.structure_lock.release()
+
+
+class KeyLatches:
+    """Latches of keys hashed to fixed number of stripes, write operation holds latches of its keys while it is logged
+    and applied, so that conflicting operations are applied in order of their log entries"""
+    def __init__(self, stripes: int = KEY_LATCH_STRIPES):
+        self.locks = [threading.Lock() for _ in range(stripes)]
+
+    @contextlib.contextmanager
+    def hold(self, keys: typing.Iterable[str]) -> typing.Iterator[None]:
+        """
+        Hold latches of keys, stripes are taken in ascending order so that batches do not deadlock
+        :param keys: Keys changed by operation
+        :return: None
+        """
+        stripes = sorted({hash(key) % len(self.locks) for key in keys})
+        for stripe in stripes:
+            self.locks[stripe].acquire()
+        try:
+            yield
+        finally:
+            for stripe in reversed(stripes):
+                self.locks[stripe].release()
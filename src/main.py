@@ -1,14 +1,10 @@
 import random
-import json
-import itertools
-import copy
 import time
+import threading
+from config import CONFIG
 from record import GradesRecord
 from seq_ind_file import SeqIndFile
-
-CONFIG_PATH = "configs/config.json"
-with open(CONFIG_PATH, "r") as json_config:
-    CONFIG = json.load(json_config)
+from sweep import sweep, save_results
 
 MAX_KEY = CONFIG["MAX_KEY"]
 N_RANDOM_DATA = CONFIG["N_RANDOM_DATA"]
@@ -34,6 +30,7 @@ def generate_random_data(print_at_end: bool = True):
     if print_at_end:
         print("\nFINAL FILE:")
         seq_ind_file.print_records()
+    seq_ind_file.close()
 
     return seq_ind_file.database.disk_operations
 
@@ -59,6 +56,24 @@ def load_data_from_file(data_source: str = "data/input.txt", print_at_end: bool
     if print_at_end:
         print("\nFINAL FILE:")
         seq_ind_file.print_records()
+    seq_ind_file.close()
+
+    return seq_ind_file.database.disk_operations
+
+
+def bulk_load_data_from_file(data_source: str = "data/experiment/experiment_data.txt", print_at_end: bool = True):
+    """Create sequential-indexed file from records of add commands in file, loading them all at once"""
+    seq_ind_file = SeqIndFile("data/database.dat", "data/overflow.dat", "data/index_file.dat")
+
+    with open(data_source) as input_file:
+        records = (GradesRecord(input_line[1].rjust(len(str(MAX_KEY)), "0"), int(input_line[2]), [input_line[i] for i in [3, 4, 5]])
+                   for input_line in (line.rstrip("\n").split(" ") for line in input_file) if input_line[0] == "A")
+        seq_ind_file.bulk_load(records)
+
+    if print_at_end:
+        print("\nFINAL FILE:")
+        seq_ind_file.print_records()
+    seq_ind_file.close()
 
     return seq_ind_file.database.disk_operations
 
@@ -86,39 +101,73 @@ def load_interactive_data(print_at_end: bool = True):
     if print_at_end:
         print("\nFINAL FILE:")
         seq_ind_file.print_records()
+    seq_ind_file.close()
 
     return seq_ind_file.database.disk_operations
 
 
 
-def experiment():
-    """Run experiment and save results to file"""
-    alphas = [i*0.1 for i in range(1, 8)]
+def experiment(name: str = "sweep"):
+    """Run experiment in parallel processes and save results to file"""
+    alphas = [round(i*0.1, 1) for i in range(1, 8)]
     max_overflow_no_of_pages = [i for i in range(1, 10)]
     results = []
 
-    for alpha, max_overflow_pages in itertools.product(alphas, max_overflow_no_of_pages):
-        new_config = copy.deepcopy(CONFIG)
-        new_config["ALPHA"] = alpha
-        new_config["MAX_OVERFLOW_PAGE_NO"] = max_overflow_pages
-        with open(CONFIG_PATH, "w") as json_config:
-            json.dump(new_config, json_config)
+    for result in sweep(alphas, max_overflow_no_of_pages, "data/experiment/experiment_data.txt"):
+        print(f"ALPHA: {result['alpha']}, MAX OVERFLOW PAGES: {result['max_overflow_pages']}, DISK OP: {result['disk_operations']}, TIME: {result['time']}")
+        results.append(result)
+
+    save_results(results, f"data/experiment/experiment_results_{name}")
+
+
+def stress_benchmark():
+    """Run random reads and inserts in growing number of threads sharing latched file and print throughput"""
+    thread_counts = [1, 2, 4, 8]
+    number_of_records, number_of_operations, read_fraction = 20000, 20000, 0.8
+    config = CONFIG.replace(CONCURRENCY_MODE="latched")
+
+    base_throughput = None
+    for thread_count in thread_counts:
+        keys = [str(key).rjust(len(str(MAX_KEY)), "0") for key in random.sample(range(MAX_KEY), number_of_records + number_of_operations)]
+        seq_ind_file = SeqIndFile("data/database.dat", "data/overflow.dat", "data/index_file.dat", config=config)
+        seq_ind_file.bulk_load(GradesRecord(key) for key in keys[:number_of_records])
+
+        operations = []
+        for new_key in keys[number_of_records:]:
+            draw = random.random()
+            if draw < read_fraction * 0.9:
+                operations.append((seq_ind_file.get_record, random.choice(keys[:number_of_records])))
+            elif draw < read_fraction:
+                operations.append((lambda key: list(seq_ind_file.scan(key, limit=20)), random.choice(keys[:number_of_records])))
+            else:
+                operations.append((seq_ind_file.add_record, GradesRecord(new_key)))
+
+        def run_operations(thread_operations):
+            for operation, argument in thread_operations:
+                operation(argument)
+
+        threads = [threading.Thread(target=run_operations, args=(operations[i::thread_count],)) for i in range(thread_count)]
         start = time.time()
-        disk_operations = load_data_from_file(data_source="data/experiment/experiment_data.txt", print_at_end=False)
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
         end = time.time()
-        print(f"ALPHA: {alpha}, MAX OVERFLOW PAGES: {max_overflow_pages}, DISK OP: {disk_operations}, TIME: {end-start}")
-        results.append(disk_operations)
+        seq_ind_file.close()
 
-    with open(CONFIG_PATH, "w") as json_config:
-        json.dump(CONFIG, json_config, indent=4)
+        throughput = number_of_operations / (end - start)
+        base_throughput = base_throughput or throughput
+        print(f"THREADS: {thread_count}, OPERATIONS/S: {throughput:.0f}, SPEEDUP: {throughput / base_throughput:.2f}, DISK OP: {seq_ind_file.database.disk_operations}")
 
 
-method_function = {1: generate_random_data, 2: load_data_from_file, 3: load_interactive_data, 4: experiment}
+method_function = {1: generate_random_data, 2: load_data_from_file, 3: load_interactive_data, 4: experiment, 5: bulk_load_data_from_file, 6: stress_benchmark}
 
 if __name__ == "__main__":
     print("1. Generate random data")
     print("2. Load data from file")
     print("3. Load data interactively")
     print("4. Run experiment")
+    print("5. Bulk load data from file")
+    print("6. Run stress benchmark")
     choice = int(input("Choose data loading method: "))
     method_function.get(choice)()
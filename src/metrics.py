@@ -0,0 +1,224 @@
+import bisect
+import functools
+import time
+import typing
+
+HISTOGRAM_BOUNDS = [2 ** exponent * 1e-6 for exponent in range(32)]  # upper bounds of buckets in seconds, from 1 us
+
+
+class IOCounters:
+    """Cumulative page transfers of main area and overflow, shared by both areas of file"""
+    def __init__(self):
+        self.main_reads = 0
+        self.main_writes = 0
+        self.overflow_reads = 0
+        self.overflow_writes = 0
+        self.chains_walked = 0
+        self.chain_hops = 0  # overflow pages read while walking chains
+        self.bytes_moved = 0
+        self.operations = 0  # operations of file other than reorganizations and bulk loads
+        self.lookups = 0  # single record lookups among operations
+        self.lookup_overflow_reads = 0  # overflow pages read by lookups
+
+    @property
+    def disk_operations(self) -> int:
+        """Number of pages read and written in both areas"""
+        return self.main_reads + self.main_writes + self.overflow_reads + self.overflow_writes
+
+    def absorb(self, other: "IOCounters") -> None:
+        """
+        Add counters of other areas, used when files are replaced by reorganized ones
+        :param other: Counters to be added
+        :return: None
+        """
+        self.main_reads += other.main_reads
+        self.main_writes += other.main_writes
+        self.overflow_reads += other.overflow_reads
+        self.overflow_writes += other.overflow_writes
+        self.chains_walked += other.chains_walked
+        self.chain_hops += other.chain_hops
+        self.bytes_moved += other.bytes_moved
+        self.operations += other.operations
+        self.lookups += other.lookups
+        self.lookup_overflow_reads += other.lookup_overflow_reads
+
+
+class OperationStats:
+    """Page transfers, chain hops, cache hits, bytes moved and time of single operation of file"""
+    FIELDS = ("main_reads", "main_writes", "overflow_reads", "overflow_writes", "chain_hops", "cache_hits", "bytes_moved")
+    __slots__ = ("operation", "elapsed") + FIELDS
+
+    def __init__(self, operation: str, elapsed: float, main_reads: int = 0, main_writes: int = 0, overflow_reads: int = 0,
+                 overflow_writes: int = 0, chain_hops: int = 0, cache_hits: int = 0, bytes_moved: int = 0):
+        self.operation = operation
+        self.elapsed = elapsed
+        self.main_reads = main_reads
+        self.main_writes = main_writes
+        self.overflow_reads = overflow_reads
+        self.overflow_writes = overflow_writes
+        self.chain_hops = chain_hops
+        self.cache_hits = cache_hits
+        self.bytes_moved = bytes_moved
+
+    @property
+    def disk_operations(self) -> int:
+        """Number of pages read and written in both areas"""
+        return self.main_reads + self.main_writes + self.overflow_reads + self.overflow_writes
+
+    def to_dict(self) -> typing.Dict[str, typing.Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self) -> str:
+        return f"OperationStats({', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)})"
+
+
+class LatencyHistogram:
+    """Latencies counted in buckets doubling from one microsecond"""
+    def __init__(self):
+        self.buckets = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def record(self, elapsed: float) -> None:
+        """
+        Count latency
+        :param elapsed: Latency in seconds
+        :return: None
+        """
+        self.buckets[bisect.bisect_left(HISTOGRAM_BOUNDS, elapsed)] += 1
+        self.count += 1
+        self.total += elapsed
+
+    @property
+    def mean(self) -> float:
+        """Mean latency in seconds"""
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, fraction: float) -> float:
+        """
+        Get upper bound of bucket holding percentile
+        :param fraction: Fraction of latencies at or below percentile
+        :return: Latency in seconds, infinity if percentile is past the last bound
+        """
+        rank, seen = fraction * self.count, 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return HISTOGRAM_BOUNDS[bucket] if bucket < len(HISTOGRAM_BOUNDS) else float("inf")
+        return 0.0
+
+
+class LatencyHistograms:
+    """Subscriber keeping latency histogram of every kind of operation"""
+    def __init__(self):
+        self.histograms: typing.Dict[str, LatencyHistogram] = {}
+
+    def __call__(self, stats: OperationStats) -> None:
+        if (histogram := self.histograms.get(stats.operation)) is None:
+            histogram = self.histograms.setdefault(stats.operation, LatencyHistogram())
+        histogram.record(stats.elapsed)
+
+
+class OperationTotals:
+    """Subscriber summing stats of every kind of operation"""
+    def __init__(self):
+        self.operations: typing.Dict[str, int] = {}
+        self.totals: typing.Dict[str, typing.Dict[str, float]] = {}
+
+    def __call__(self, stats: OperationStats) -> None:
+        self.operations[stats.operation] = self.operations.get(stats.operation, 0) + 1
+        totals = self.totals.setdefault(stats.operation, dict.fromkeys(("elapsed",) + OperationStats.FIELDS, 0))
+        for name in totals:
+            totals[name] += getattr(stats, name)
+
+
+def print_disk_operations(stats: OperationStats) -> None:
+    """
+    Subscriber printing number of disk operations of every operation
+    :param stats: Stats of operation
+    :return: None
+    """
+    print(f"DISK OPERATIONS: {stats.disk_operations}")
+
+
+def print_operation(stats: OperationStats) -> None:
+    """
+    Subscriber printing kind, page transfers by area and chain hops of every operation
+    :param stats: Stats of operation
+    :return: None
+    """
+    print(f"{stats.operation.upper()}: main {stats.main_reads} read/{stats.main_writes} written, overflow {stats.overflow_reads} read/"
+          f"{stats.overflow_writes} written, {stats.chain_hops} chain hops")
+
+
+class Metrics:
+    """Stats of operations of file delivered to subscribers, nothing is measured while there are no subscribers"""
+    def __init__(self, counters: typing.Callable[[], typing.Tuple[int, ...]]):
+        self.counters = counters  # current cumulative values of OperationStats.FIELDS
+        self.subscribers: typing.List[typing.Callable[[OperationStats], None]] = []
+
+    def subscribe(self, subscriber: typing.Callable[[OperationStats], None]) -> typing.Callable[[OperationStats], None]:
+        """
+        Deliver stats of every following operation to subscriber, subscribers are called by thread which ran operation
+        :param subscriber: Callable receiving stats
+        :return: Subscriber, so that it can be unsubscribed later
+        """
+        self.subscribers = self.subscribers + [subscriber]  # copied so that operations running meanwhile are not affected
+        return subscriber
+
+    def unsubscribe(self, subscriber: typing.Callable[[OperationStats], None]) -> None:
+        """
+        Stop delivering stats to subscriber
+        :param subscriber: Subscriber to be removed
+        :return: None
+        """
+        self.subscribers = [other for other in self.subscribers if other is not subscriber]
+
+    def publish(self, operation: str, before: typing.Tuple[int, ...], start: float) -> None:
+        """
+        Deliver stats of finished operation to subscribers, counters of operations running at once in other threads
+        are attributed to every one of them
+        :param operation: Name of operation
+        :param before: Counters at the beginning of operation
+        :param start: Time at the beginning of operation
+        :return: None
+        """
+        elapsed = time.perf_counter() - start
+        stats = OperationStats(operation, elapsed, *(after - value for after, value in zip(self.counters(), before)))
+        for subscriber in self.subscribers:
+            subscriber(stats)
+
+    def measure_generator(self, operation: str, generator: typing.Generator) -> typing.Generator:
+        """
+        Yield from generator and publish its stats once it is exhausted or closed, time spent by consumer between
+        items is included
+        :param operation: Name of operation
+        :param generator: Generator to be measured
+        :return: Items of generator
+        """
+        before, start = self.counters(), time.perf_counter()
+        try:
+            yield from generator
+        finally:
+            self.publish(operation, before, start)
+
+
+def measured(operation: str) -> typing.Callable:
+    """
+    Decorate method of object with metrics, so that stats of its every call are published
+    :param operation: Name of operation
+    :return: Decorator
+    """
+    def decorator(method: typing.Callable) -> typing.Callable:
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            metrics = self.metrics
+            if not metrics.subscribers:
+                return method(self, *args, **kwargs)
+            before, start = metrics.counters(), time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                metrics.publish(operation, before, start)
+        return wrapper
+    return decorator
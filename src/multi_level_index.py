@@ -0,0 +1,442 @@
+import bisect
+import math
+import struct
+import typing
+from array import array
+from buffer_pool import BufferPool
+from page_journal import PageJournal
+from page_store import PageStore, create_page_store
+from record import GradesRecord
+from config import CONFIG, Config
+from tracing import Tracer, traced
+
+TREE_HEADER = struct.Struct("<8sQQQQq")  # magic, root node, height, number of entries, entries per node, first free node
+TREE_HEADER_SIZE = 64
+TREE_MAGIC = b"SEQINDB3"
+NODE_HEADER = struct.Struct("<BI")  # level, number of entries
+ENTRY_TYPECODE = "q"
+FREE_NODE_LEVEL = 255  # level of released node, its key is page of next released node
+
+
+class IndexNode:
+    """Node of multi-level index, leaves hold first keys of data pages, whose page numbers are their positions in
+    order of keys, and nodes above them hold first keys, pages and number of leaf entries of their children"""
+    def __init__(self, level: int, keys: typing.Optional[array] = None, children: typing.Optional[array] = None,
+                 counts: typing.Optional[array] = None):
+        self.level = level
+        self.keys = keys if keys is not None else array(ENTRY_TYPECODE)
+        self.children = children if children is not None else array(ENTRY_TYPECODE)
+        self.counts = counts if counts is not None else array(ENTRY_TYPECODE)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @property
+    def number_of_entries(self) -> int:
+        """Number of leaf entries under node"""
+        return len(self.keys) if self.level == 0 else sum(self.counts)
+
+    def position_of_key(self, key: int) -> int:
+        """
+        Get position of entry covering key
+        :param key: Key to look for
+        :return: Position of entry in node
+        """
+        return max(bisect.bisect_right(self.keys, key) - 1, 0)
+
+    def position_of_rank(self, rank: int) -> typing.Tuple[int, int]:
+        """
+        Get child holding leaf entry at rank
+        :param rank: Position of leaf entry among entries under node
+        :return: Position of child and rank of its first entry
+        """
+        offset = 0
+        for position, count in enumerate(self.counts):
+            if rank < offset + count or position == len(self.counts) - 1:
+                return position, offset
+            offset += count
+        raise IndexError(f"Node has no entry at rank {rank}")
+
+    def to_bytes(self, entries_per_node: int) -> bytes:
+        padding = [0] * (entries_per_node - len(self.keys))
+        entries = self.keys + array(ENTRY_TYPECODE, padding)
+        if self.level > 0:
+            entries += self.children + array(ENTRY_TYPECODE, padding) + self.counts + array(ENTRY_TYPECODE, padding)
+        return NODE_HEADER.pack(self.level, len(self.keys)) + entries.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes, entries_per_node: int) -> "IndexNode":
+        level, number_of_entries = NODE_HEADER.unpack_from(data)
+        entries = memoryview(data)[NODE_HEADER.size:].cast(ENTRY_TYPECODE)
+        keys = array(ENTRY_TYPECODE, entries[:number_of_entries])
+        if level == 0:
+            return cls(level, keys)
+        children = array(ENTRY_TYPECODE, entries[entries_per_node:entries_per_node + number_of_entries])
+        counts = array(ENTRY_TYPECODE, entries[2 * entries_per_node:2 * entries_per_node + number_of_entries])
+        return cls(level, keys, children, counts)
+
+
+class MultiLevelIndex:
+    """Multi-level sparse index stored in fixed-size node pages, root is pinned in memory and lower levels are read on
+    demand, nodes count leaf entries under their children, so that page numbers follow from positions of entries"""
+    AREA = "index"
+
+    def __init__(self, path: str, create: bool = True, config: Config = CONFIG):
+        self.config = config
+        self.entries_per_node = config["INDEX_NODE_ENTRIES"]
+        self.node_size = NODE_HEADER.size + 3 * self.entries_per_node * array(ENTRY_TYPECODE).itemsize
+        self.store: PageStore = create_page_store(path, self.node_size, config["PAGE_STORE_MODE"], header_size=TREE_HEADER_SIZE, create=create)
+        self.buffer_pool = BufferPool(config["INDEX_CACHE_SIZE"])
+        self.buffer_pool.register_area(self.AREA, self.read_node_from_disk, self.write_node_to_disk)
+        self.node_reads = 0
+        self.tracer: typing.Optional[Tracer] = None
+        if create:
+            self.clear_index_file()
+        else:
+            self.load_from_file()
+
+    @property
+    def path(self) -> str:
+        """Path of index file"""
+        return self.store.path
+
+    def clear_index_file(self) -> None:
+        """
+        Remove contents of index file and start building new tree
+        :return: None
+        """
+        self.store.truncate()
+        self.buffer_pool.invalidate()
+        self.root: typing.Optional[IndexNode] = None
+        self.root_page = 0
+        self.height = 0
+        self.number_of_entries = 0
+        self.next_node_page = 0
+        self.free_node_head = -1  # released node pages are threaded into list and reused before file grows
+        self.open_nodes: typing.List[IndexNode] = [IndexNode(0)]  # node being filled at every level
+        self.emitted_nodes: typing.List[int] = [0]
+
+    def use_journal(self, journal: typing.Optional[PageJournal]) -> None:
+        """
+        Save nodes and header to journal before they are overwritten in place
+        :param journal: Journal of file, None to stop journaling
+        :return: None
+        """
+        self.store.journal = journal
+
+    def load_from_file(self) -> None:
+        """
+        Open tree saved to file, only root is read and lower levels are read on demand
+        :return: None
+        """
+        magic, self.root_page, self.height, self.number_of_entries, entries_per_node, self.free_node_head = TREE_HEADER.unpack_from(self.store.read_header())
+        if magic != TREE_MAGIC:
+            raise ValueError(f"{self.path} is not a multi-level index file")
+        if entries_per_node != self.entries_per_node:
+            raise ValueError(f"{self.path} has {entries_per_node} entries per node, config has {self.entries_per_node}")
+        self.root = self.buffer_pool.read_page(self.AREA, self.root_page)
+        self.next_node_page = self.store.number_of_pages()
+        self.open_nodes, self.emitted_nodes = [], []
+
+    def __len__(self) -> int:
+        return self.number_of_entries
+
+    def __iter__(self) -> typing.Iterator[typing.Tuple[str, int]]:
+        self.finish()
+        yield from self.iterate_node(self.root)
+
+    def iterate_node(self, node: IndexNode, rank: int = 0) -> typing.Iterator[typing.Tuple[str, int]]:
+        """
+        Yield entries of leaves under node in order of keys
+        :param node: Node of tree
+        :param rank: Position of first entry under node
+        :return: Key and data page of every entry
+        """
+        if node.level == 0:
+            for position, key in enumerate(node.keys, rank):
+                yield str(key).rjust(len(str(self.config["MAX_KEY"])), "0"), position
+            return
+        for child, count in zip(node.children, node.counts):
+            yield from self.iterate_node(self.buffer_pool.read_page(self.AREA, child), rank)
+            rank += count
+
+    def read_node_from_disk(self, node_page: int) -> typing.Optional[IndexNode]:
+        """
+        Read and decode index node
+        :param node_page: Page of node in index file
+        :return: Decoded node, None if page is past end of file
+        """
+        self.node_reads += 1
+        with self.store.view_page(node_page) as data:
+            return IndexNode.from_bytes(data, self.entries_per_node) if data else None
+
+    def write_node_to_disk(self, node_page: int, node: IndexNode) -> None:
+        """
+        Encode and write index node
+        :param node_page: Page of node in index file
+        :param node: Node to be written
+        :return: None
+        """
+        self.store.write_page(node_page, node.to_bytes(self.entries_per_node))
+
+    def initialize_indexes(self) -> None:
+        """
+        Initialize indexes at file creation
+        :return: None
+        """
+        max_key = self.config["MAX_KEY"]
+        for page_no, key in enumerate(range(0, max_key, math.ceil(max_key/self.config["INITIAL_NO_OF_PAGES"]))):
+            self.add_index(str(key), page_no)
+        self.finish()
+
+    def add_index(self, key: str, page_index: int) -> None:
+        """
+        Add new index, indexes have to be added in ascending order of keys while the tree is built bottom-up
+        :param key: Key of record
+        :param page_index: Page of record
+        :return: None
+        """
+        if self.root is not None:
+            raise ValueError("Multi-level index is already built, it has to be rebuilt by reorganization")
+        if page_index != self.number_of_entries:
+            raise ValueError("Pages of multi-level index have to be added in order of their numbers")
+        self.add_to_level(0, int(key))
+        self.number_of_entries += 1
+
+    def add_to_level(self, level: int, key: int, child: int = 0, count: int = 1) -> None:
+        """
+        Add entry to open node of level, full node is written and propagated to level above
+        :param level: Level of tree, 0 are leaves
+        :param key: First key covered by entry
+        :param child: Index node page, unused in leaves
+        :param count: Number of leaf entries under child, unused in leaves
+        :return: None
+        """
+        node = self.open_nodes[level]
+        if len(node) and key < node.keys[-1]:
+            raise ValueError("Indexes of multi-level index have to be added in ascending order")
+        if len(node) == self.entries_per_node:
+            self.emit_node(level)
+            node = self.open_nodes[level]
+        node.keys.append(key)
+        if level > 0:
+            node.children.append(child)
+            node.counts.append(count)
+
+    def emit_node(self, level: int) -> None:
+        """
+        Write open node of level and add it to level above
+        :param level: Level of node
+        :return: None
+        """
+        node = self.open_nodes[level]
+        node_page = self.next_node_page
+        self.next_node_page += 1
+        self.buffer_pool.write_page(self.AREA, node_page, node)
+        self.emitted_nodes[level] += 1
+        self.open_nodes[level] = IndexNode(level)
+        if level + 1 == len(self.open_nodes):
+            self.open_nodes.append(IndexNode(level + 1))
+            self.emitted_nodes.append(0)
+        self.add_to_level(level + 1, node.keys[0], node_page, node.number_of_entries)
+
+    def finish(self) -> None:
+        """
+        Write remaining open nodes, last remaining node becomes pinned root
+        :return: None
+        """
+        if self.root is not None:
+            return
+        level = 0
+        while not (level == len(self.open_nodes) - 1 and self.emitted_nodes[level] == 0):
+            if len(self.open_nodes[level]):
+                self.emit_node(level)
+            level += 1
+        self.root = self.open_nodes[level]
+        self.root_page = self.next_node_page
+        self.next_node_page += 1
+        self.height = level + 1
+        self.buffer_pool.write_page(self.AREA, self.root_page, self.root)
+        self.open_nodes, self.emitted_nodes = [], []
+
+    def dump_to_file(self) -> None:
+        """
+        Finish building the tree and save it to file
+        :return: None
+        """
+        self.finish()
+        self.buffer_pool.flush()
+        self.store.write_header(TREE_HEADER.pack(TREE_MAGIC, self.root_page, self.height, self.number_of_entries, self.entries_per_node, self.free_node_head).ljust(TREE_HEADER_SIZE, b"\0"))
+        self.store.sync()
+
+    def replace_pages(self, first_page: int, end_page: int, new_keys: typing.List[str], following_key: typing.Optional[str]) -> None:
+        """
+        Replace indexes of range of pages rewritten into new pages, first page keeps its key and pages after range
+        are shifted, which follows from counts of entries, so only leaves of range and nodes above them are rewritten,
+        pages of nodes left empty are released for later splits
+        :param first_page: First page of range
+        :param end_page: Page after the last page of range
+        :param new_keys: First keys of new pages after the first one
+        :param following_key: Smallest key allowed in page following range, None to keep its key
+        :return: None
+        """
+        self.finish()
+        keys = array(ENTRY_TYPECODE, [int(key) for key in new_keys])
+        nodes = self.splice(self.root_page, self.root, first_page + 1, end_page, keys)
+        while len(nodes) > 1:  # root was split, new root is put above
+            nodes = self.write_nodes(None, self.pack(self.root.level + 1, nodes))
+            self.root = self.buffer_pool.read_page(self.AREA, nodes[0][1])
+        self.root_page = nodes[0][1]
+        self.root = self.buffer_pool.read_page(self.AREA, self.root_page)
+        self.height = self.root.level + 1
+        self.number_of_entries += len(keys) + 1 - (end_page - first_page)
+        if following_key is not None and first_page + 1 + len(keys) < self.number_of_entries:
+            self.raise_key(self.root_page, self.root, first_page + 1 + len(keys), int(following_key))
+
+    def splice(self, node_page: int, node: IndexNode, start: int, end: int, keys: array) -> typing.List[typing.Tuple[int, int, int]]:
+        """
+        Replace leaf entries under node at positions from start to end with keys, node which overflows is split and
+        only children holding replaced entries are rewritten
+        :param node_page: Page of node
+        :param node: Node of tree
+        :param start: Position of first replaced entry among entries under node, keys go to child holding entry before it
+        :param end: Position after last replaced entry
+        :param keys: Keys of new entries
+        :return: First key, page and number of leaf entries of every node replacing node
+        """
+        if node.level == 0:
+            return self.write_nodes(node_page, self.pack(0, list(node.keys[:start] + keys + node.keys[end:])))
+        entries, offset = [], 0
+        target = max(start - 1, 0)
+        for position, (key, child, count) in enumerate(zip(node.keys, node.children, node.counts)):
+            if offset <= target < offset + count or (position == len(node) - 1 and target >= offset):
+                child_node = self.buffer_pool.read_page(self.AREA, child)
+                entries += self.splice(child, child_node, start - offset, min(end - offset, count), keys)
+            elif start <= offset < end:
+                child_node = self.buffer_pool.read_page(self.AREA, child)
+                entries += self.splice(child, child_node, 0, min(end - offset, count), array(ENTRY_TYPECODE))
+            else:
+                entries.append((key, child, count))
+            offset += count
+        return self.write_nodes(node_page, self.pack(node.level, entries))
+
+    def pack(self, level: int, entries: typing.List) -> typing.List[IndexNode]:
+        """
+        Pack entries into as few nodes of level as they fit in
+        :param level: Level of nodes
+        :param entries: Keys of leaf entries or first key, page and number of leaf entries of children
+        :return: Nodes, none if there are no entries
+        """
+        nodes = []
+        for first in range(0, len(entries), self.entries_per_node):
+            chunk = entries[first:first + self.entries_per_node]
+            if level == 0:
+                nodes.append(IndexNode(0, array(ENTRY_TYPECODE, chunk)))
+            else:
+                keys, children, counts = zip(*chunk)
+                nodes.append(IndexNode(level, array(ENTRY_TYPECODE, keys), array(ENTRY_TYPECODE, children), array(ENTRY_TYPECODE, counts)))
+        return nodes
+
+    def write_nodes(self, node_page: typing.Optional[int], nodes: typing.List[IndexNode]) -> typing.List[typing.Tuple[int, int, int]]:
+        """
+        Write nodes replacing node at page, first of them takes its page and others get released pages or are put at
+        the end of file, page of node replaced by no nodes is released
+        :param node_page: Page of replaced node, None if nodes are new
+        :param nodes: New nodes
+        :return: First key, page and number of leaf entries of every node
+        """
+        if not nodes and node_page is not None:
+            self.release_node(node_page)
+        written = []
+        for position, node in enumerate(nodes):
+            if position or node_page is None:
+                node_page = self.allocate_node()
+            self.buffer_pool.write_page(self.AREA, node_page, node)
+            written.append((node.keys[0], node_page, node.number_of_entries))
+        return written
+
+    def allocate_node(self) -> int:
+        """
+        Get page for new node, released page is reused if there is one
+        :return: Page of node
+        """
+        if self.free_node_head < 0:
+            self.next_node_page += 1
+            return self.next_node_page - 1
+        node_page = self.free_node_head
+        self.free_node_head = self.buffer_pool.read_page(self.AREA, node_page).keys[0]
+        return node_page
+
+    def release_node(self, node_page: int) -> None:
+        """
+        Put page of node which is no longer in tree on list of released pages
+        :param node_page: Page of node
+        :return: None
+        """
+        free_node = IndexNode(FREE_NODE_LEVEL, array(ENTRY_TYPECODE, [self.free_node_head]), array(ENTRY_TYPECODE, [0]), array(ENTRY_TYPECODE, [0]))
+        self.buffer_pool.write_page(self.AREA, node_page, free_node)
+        self.free_node_head = node_page
+
+    def raise_key(self, node_page: int, node: IndexNode, rank: int, key: int) -> int:
+        """
+        Raise key of leaf entry to at least key, separators of nodes above it are raised with it
+        :param node_page: Page of node
+        :param node: Node of tree
+        :param rank: Position of entry among entries under node
+        :param key: Smallest key allowed in entry
+        :return: First key of node
+        """
+        if node.level == 0:
+            node.keys[rank] = max(node.keys[rank], key)
+        else:
+            position, offset = node.position_of_rank(rank)
+            child = node.children[position]
+            node.keys[position] = self.raise_key(child, self.buffer_pool.read_page(self.AREA, child), rank - offset, key)
+        self.buffer_pool.write_page(self.AREA, node_page, node)
+        return node.keys[0]
+
+    @traced("index.lookup")
+    def get_page_of_key(self, key: str) -> int:
+        """
+        Get page number of record with matching key by descending from root
+        :param key: Key of record to get page of
+        :return: Page of record
+        """
+        assert self.number_of_entries, "There are no entries in index file"
+        self.finish()
+
+        key = int(key)
+        node, rank = self.root, 0
+        while node.level > 0:
+            position = node.position_of_key(key)
+            rank += sum(node.counts[:position])
+            node = self.buffer_pool.read_page(self.AREA, node.children[position])
+        return rank + node.position_of_key(key)
+
+    def get_page_to_insert(self, record: GradesRecord) -> int:
+        """
+        Get page number of last smallest key
+        :param record: Record to get page number for
+        :return: Page number of last smallest key or 0 if there are no entries yet
+        """
+        if not self.number_of_entries:
+            return 0
+
+        return self.get_page_of_key(record.key)
+
+    def move(self, new_path: str) -> None:
+        """
+        Atomically move index file to new path
+        :param new_path: New path of index file
+        :return: None
+        """
+        self.buffer_pool.flush()
+        self.store.move(new_path)
+
+    def close(self) -> None:
+        """
+        Close index file
+        :return: None
+        """
+        self.buffer_pool.flush()
+        self.store.close()
@@ -0,0 +1,130 @@
+import struct
+import typing
+
+FILTER_HEADER = struct.Struct("<qqqq")  # physical page, number of keys, smallest and greatest key
+
+
+class ChainFilter:
+    """Key fence and Bloom filter of keys held in overflow chains starting in one page of main area"""
+    def __init__(self, bits: int, hashes: int):
+        self.bits = bits
+        self.hashes = hashes
+        self.bloom = 0
+        self.number_of_keys = 0
+        self.min_key: typing.Optional[int] = None
+        self.max_key: typing.Optional[int] = None
+
+    def positions(self, key: int) -> typing.Generator[int, None, None]:
+        for i in range(self.hashes):
+            yield ((key * 0x9E3779B1 + i * 0x85EBCA77) >> 7) % self.bits
+
+    def add(self, key: int) -> None:
+        """
+        Add key of record put in overflow
+        :param key: Key of record
+        :return: None
+        """
+        self.min_key = key if self.min_key is None else min(self.min_key, key)
+        self.max_key = key if self.max_key is None else max(self.max_key, key)
+        self.number_of_keys += 1
+        for position in self.positions(key):
+            self.bloom |= 1 << position
+
+    def may_contain(self, key: int) -> bool:
+        """
+        Check if key can be in overflow, there are no false negatives
+        :param key: Key of record
+        :return: False if key is certainly not in overflow, True otherwise
+        """
+        if self.min_key is None or not self.min_key <= key <= self.max_key:
+            return False
+        return all(self.bloom >> position & 1 for position in self.positions(key))
+
+
+class OverflowFilters:
+    """Filters of overflow chains of every physical page of main area, kept in memory and rebuilt empty by reorganization"""
+    def __init__(self, bits: int, hashes: int):
+        self.bits = bits
+        self.hashes = hashes
+        self.filters: typing.Dict[int, ChainFilter] = {}
+        self.skipped_chains = 0
+        self.walked_chains = 0
+
+    def add(self, page_index: int, key: str) -> None:
+        """
+        Add key of record put in overflow chain of record in page
+        :param page_index: Physical index of page of main area where the chain starts
+        :param key: Key of record
+        :return: None
+        """
+        if page_index not in self.filters:
+            self.filters[page_index] = ChainFilter(self.bits, self.hashes)
+        self.filters[page_index].add(int(key))
+
+    def may_contain(self, page_index: int, key: str) -> bool:
+        """
+        Check if key can be in overflow chains of page
+        :param page_index: Physical index of page of main area
+        :param key: Key of record
+        :return: False if key is certainly not in overflow chains of page, True otherwise
+        """
+        chain_filter = self.filters.get(page_index)
+        result = chain_filter is not None and chain_filter.may_contain(int(key))
+        if result:
+            self.walked_chains += 1
+        else:
+            self.skipped_chains += 1
+        return result
+
+    def chain_length(self, page_index: int) -> int:
+        """
+        Get number of records put in overflow chains of page, deleted ones included
+        :param page_index: Physical index of page of main area
+        :return: Number of overflow records of page
+        """
+        chain_filter = self.filters.get(page_index)
+        return chain_filter.number_of_keys if chain_filter is not None else 0
+
+    def remove(self, page_index: int) -> None:
+        """
+        Remove filter of page whose overflow chains were reclaimed
+        :param page_index: Physical index of page of main area
+        :return: None
+        """
+        self.filters.pop(page_index, None)
+
+    def clear(self) -> None:
+        """
+        Remove all filters
+        :return: None
+        """
+        self.filters.clear()
+
+    def to_bytes(self) -> bytes:
+        """
+        Encode all filters, every one as header followed by its Bloom filter
+        :return: Filters in bytes
+        """
+        bloom_size = (self.bits + 7) // 8
+        return b"".join(FILTER_HEADER.pack(page_index, chain_filter.number_of_keys, chain_filter.min_key, chain_filter.max_key)
+                        + chain_filter.bloom.to_bytes(bloom_size, "little") for page_index, chain_filter in self.filters.items())
+
+    @classmethod
+    def from_bytes(cls, data: bytes, bits: int, hashes: int) -> "OverflowFilters":
+        """
+        Decode filters encoded by to_bytes
+        :param data: Filters in bytes
+        :param bits: Number of bits of every Bloom filter
+        :param hashes: Number of hash functions of every Bloom filter
+        :return: Decoded filters
+        """
+        overflow_filters = cls(bits, hashes)
+        bloom_size = (bits + 7) // 8
+        for position in range(0, len(data), FILTER_HEADER.size + bloom_size):
+            page_index, number_of_keys, min_key, max_key = FILTER_HEADER.unpack_from(data, position)
+            chain_filter = ChainFilter(bits, hashes)
+            chain_filter.number_of_keys, chain_filter.min_key, chain_filter.max_key = number_of_keys, min_key, max_key
+            bloom_start = position + FILTER_HEADER.size
+            chain_filter.bloom = int.from_bytes(data[bloom_start:bloom_start + bloom_size], "little")
+            overflow_filters.filters[page_index] = chain_filter
+        return overflow_filters
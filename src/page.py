@@ -0,0 +1,131 @@
+import bisect
+import typing
+from record import GradesRecord
+
+
+class Page:
+    """Page decoded once into records ordered by offset"""
+    def __init__(self, codec, page_size: int, records: typing.Optional[typing.List[GradesRecord]] = None):
+        self.codec = codec
+        self.page_size = page_size
+        self.records: typing.List[GradesRecord] = records if records is not None else []
+        self.keys: typing.List[str] = [record.key for record in self.records]
+        self.sizes: typing.List[int] = [codec.encoded_size(record) for record in self.records]
+        self.dirty = False
+
+    @classmethod
+    def from_bytes(cls, data: bytes, codec, page_size: int) -> "Page":
+        """
+        Decode page read from disk
+        :param data: Page in bytes
+        :param codec: Record codec
+        :param page_size: Size of page in bytes
+        :return: Decoded page
+        """
+        return cls(codec, page_size, codec.decode_page(data))
+
+    def to_bytes(self) -> bytes:
+        """
+        Encode page, unused part of page is padded
+        :return: Page in bytes
+        """
+        data = b"".join(self.codec.encode(record) for record in self.records)
+        if len(data) > self.page_size:  # text records grow with their pointers
+            raise ValueError(f"Records of page take {len(data)} bytes, page size is {self.page_size}")
+        return data + self.codec.padding * (self.page_size - len(data))
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def size(self) -> int:
+        """
+        Get number of bytes occupied by records
+        :return: Size of records in page
+        """
+        return sum(self.sizes)
+
+    def fits(self, record: GradesRecord) -> bool:
+        """
+        Check if record can be added to page
+        :param record: Record to be added
+        :return: True if there is enough space for record, False otherwise
+        """
+        return self.size() + self.codec.encoded_size(record) <= self.page_size
+
+    def record_at(self, offset: int) -> typing.Optional[GradesRecord]:
+        """
+        Get record at offset
+        :param offset: Offset in the page
+        :return: Record at offset, None if there is no record
+        """
+        return self.records[offset] if 0 <= offset < len(self.records) else None
+
+    def find(self, key: str) -> typing.Optional[GradesRecord]:
+        """
+        Get record with key, page has to be sorted by key
+        :param key: Key of record
+        :return: Record if present, None otherwise
+        """
+        offset = bisect.bisect_left(self.keys, key)
+        if offset < len(self.keys) and self.keys[offset] == key:
+            return self.records[offset]
+        return None
+
+    def offset_of(self, key: str) -> int:
+        """
+        Get offset at which record with key should be placed in sorted page
+        :param key: Key of record
+        :return: Offset of record in page
+        """
+        return bisect.bisect_right(self.keys, key)
+
+    def last_offset(self) -> int:
+        """
+        Get offset of last existing record in page
+        :return: Offset of last existing record, 0 if page is empty
+        """
+        return max(len(self.records) - 1, 0)
+
+    def insert(self, offset: int, record: GradesRecord) -> None:
+        """
+        Insert record at offset, moving following records
+        :param offset: Offset at which to insert record
+        :param record: Record to insert
+        :return: None
+        """
+        self.records.insert(offset, record)
+        self.keys.insert(offset, record.key)
+        self.sizes.insert(offset, self.codec.encoded_size(record))
+        self.dirty = True
+
+    def append(self, record: GradesRecord) -> int:
+        """
+        Append record at first free offset
+        :param record: Record to append
+        :return: Offset of appended record
+        """
+        self.insert(len(self.records), record)
+        return len(self.records) - 1
+
+    def remove(self, offset: int) -> None:
+        """
+        Remove record at offset, moving following records
+        :param offset: Offset of record to remove
+        :return: None
+        """
+        del self.records[offset]
+        del self.keys[offset]
+        del self.sizes[offset]
+        self.dirty = True
+
+    def replace(self, offset: int, record: GradesRecord) -> None:
+        """
+        Replace record at offset, record keeps its position
+        :param offset: Offset of record to replace
+        :param record: New record
+        :return: None
+        """
+        self.records[offset] = record
+        self.keys[offset] = record.key
+        self.sizes[offset] = self.codec.encoded_size(record)
+        self.dirty = True
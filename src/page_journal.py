@@ -0,0 +1,146 @@
+import os
+import struct
+import threading
+import typing
+import zlib
+
+JOURNAL_MAGIC = b"SEQINDJR"
+JOURNAL_HEADER = struct.Struct("<8sqI")  # magic, epoch of superblock, number of files
+JOURNAL_FILE = struct.Struct("<qH")  # size of file at checkpoint, length of path
+JOURNAL_ENTRY = struct.Struct("<HqII")  # file, position, length of saved bytes, crc32 of saved bytes
+
+
+def journal_path(database_path: str) -> str:
+    """
+    Get path of journal of main area file
+    :param database_path: Path of main area file
+    :return: Path of journal
+    """
+    return os.path.splitext(database_path)[0] + ".journal"
+
+
+class PageJournal:
+    """Rollback journal of files changed in place, bytes written at last checkpoint are saved before they are first
+    overwritten, so that files are rolled back to state described by superblock after crash"""
+    def __init__(self, path: str):
+        self.path = path
+        self.epoch: typing.Optional[int] = None  # epoch of superblock of checkpoint, None until journal is started
+        self.files: typing.Dict[str, typing.Tuple[int, int]] = {}  # number and size at checkpoint of every protected file
+        self.protected: typing.Dict[typing.Tuple[int, int], int] = {}  # number of bytes saved at position of file
+        self.readers: typing.Dict[str, int] = {}  # descriptors used to read bytes before they are overwritten
+        self.lock = threading.Lock()  # guards journal written by many threads in latched mode
+        self.file: typing.Optional[typing.BinaryIO] = None
+        self.saved_bytes = 0
+
+    def reset(self, epoch: int, paths: typing.List[str]) -> None:
+        """
+        Start new journal once superblock of checkpoint was written, files have to be synced already
+        :param epoch: Epoch of superblock of checkpoint
+        :param paths: Paths of files changed in place until next checkpoint
+        :return: None
+        """
+        with self.lock:
+            self.close_files()
+            self.files = {path: (number, os.path.getsize(path)) for number, path in enumerate(paths) if os.path.exists(path)}
+            header = JOURNAL_HEADER.pack(JOURNAL_MAGIC, epoch, len(paths))
+            for path in paths:
+                encoded_path = path.encode()
+                header += JOURNAL_FILE.pack(self.files.get(path, (0, -1))[1], len(encoded_path)) + encoded_path
+            with open(self.path + ".tmp", "wb") as journal_file:
+                journal_file.write(header)
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
+            os.replace(self.path + ".tmp", self.path)
+            self.file = open(self.path, "ab")
+            self.protected = {}
+            self.epoch = epoch
+
+    def protect(self, path: str, position: int, length: int) -> None:
+        """
+        Save bytes of file which are about to be overwritten and make them durable, only bytes written at checkpoint
+        are saved and every range is saved once until next checkpoint
+        :param path: Path of file
+        :param position: Position of bytes in file
+        :param length: Number of bytes
+        :return: None
+        """
+        with self.lock:
+            if self.file is None or (entry := self.files.get(path)) is None:
+                return
+            number, size = entry
+            length = min(length, size - position)
+            if length <= 0 or self.protected.get((number, position), 0) >= length:
+                return
+            if (reader := self.readers.get(path)) is None:
+                reader = self.readers[path] = os.open(path, os.O_RDONLY)
+            data = os.pread(reader, length, position)
+            self.file.write(JOURNAL_ENTRY.pack(number, position, len(data), zlib.crc32(data)) + data)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.protected[(number, position)] = length
+            self.saved_bytes += len(data)
+
+    @staticmethod
+    def roll_back(path: str, epoch: int) -> bool:
+        """
+        Restore saved bytes and cut files to their size at checkpoint, journal of other checkpoint is ignored and entry
+        torn by crash is dropped, bytes it saved were not overwritten yet
+        :param path: Path of journal
+        :param epoch: Epoch of superblock files are rolled back to
+        :return: True if files were rolled back, False if journal does not belong to superblock
+        """
+        if not os.path.exists(path):
+            return False
+        with open(path, "rb") as journal_file:
+            data = journal_file.read()
+        if len(data) < JOURNAL_HEADER.size:
+            return False
+        magic, journal_epoch, number_of_files = JOURNAL_HEADER.unpack_from(data)
+        if magic != JOURNAL_MAGIC or journal_epoch != epoch:
+            return False
+        position, files = JOURNAL_HEADER.size, []
+        for _ in range(number_of_files):
+            size, path_length = JOURNAL_FILE.unpack_from(data, position)
+            position += JOURNAL_FILE.size
+            files.append((data[position:position + path_length].decode(), size))
+            position += path_length
+        entries = []
+        while position + JOURNAL_ENTRY.size <= len(data):
+            number, file_position, length, checksum = JOURNAL_ENTRY.unpack_from(data, position)
+            saved = data[position + JOURNAL_ENTRY.size:position + JOURNAL_ENTRY.size + length]
+            if len(saved) < length or zlib.crc32(saved) != checksum:
+                break
+            entries.append((number, file_position, saved))
+            position += JOURNAL_ENTRY.size + length
+        descriptors = {number: os.open(file_path, os.O_RDWR) for number, (file_path, size) in enumerate(files) if size >= 0 and os.path.exists(file_path)}
+        try:
+            for number, file_position, saved in reversed(entries):  # range saved first holds bytes of checkpoint
+                if number in descriptors:
+                    os.pwrite(descriptors[number], saved, file_position)
+            for number, descriptor in descriptors.items():
+                os.ftruncate(descriptor, files[number][1])
+                os.fsync(descriptor)
+        finally:
+            for descriptor in descriptors.values():
+                os.close(descriptor)
+        return True
+
+    def close_files(self) -> None:
+        """
+        Close journal and descriptors of protected files
+        :return: None
+        """
+        for reader in self.readers.values():
+            os.close(reader)
+        self.readers = {}
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def close(self) -> None:
+        """
+        Close journal, it stays on disk until next checkpoint replaces it
+        :return: None
+        """
+        with self.lock:
+            self.close_files()
@@ -0,0 +1,354 @@
+import contextlib
+import os
+import mmap
+import threading
+import typing
+from page_journal import PageJournal
+
+
+class PageStore:
+    """Page access to a single file through one long-lived buffered file object, pages start after header"""
+    def __init__(self, path: str, page_size: int, header_size: int = 0, create: bool = True):
+        self.path = path
+        self.page_size = page_size
+        self.header_size = header_size
+        self.journal: typing.Optional[PageJournal] = None
+        self.file = open(self.path, "w+b" if create else "r+b")
+
+    def position(self, page_index: int) -> int:
+        """
+        Get position of page in file
+        :param page_index: Index of page
+        :return: Position in bytes
+        """
+        return self.header_size + page_index * self.page_size
+
+    def protect(self, position: int, length: int) -> None:
+        """
+        Save bytes about to be overwritten to journal, no-op unless file is journaled
+        :param position: Position of bytes in file
+        :param length: Number of bytes
+        :return: None
+        """
+        if self.journal is not None:
+            self.journal.protect(self.path, position, length)
+
+    def read_header(self) -> bytes:
+        """
+        Read header of file
+        :return: Header in bytes
+        """
+        self.file.seek(0, os.SEEK_SET)
+        return self.file.read(self.header_size)
+
+    def write_header(self, header: bytes) -> None:
+        """
+        Write header of file
+        :param header: Header in bytes
+        :return: None
+        """
+        self.protect(0, len(header))
+        self.file.seek(0, os.SEEK_SET)
+        self.file.write(header)
+
+    def truncate(self) -> None:
+        """
+        Remove all pages from file
+        :return: None
+        """
+        self.protect(0, self.size())
+        self.file.seek(0, os.SEEK_SET)
+        self.file.truncate()
+
+    def read_page(self, page_index: int) -> bytes:
+        """
+        Read page at index, pages past end of file are empty
+        :param page_index: Index of page
+        :return: Page in bytes
+        """
+        self.file.seek(self.position(page_index), os.SEEK_SET)
+        return self.file.read(self.page_size)
+
+    @contextlib.contextmanager
+    def view_page(self, page_index: int) -> typing.Iterator[typing.Union[bytes, memoryview]]:
+        """
+        Read page at index without copying it if the store allows it, view is valid only inside of context
+        :param page_index: Index of page
+        :return: Page as bytes or memoryview
+        """
+        yield self.read_page(page_index)
+
+    def write_page(self, page_index: int, page: bytes) -> None:
+        """
+        Write page at index
+        :param page_index: Index of page
+        :param page: Page to be written
+        :return: None
+        """
+        self.protect(self.position(page_index), len(page))
+        self.file.seek(self.position(page_index), os.SEEK_SET)
+        self.file.write(page)
+
+    def write_pages(self, page_index: int, pages: typing.Union[bytes, memoryview]) -> None:
+        """
+        Write consecutive pages starting at index with single write
+        :param page_index: Index of first page
+        :param pages: Pages to be written
+        :return: None
+        """
+        self.write_page(page_index, pages)
+
+    def size(self) -> int:
+        """
+        Get size of file
+        :return: Size in bytes, including header
+        """
+        self.file.flush()
+        return os.fstat(self.file.fileno()).st_size
+
+    def number_of_pages(self) -> int:
+        """
+        Get number of pages in file, last page may be written partially
+        :return: Number of pages
+        """
+        return max(-(-(self.size() - self.header_size) // self.page_size), 0)
+
+    def reserve(self, size: int) -> None:
+        """
+        Hint that file is about to grow to size bytes
+        :param size: Expected size of file in bytes, including header
+        :return: None
+        """
+
+    def sync(self) -> None:
+        """
+        Flush written pages to the operating system and to disk
+        :return: None
+        """
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def move(self, new_path: str) -> None:
+        """
+        Atomically rename file to new path, replacing file existing there
+        :param new_path: New path of file
+        :return: None
+        """
+        self.file.flush()
+        os.replace(self.path, new_path)
+        self.path = new_path
+
+    def close(self) -> None:
+        """
+        Close underlying file
+        :return: None
+        """
+        if not self.file.closed:
+            self.file.close()
+
+
+class PreadPageStore(PageStore):
+    """Page access to a single file through one descriptor with os.pread and os.pwrite"""
+    def __init__(self, path: str, page_size: int, header_size: int = 0, create: bool = True):
+        self.path = path
+        self.page_size = page_size
+        self.header_size = header_size
+        self.journal: typing.Optional[PageJournal] = None
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644) if create else os.open(self.path, os.O_RDWR)
+
+    def truncate(self) -> None:
+        self.protect(0, self.size())
+        os.ftruncate(self.fd, 0)
+
+    def read_header(self) -> bytes:
+        return os.pread(self.fd, self.header_size, 0)
+
+    def write_header(self, header: bytes) -> None:
+        self.protect(0, len(header))
+        os.pwrite(self.fd, header, 0)
+
+    def read_page(self, page_index: int) -> bytes:
+        return os.pread(self.fd, self.page_size, self.position(page_index))
+
+    def write_page(self, page_index: int, page: bytes) -> None:
+        self.protect(self.position(page_index), len(page))
+        os.pwrite(self.fd, page, self.position(page_index))
+
+    def size(self) -> int:
+        return os.fstat(self.fd).st_size
+
+    def sync(self) -> None:
+        os.fsync(self.fd)
+
+    def move(self, new_path: str) -> None:
+        os.replace(self.path, new_path)
+        self.path = new_path
+
+    def close(self) -> None:
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class MmapPageStore(PreadPageStore):
+    """Page access to a single file through memory map growing in whole chunks of pages"""
+    def __init__(self, path: str, page_size: int, chunk_pages: int, header_size: int = 0, create: bool = True):
+        super().__init__(path, page_size, header_size, create)
+        self.chunk_size = page_size * chunk_pages
+        self.logical_size = 0  # mapping may be larger
+        self.map: typing.Optional[mmap.mmap] = None
+        self.map_lock = threading.Lock()  # map is not resized or closed while its pages are viewed
+        if (size := os.fstat(self.fd).st_size) > 0:
+            self.reserve(size)
+            self.logical_size = size
+
+    def truncate(self) -> None:
+        self.unmap()
+        super().truncate()
+        self.logical_size = 0
+
+    def size(self) -> int:
+        return self.logical_size
+
+    def unmap(self) -> None:
+        """
+        Remove memory map of file
+        :return: None
+        """
+        with self.map_lock:
+            if self.map is not None:
+                self.map.close()
+                self.map = None
+
+    def reserve(self, size: int) -> None:
+        mapped = len(self.map) if self.map is not None else 0
+        if size <= mapped:
+            return
+        new_size = self.header_size + -(-(size - self.header_size) // self.chunk_size) * self.chunk_size
+        with self.map_lock:
+            if self.map is None:
+                os.ftruncate(self.fd, new_size)
+                self.map = mmap.mmap(self.fd, new_size)
+            else:
+                self.map.resize(new_size)
+
+    def read_header(self) -> bytes:
+        if self.map is None:
+            return b""
+        return self.map[:min(self.header_size, self.logical_size)]
+
+    def write_header(self, header: bytes) -> None:
+        self.write_at(0, header)
+
+    @contextlib.contextmanager
+    def view_page(self, page_index: int) -> typing.Iterator[typing.Union[bytes, memoryview]]:
+        start = self.position(page_index)
+        end = min(start + self.page_size, self.logical_size)
+        with self.map_lock:
+            if self.map is None or start >= end:
+                yield b""
+                return
+            with memoryview(self.map) as mapping, mapping[start:end] as view:
+                yield view
+
+    def read_page(self, page_index: int) -> bytes:
+        start = self.position(page_index)
+        end = min(start + self.page_size, self.logical_size)
+        if self.map is None or start >= end:
+            return b""
+        return self.map[start:end]
+
+    def write_page(self, page_index: int, page: bytes) -> None:
+        self.write_at(self.position(page_index), page)
+
+    def write_at(self, start: int, data: bytes) -> None:
+        """
+        Write data at position of file, growing memory map if needed
+        :param start: Position in bytes
+        :param data: Data to be written
+        :return: None
+        """
+        end = start + len(data)
+        self.protect(start, len(data))
+        self.reserve(end)
+        self.map[start:end] = data
+        self.logical_size = max(self.logical_size, end)
+
+    def sync(self) -> None:
+        if self.map is not None:
+            self.map.flush()
+        super().sync()
+
+    def close(self) -> None:
+        if self.fd is None:
+            return
+        self.unmap()
+        os.ftruncate(self.fd, self.logical_size)  # drop unused part of last chunk
+        super().close()
+
+
+class SequentialPageWriter:
+    """Writer of consecutive pages, pages are filled in preallocated buffer which is written in large sequential chunks"""
+    def __init__(self, store: PageStore, buffer_pages: int, padding: bytes, first_page_index: int = 0):
+        self.store = store
+        self.page_size = store.page_size
+        self.empty_buffer = padding * (store.page_size * max(buffer_pages, 1))
+        self.buffer = bytearray(self.empty_buffer)
+        self.first_page_index = first_page_index  # index of page at the beginning of buffer
+        self.pages = 0  # number of finished pages in buffer
+
+    @property
+    def page_position(self) -> int:
+        """Position of current page in buffer"""
+        return self.pages * self.page_size
+
+    def next_page(self) -> int:
+        """
+        Finish current page and start next one, buffer is written when it is full
+        :return: Index of new current page
+        """
+        self.pages += 1
+        if self.page_position + self.page_size > len(self.buffer):
+            self.flush()
+        return self.first_page_index + self.pages
+
+    def flush(self) -> None:
+        """
+        Write finished pages held in buffer
+        :return: None
+        """
+        if not self.pages:
+            return
+        used = self.page_position
+        self.store.write_pages(self.first_page_index, memoryview(self.buffer)[:used])
+        self.buffer[:used] = self.empty_buffer[:used]
+        self.first_page_index += self.pages
+        self.pages = 0
+
+    def close(self) -> None:
+        """
+        Finish current page and write rest of buffer
+        :return: None
+        """
+        self.pages += 1
+        self.flush()
+
+
+def create_page_store(path: str, page_size: int, mode: str, mmap_chunk_pages: int = 64, header_size: int = 0, create: bool = True) -> PageStore:
+    """
+    Create page store for file
+    :param path: Path of file
+    :param page_size: Size of single page in bytes
+    :param mode: One of "buffered", "pread", "mmap"
+    :param mmap_chunk_pages: Number of pages memory map grows by in mmap mode
+    :param header_size: Number of bytes reserved for header before first page
+    :param create: Create new empty file, existing file is opened otherwise
+    :return: New page store
+    """
+    if mode == "buffered":
+        return PageStore(path, page_size, header_size, create)
+    if mode == "pread":
+        return PreadPageStore(path, page_size, header_size, create)
+    if mode == "mmap":
+        return MmapPageStore(path, page_size, mmap_chunk_pages, header_size, create)
+    raise ValueError(f"Unknown page store mode {mode}")
@@ -1,16 +1,20 @@
 import typing
 import random
-import json
-
-CONFIG_PATH = "configs/config.json"
-with open(CONFIG_PATH, "r") as json_config:
-    CONFIG = json.load(json_config)
+import struct
 
 AVAILABLE_GRADES = ["2.0", "3.0", "3.5", "4.0", "4.5", "5.0"]
+GRADE_CODES = {grade: code for code, grade in enumerate(AVAILABLE_GRADES)}
 ID_BOUND = (100000, 999999)
+TEXT_FORMAT_VERSION = 1
+BINARY_FORMAT_VERSION = 2
+BINARY_RECORD = struct.Struct("<iiBBBihB")  # key, id, 3 grades, pointer page, pointer offset, flags
+FLAG_OCCUPIED = 1
+FLAG_DELETED = 2
 
 
 class GradesRecord:
+    __slots__ = ("key", "pointer", "deleted", "id", "grades")
+
     def __init__(self, key: str, id_: int = None, grades: typing.List[str] = None, pointer: typing.Tuple[int, int] = (-1, -1), deleted: bool = False):
         self.key = key
         self.pointer = pointer
@@ -28,7 +32,10 @@ class GradesRecord:
         self.pointer = pointer
 
     def __str__(self):
-        pointer_str = "x:x " if self.pointer == (-1, -1) else str(self.pointer[0]) + ":" + str(self.pointer[1]) + " "
+        return self.to_string(self.pointer)
+
+    def to_string(self, pointer: typing.Tuple[int, int]) -> str:
+        pointer_str = "x:x " if pointer == (-1, -1) else str(pointer[0]) + ":" + str(pointer[1]) + " "
         return self.key + " " + \
                pointer_str + \
                str(self.id) + " " + \
@@ -43,3 +50,219 @@ class GradesRecord:
 
     def __lt__(self, other):
         return self.key < other.key
+
+
+class TextRecordCodec:
+    """Space-separated, newline-terminated text records"""
+    version = TEXT_FORMAT_VERSION
+
+    def __init__(self, record_size: int, padding: bytes):
+        self.record_size = record_size
+        self.padding = padding
+
+    def encode(self, record: GradesRecord) -> bytes:
+        """
+        Encode record
+        :param record: Record to encode
+        :return: Record in bytes
+        """
+        return record.to_bytes()
+
+    def encoded_size(self, record: GradesRecord) -> int:
+        """
+        Get size of encoded record
+        :param record: Record to encode
+        :return: Size in bytes
+        """
+        return len(record)
+
+    def encode_into(self, buffer: bytearray, position: int, record: GradesRecord, pointer: typing.Tuple[int, int]) -> int:
+        """
+        Encode record with given pointer straight into buffer
+        :param buffer: Buffer to encode record into
+        :param position: Position of record in buffer
+        :param record: Record to encode
+        :param pointer: Pointer stored instead of pointer of record
+        :return: Number of bytes written
+        """
+        data = record.to_string(pointer).encode()
+        buffer[position:position + len(data)] = data
+        return len(data)
+
+    def decode_fields(self, fields: typing.List[str]) -> GradesRecord:
+        """
+        Generate new record from provided list of strings
+        :param fields: List of strings
+        :return: New record created from the list
+        """
+        key = fields[0]
+        page, offset = fields[1].split(":")
+        pointer = (-1, -1) if (page, offset) == ("x", "x") else (int(page), int(offset))
+        id = int(fields[2])
+        grades = [fields[i] for i in [3, 4, 5]]
+        deleted = bool(int(fields[6].split(":")[1]))
+
+        return GradesRecord(key, id, grades, pointer, deleted)
+
+    def decode_page(self, page: bytes) -> typing.List[GradesRecord]:
+        """
+        Decode all records stored in page
+        :param page: Page in bytes
+        :return: Records in order of offsets
+        """
+        lines = bytes(page).replace(self.padding, b"").decode().split("\n")
+        return [self.decode_fields(line.split(" ")) for line in lines if line]
+
+    def decode_at(self, page: bytes, offset: int) -> typing.Optional[GradesRecord]:
+        """
+        Decode record at offset of page
+        :param page: Page in bytes
+        :param offset: Offset of record in page
+        :return: Record at offset, None if there is no record
+        """
+        records = self.decode_page(page)
+        return records[offset] if offset < len(records) else None
+
+    def page_keys(self, page: bytes) -> typing.List[str]:
+        """
+        Get keys of all records stored in page
+        :param page: Page in bytes
+        :return: Keys in order of offsets
+        """
+        lines = page.replace(self.padding, b"").split(b"\n")
+        return [line.split(b" ")[0].decode() for line in lines if line]
+
+    def page_size(self, page: bytes) -> int:
+        """
+        Get number of bytes occupied by records in page
+        :param page: Page in bytes
+        :return: Size of records in page
+        """
+        return len(page.replace(self.padding, b""))
+
+    def page_to_string(self, page: bytes) -> str:
+        """
+        Get printable representation of page
+        :param page: Page in bytes
+        :return: Page as string
+        """
+        return page.decode()
+
+
+class BinaryRecordCodec:
+    """Fixed-width struct-packed records stored in consecutive slots of page"""
+    version = BINARY_FORMAT_VERSION
+    record_size = BINARY_RECORD.size
+    padding = b"\0"
+
+    def __init__(self, key_length: int):
+        self.key_length = key_length
+
+    def encode(self, record: GradesRecord) -> bytes:
+        """
+        Encode record
+        :param record: Record to encode
+        :return: Record in bytes
+        """
+        flags = FLAG_OCCUPIED | (FLAG_DELETED if record.deleted else 0)
+        grades = [GRADE_CODES[grade] for grade in record.grades]
+        return BINARY_RECORD.pack(int(record.key), int(record.id), *grades, record.pointer[0], record.pointer[1], flags)
+
+    def encoded_size(self, record: GradesRecord) -> int:
+        """
+        Get size of encoded record, all records have the same size
+        :param record: Record to encode
+        :return: Size in bytes
+        """
+        return self.record_size
+
+    def encode_into(self, buffer: bytearray, position: int, record: GradesRecord, pointer: typing.Tuple[int, int]) -> int:
+        """
+        Encode record with given pointer straight into buffer
+        :param buffer: Buffer to encode record into
+        :param position: Position of record in buffer
+        :param record: Record to encode
+        :param pointer: Pointer stored instead of pointer of record
+        :return: Number of bytes written
+        """
+        flags = FLAG_OCCUPIED | (FLAG_DELETED if record.deleted else 0)
+        grades = [GRADE_CODES[grade] for grade in record.grades]
+        BINARY_RECORD.pack_into(buffer, position, int(record.key), int(record.id), *grades, pointer[0], pointer[1], flags)
+        return self.record_size
+
+    def decode_at(self, page: bytes, offset: int) -> typing.Optional[GradesRecord]:
+        """
+        Decode record at offset of page
+        :param page: Page in bytes
+        :param offset: Offset of record in page
+        :return: Record at offset, None if there is no record
+        """
+        if (offset + 1) * self.record_size > len(page):
+            return None
+        key, id_, grade_1, grade_2, grade_3, pointer_page, pointer_offset, flags = BINARY_RECORD.unpack_from(page, offset * self.record_size)
+        if not flags & FLAG_OCCUPIED:
+            return None
+        grades = [AVAILABLE_GRADES[grade_1], AVAILABLE_GRADES[grade_2], AVAILABLE_GRADES[grade_3]]
+        return GradesRecord(str(key).rjust(self.key_length, "0"), id_, grades, (pointer_page, pointer_offset), bool(flags & FLAG_DELETED))
+
+    def number_of_records(self, page: bytes) -> int:
+        """
+        Get number of occupied slots, records are always stored from first slot on
+        :param page: Page in bytes
+        :return: Number of records in page
+        """
+        count = 0
+        for flags_position in range(self.record_size - 1, len(page), self.record_size):
+            if not page[flags_position] & FLAG_OCCUPIED:
+                break
+            count += 1
+        return count
+
+    def decode_page(self, page: bytes) -> typing.List[GradesRecord]:
+        """
+        Decode all records stored in page
+        :param page: Page in bytes
+        :return: Records in order of offsets
+        """
+        return [self.decode_at(page, offset) for offset in range(self.number_of_records(page))]
+
+    def page_keys(self, page: bytes) -> typing.List[str]:
+        """
+        Get keys of all records stored in page
+        :param page: Page in bytes
+        :return: Keys in order of offsets
+        """
+        return [str(BINARY_RECORD.unpack_from(page, offset * self.record_size)[0]).rjust(self.key_length, "0")
+                for offset in range(self.number_of_records(page))]
+
+    def page_size(self, page: bytes) -> int:
+        """
+        Get number of bytes occupied by records in page
+        :param page: Page in bytes
+        :return: Size of records in page
+        """
+        return self.number_of_records(page) * self.record_size
+
+    def page_to_string(self, page: bytes) -> str:
+        """
+        Get printable representation of page
+        :param page: Page in bytes
+        :return: Page as string
+        """
+        return "".join(str(record) for record in self.decode_page(page))
+
+
+def create_record_codec(format_version: int, text_record_size: int, padding: bytes, key_length: int) -> typing.Union[TextRecordCodec, BinaryRecordCodec]:
+    """
+    Create codec for on-disk record format
+    :param format_version: Version of record format
+    :param text_record_size: Size of record in text format
+    :param padding: Padding symbol used in text format
+    :param key_length: Number of digits of keys, binary keys are padded with zeros to it
+    :return: Record codec
+    """
+    if format_version == TEXT_FORMAT_VERSION:
+        return TextRecordCodec(text_record_size, padding)
+    if format_version == BINARY_FORMAT_VERSION:
+        return BinaryRecordCodec(key_length)
+    raise ValueError(f"Unknown record format version {format_version}")
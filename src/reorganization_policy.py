@@ -0,0 +1,259 @@
+import math
+import threading
+import typing
+from config import CONFIG, Config
+from metrics import IOCounters
+
+MAX_CYCLE_DOUBLINGS = 40  # longest projected cycle is ADAPTIVE_WINDOW * 2 ** MAX_CYCLE_DOUBLINGS operations
+MIN_COST_FACTOR = 0.1  # measured cost of reorganization divided by its estimate is kept within these bounds
+MAX_COST_FACTOR = 10.0
+
+
+class ThresholdPolicy:
+    """Policy reorganizing once overflow grows past MAX_OVERFLOW_PAGE_NO pages, pages are always filled up to ALPHA"""
+    def __init__(self, config: Config = CONFIG):
+        self.config = config
+        self.alpha = config["ALPHA"]
+
+    def attach(self, counters: typing.Callable[[], IOCounters]) -> None:
+        """
+        Observe operations of file, nothing is observed by this policy
+        :param counters: Callable returning counters of current database of file
+        :return: None
+        """
+
+    def should_reorganize(self, database, inserted: int = 0) -> bool:
+        """
+        Check if file should be reorganized after write operation
+        :param database: Current database of file
+        :param inserted: Number of records inserted by operation
+        :return: True if file should be reorganized, False otherwise
+        """
+        return database.overflow.is_full()
+
+    def next_alpha(self, database) -> float:
+        """
+        Choose how much of every page is filled by reorganization which is about to start
+        :param database: Current database of file
+        :return: Fraction of page filled before next page is started
+        """
+        return self.alpha
+
+    def reorganized(self, database, cost: typing.Optional[int] = None) -> None:
+        """
+        Start new cycle after reorganization or bulk load replaced pages of file
+        :param database: Database of file after reorganization
+        :param cost: Number of pages read and written by reorganization, None if it was not measured
+        :return: None
+        """
+
+
+class AdaptivePolicy:
+    """Policy reorganizing once cost of overflow per operation reaches average cost per operation of cycle with
+    reorganization included, next ALPHA minimizes projected cost per operation of next cycle, overflow of text
+    records is still bounded by MAX_OVERFLOW_PAGE_NO pages"""
+    def __init__(self, config: Config = CONFIG):
+        self.config = config
+        self.alpha = config["ALPHA"]
+        self.alphas = sorted(config["ADAPTIVE_ALPHAS"], reverse=True)  # ties go to fuller pages
+        self.window = config["ADAPTIVE_WINDOW"]
+        self.smoothing = config["ADAPTIVE_SMOOTHING"]
+        self.bounded = config["RECORD_FORMAT"] == "text"  # text records have room only for pointers to first overflow pages
+        self.counters: typing.Optional[typing.Callable[[], IOCounters]] = None
+        self.cycle_start = 0  # operations when cycle started
+        self.cycle_transfers = 0  # overflow pages transferred when cycle started
+        self.cycle_inserted = 0  # records inserted in cycle
+        self.window_start = 0
+        self.window_transfers = 0
+        self.window_lookups = 0
+        self.window_lookup_reads = 0
+        self.read_amplification: typing.Optional[float] = None  # overflow pages read per lookup
+        self.other_cost: typing.Optional[float] = None  # overflow pages transferred per operation other than lookup
+        self.lookup_share: typing.Optional[float] = None  # fraction of operations which are lookups
+        self.chain_length = 0.0  # overflow records per page of main area when ALPHA was last chosen
+        self.reorganization_cost: typing.Optional[int] = None  # pages transferred by last measured reorganization
+        self.cost_factor = 1.0  # measured cost of reorganization divided by its estimate
+        self.pending_estimate: typing.Optional[float] = None
+        self.lock = threading.Lock()  # guards state of policy asked by operations of many threads in latched mode
+
+    def attach(self, counters: typing.Callable[[], IOCounters]) -> None:
+        """
+        Observe operations of file through its counters, which are read only when policy is asked
+        :param counters: Callable returning counters of current database of file
+        :return: None
+        """
+        self.counters = counters
+        self.start_window()
+
+    def overflow_transfers(self) -> int:
+        """
+        Get number of overflow pages read and written so far
+        :return: Number of pages
+        """
+        counters = self.counters()
+        return counters.overflow_reads + counters.overflow_writes
+
+    def close_window_if_ended(self) -> None:
+        """
+        Update cost of lookups and of other operations once window of operations ended, window is closed by the
+        first question asked after its end, so that it may be longer than ADAPTIVE_WINDOW operations
+        :return: None
+        """
+        counters = self.counters()
+        operations = counters.operations - self.window_start
+        if operations < self.window:
+            return
+        lookups, lookup_reads = counters.lookups - self.window_lookups, counters.lookup_overflow_reads - self.window_lookup_reads
+        transfers = self.overflow_transfers() - self.window_transfers
+        others = operations - lookups
+        self.read_amplification = self.smooth(self.read_amplification, lookup_reads / lookups if lookups else 0.0)
+        self.other_cost = self.smooth(self.other_cost, max(0, transfers - lookup_reads) / others if others else 0.0)
+        self.lookup_share = self.smooth(self.lookup_share, lookups / operations)
+        self.start_window()
+
+    def start_window(self) -> None:
+        """
+        Start new window of operations at current values of counters
+        :return: None
+        """
+        counters = self.counters()
+        self.window_start, self.window_transfers = counters.operations, self.overflow_transfers()
+        self.window_lookups, self.window_lookup_reads = counters.lookups, counters.lookup_overflow_reads
+
+    def smooth(self, average: typing.Optional[float], sample: float) -> float:
+        """
+        Move exponential moving average towards sample
+        :param average: Current average, None if there is none yet
+        :param sample: New sample
+        :return: New average
+        """
+        return sample if average is None else average + self.smoothing * (sample - average)
+
+    @property
+    def overflow_cost(self) -> float:
+        """Overflow pages transferred per operation in last windows, zero until first window of cycle ended"""
+        if self.read_amplification is None:
+            return 0.0
+        return self.lookup_share * self.read_amplification + (1 - self.lookup_share) * self.other_cost
+
+    def records_per_page(self, alpha: float) -> int:
+        """
+        Get number of records reorganization puts in every page
+        :param alpha: Fraction of page filled before next page is started
+        :return: Number of records
+        """
+        return max(1, min(self.config["BLOCKING_FACTOR"], math.ceil(self.config["BLOCKING_FACTOR"] * alpha - 1e-9)))
+
+    def estimate_cost(self, database, alpha: float) -> float:
+        """
+        Estimate pages transferred by reorganization of current file, calibrated by measured cost of last one
+        :param database: Current database of file
+        :param alpha: Fraction of page filled by reorganization
+        :return: Number of pages
+        """
+        overflow = database.overflow
+        overflow_pages = overflow.current_page_index + (1 if overflow.current_offset else 0)
+        new_pages = math.ceil(database.number_of_records / self.records_per_page(alpha))
+        return self.cost_factor * (database.number_of_main_pages() + overflow_pages + new_pages)
+
+    def should_reorganize(self, database, inserted: int = 0) -> bool:
+        """
+        Check if file should be reorganized after write operation, it is once overflow pages transferred per
+        operation reach average of cycle with reorganization included, which is when average is the lowest, or once
+        overflow of text records is full
+        :param database: Current database of file
+        :param inserted: Number of records inserted by operation
+        :return: True if file should be reorganized, False otherwise
+        """
+        with self.lock:
+            self.cycle_inserted += inserted
+            if self.bounded and database.overflow.is_full():
+                return True
+            self.close_window_if_ended()
+            operations = self.counters().operations - self.cycle_start
+            if operations < self.window or self.read_amplification is None:
+                return False
+            excess = self.overflow_transfers() - self.cycle_transfers
+            return self.overflow_cost * operations >= self.estimate_cost(database, self.alpha) + excess
+
+    def projected_cost(self, number_of_records: int, alpha: float, insert_rate: float, cost_per_chain: float) -> float:
+        """
+        Project overflow pages transferred per operation of best cycle of file reorganized with alpha, records are
+        assumed to be inserted uniformly, so that overflow receives share of inserts growing with filled free space
+        :param number_of_records: Number of records in file
+        :param alpha: Fraction of page filled by reorganization
+        :param insert_rate: Records inserted per operation
+        :param cost_per_chain: Overflow pages transferred per operation per overflow record of average page
+        :return: Overflow pages and pages of reorganization per operation, reorganization included
+        """
+        blocking_factor = self.config["BLOCKING_FACTOR"]
+        records_per_page = self.records_per_page(alpha)
+        pages = math.ceil(number_of_records / records_per_page)
+        free_slots = pages * (blocking_factor - records_per_page)
+
+        def overflow_records(inserts: float) -> float:
+            if inserts <= free_slots:
+                return inserts * inserts / (2 * free_slots) if free_slots else inserts
+            return inserts - free_slots / 2
+
+        def overflow_records_integral(inserts: float) -> float:
+            if inserts <= free_slots:
+                return inserts ** 3 / (6 * free_slots) if free_slots else inserts * inserts / 2
+            return free_slots * free_slots / 6 + (inserts * inserts - free_slots * free_slots) / 2 - free_slots * (inserts - free_slots) / 2
+
+        best = math.inf
+        for doubling in range(MAX_CYCLE_DOUBLINGS):
+            operations = self.window * 2 ** doubling
+            inserts = insert_rate * operations
+            reorganization = self.cost_factor * (pages + overflow_records(inserts) / blocking_factor + (number_of_records + inserts) / records_per_page)
+            overflow = cost_per_chain * overflow_records_integral(inserts) / (insert_rate * pages) if insert_rate else 0.0
+            best = min(best, (reorganization + overflow) / operations)
+        return best
+
+    def next_alpha(self, database) -> float:
+        """
+        Choose ALPHA from ADAPTIVE_ALPHAS with the lowest projected cost per operation, cost of overflow is
+        assumed to grow with average chain length as it did in current cycle
+        :param database: Current database of file
+        :return: Fraction of page filled before next page is started
+        """
+        with self.lock:
+            self.close_window_if_ended()
+            operations = self.counters().operations - self.cycle_start
+            self.chain_length = database.overflow.number_of_records() / max(1, database.number_of_main_pages())
+            if operations and database.number_of_records and self.chain_length and self.read_amplification is not None:
+                insert_rate = self.cycle_inserted / operations
+                cost_per_chain = self.overflow_cost / self.chain_length
+                self.alpha = min(self.alphas, key=lambda alpha: self.projected_cost(database.number_of_records, alpha, insert_rate, cost_per_chain))
+            self.pending_estimate = self.estimate_cost(database, self.alpha)
+            return self.alpha
+
+    def reorganized(self, database, cost: typing.Optional[int] = None) -> None:
+        """
+        Start new cycle after reorganization or bulk load replaced pages of file, measured cost calibrates estimates
+        of next reorganizations, calibration is bounded so that a single outlier does not stop or force reorganizations
+        :param database: Database of file after reorganization
+        :param cost: Number of pages read and written by reorganization, None if it was not measured
+        :return: None
+        """
+        with self.lock:
+            if cost is not None and self.pending_estimate:
+                self.reorganization_cost = cost
+                self.cost_factor = min(max(self.cost_factor * cost / self.pending_estimate, MIN_COST_FACTOR), MAX_COST_FACTOR)
+            self.pending_estimate = None
+            self.cycle_start, self.cycle_transfers, self.cycle_inserted = self.counters().operations, self.overflow_transfers(), 0
+            self.read_amplification = self.other_cost = self.lookup_share = None
+            self.start_window()
+
+
+def create_reorganization_policy(config: Config = CONFIG) -> typing.Union[ThresholdPolicy, AdaptivePolicy]:
+    """
+    Create reorganization policy selected in config
+    :param config: Settings of file
+    :return: New policy
+    """
+    if config["REORGANIZATION_POLICY"] == "threshold":
+        return ThresholdPolicy(config)
+    if config["REORGANIZATION_POLICY"] == "adaptive":
+        return AdaptivePolicy(config)
+    raise ValueError(f"Unknown reorganization policy {config['REORGANIZATION_POLICY']}")
@@ -1,121 +1,791 @@
-import json
+import contextlib
 import math
-import copy
+import heapq
+import itertools
 import os
+import time
+import typing
+from config import CONFIG, Config
 from index_file import IndexFile
+from multi_level_index import MultiLevelIndex
 from database import Database
 from record import GradesRecord
+from external_sort import sort_records
+from background_reorganization import BackgroundReorganization
+from superblock import Superblock, superblock_path
+from latch import KeyLatches, PageLatches, ReadWriteLatch
+from metrics import Metrics, measured, print_disk_operations, print_operation
+from reorganization_policy import AdaptivePolicy, ThresholdPolicy, create_reorganization_policy
+from page_journal import PageJournal, journal_path
+from tracing import Tracer, TimedIterator, trace, traced
+from write_ahead_log import WriteAheadLog, OPERATION_ADD, OPERATION_UPDATE, OPERATION_DELETE
 
-CONFIG_PATH = "configs/config.json"
-with open(CONFIG_PATH, "r") as json_config:
-    CONFIG = json.load(json_config)
-
-BLOCKING_FACTOR = CONFIG["BLOCKING_FACTOR"]
-INITIAL_NO_OF_PAGES = CONFIG["INITIAL_NO_OF_PAGES"]
-MAX_KEY = CONFIG["MAX_KEY"]
-RECORD_SIZE = CONFIG["RECORD_SIZE"]
 PRINT_DEBUG = CONFIG["PRINT_DEBUG"]
-MAX_OVERFLOW_PAGE_NO = CONFIG["MAX_OVERFLOW_PAGE_NO"]
-ALPHA = CONFIG["ALPHA"]
+
+
+def create_index_file(path: str, create: bool = True, config: Config = CONFIG) -> typing.Union[IndexFile, MultiLevelIndex]:
+    """
+    Create index of type selected in config
+    :param path: Path of index file
+    :param create: Create new empty index, existing one is opened otherwise
+    :param config: Settings of file
+    :return: New index
+    """
+    return MultiLevelIndex(path, create=create, config=config) if config["MULTI_LEVEL_INDEX"] else IndexFile(path, create, config)
+
+
+def reorganized_path(path: str) -> str:
+    """
+    Get path of file built by reorganization next to current one
+    :param path: Path of current file
+    :return: Path of new file
+    """
+    root, extension = os.path.splitext(path)
+    return root + "_reorg" + extension
 
 
 class SeqIndFile:
     """Sequential-indexed file"""
-    def __init__(self, database_path: str, overflow_path: str, index_file_path: str):
-        global MAX_OVERFLOW_PAGE_NO
-        global ALPHA
-        with open(CONFIG_PATH, "r") as json_config:
-            CONFIG = json.load(json_config)
-        MAX_OVERFLOW_PAGE_NO = CONFIG["MAX_OVERFLOW_PAGE_NO"]
-        ALPHA = CONFIG["ALPHA"]
-        self.database = Database(database_path, overflow_path)
-        self.index_file = IndexFile(index_file_path)
-        self.index_file.initialize_indexes()
+    def __init__(self, database_path: str, overflow_path: str, index_file_path: str, wal_path: typing.Optional[str] = None, create: bool = True,
+                 config: Config = CONFIG):
+        self.config = config
+        if config["CONCURRENCY_MODE"] == "latched" and config["REORGANIZATION_MODE"] == "background":
+            raise ValueError("Background reorganization is not supported with latched concurrency mode")
+        superblock = None
+        if not create:
+            if config["WAL_MODE"] != "off":
+                self.finish_swap([database_path, overflow_path, index_file_path])
+            superblock = Superblock.read(superblock_path(database_path), len(str(config["MAX_KEY"])))
+            if config["WAL_MODE"] == "off" and (superblock is None or not superblock.clean):
+                raise ValueError(f"{database_path} was not closed cleanly and there is no write-ahead log to recover it from")
+            if superblock is not None and config["WAL_MODE"] != "off":  # files are rolled back to the last checkpoint
+                PageJournal.roll_back(journal_path(database_path), superblock.epoch)
+        self.database = Database(database_path, overflow_path, superblock=superblock, config=config)
+        self.metrics = Metrics(lambda: self.database.snapshot_counters())
+        if config["PRINT_DEBUG"]:
+            self.metrics.subscribe(print_operation)
+        if config["PRINT_DISK_OPERATIONS"]:
+            self.metrics.subscribe(print_disk_operations)
+        self.reorganization_policy: typing.Union[ThresholdPolicy, AdaptivePolicy] = create_reorganization_policy(config)
+        self.reorganization_policy.attach(lambda: self.database.counters)
+        self.index_file = create_index_file(index_file_path, create=superblock is None, config=config)
+        if superblock is None:
+            self.index_file.initialize_indexes()
+        self.tracer: typing.Optional[Tracer] = None
+        if config["TRACE_PATH"]:
+            self.use_tracer(Tracer(config["TRACE_PATH"], config["TRACE_SAMPLE_RATE"]))
+        self.background_reorganization: typing.Optional[BackgroundReorganization] = None
+        self.latches: typing.Optional[PageLatches] = None
+        self.key_latches: typing.Optional[KeyLatches] = None
+        self.barrier = ReadWriteLatch()  # shared by operations, exclusive while files are reorganized or checkpointed
+        self.generation = 0  # changed whenever records move between pages, so that scans find their place again
+        self.reorganizations = 0
+        self.reorganization_time = 0.0  # seconds spent in reorganization by operations, background work is not included
+        if config["CONCURRENCY_MODE"] == "latched":
+            self.latches = PageLatches()
+            self.key_latches = KeyLatches()
+            self.use_latches()
+        self.wal: typing.Optional[WriteAheadLog] = None
+        self.journal: typing.Optional[PageJournal] = None
+        self.checkpoint_position = 0  # number of entries of write-ahead log at last checkpoint
+        if config["WAL_MODE"] != "off":
+            self.journal = PageJournal(journal_path(database_path))
+            if superblock is not None:
+                self.journal.reset(superblock.epoch, self.paths)
+                self.use_journal()
+            commit_size = 1 if config["WAL_MODE"] == "sync" else config["WAL_COMMIT_SIZE"]
+            wal = WriteAheadLog(wal_path or os.path.splitext(database_path)[0] + ".wal", config["WAL_COMMIT_INTERVAL"], commit_size,
+                                len(str(config["MAX_KEY"])), create)
+            if superblock is not None and wal.epoch != superblock.log_epoch:  # checkpoint ended before log was truncated
+                wal.reset(superblock.log_epoch)
+            self.recover(wal, superblock.log_position if superblock is not None else 0)
+            self.checkpoint()
 
+    @classmethod
+    def open(cls, database_path: str, overflow_path: str, index_file_path: str, wal_path: typing.Optional[str] = None,
+             config: Config = CONFIG) -> "SeqIndFile":
+        """
+        Open existing file, state is restored from superblock without reading pages and index is read on demand, file
+        which was not closed cleanly is rolled back to its last checkpoint and operations logged after it are replayed
+        :param database_path: Path of main area
+        :param overflow_path: Path of overflow
+        :param index_file_path: Path of index
+        :param wal_path: Path of write-ahead log, next to main area if None
+        :param config: Settings of file, they have to match settings it was created with
+        :return: Opened file
+        """
+        return cls(database_path, overflow_path, index_file_path, wal_path, create=False, config=config)
+
+    def recover(self, wal: WriteAheadLog, log_position: int = 0) -> None:
+        """
+        Replay operations committed to write-ahead log after those already reflected in files, files may reflect some
+        of the replayed operations as well after background reorganization, so added record replaces existing one
+        :param wal: Write-ahead log of file
+        :param log_position: Number of entries of log reflected in files
+        :return: None
+        """
+        for position, (operation, record) in enumerate(wal.entries()):
+            if position < log_position:
+                continue
+            if operation == OPERATION_ADD and self.find_record(record.key) is not None:
+                self.update_record(record)
+            elif operation == OPERATION_ADD:
+                self.add_record(record)
+            elif operation == OPERATION_UPDATE:
+                self.update_record(record)
+            elif operation == OPERATION_DELETE:
+                self.delete_record(record)
+        if PRINT_DEBUG: print(f"REPLAYED {max(0, wal.position - log_position)} OPERATIONS FROM WRITE-AHEAD LOG!")
+        self.wal = wal
+        self.checkpoint_position = wal.position
+
+    @property
+    def paths(self) -> typing.List[str]:
+        """Paths of main area, overflow and index"""
+        return [self.database.path, self.database.overflow.path, self.index_file.path]
+
+    def use_journal(self) -> None:
+        """
+        Save pages of current files to journal before they are overwritten, done again whenever files are swapped
+        :return: None
+        """
+        self.database.use_journal(self.journal)
+        self.index_file.use_journal(self.journal)
+
+    @staticmethod
+    def finish_swap(paths: typing.List[str]) -> None:
+        """
+        Finish swap of reorganized files interrupted by crash, superblock of new files is written next to them once
+        they are complete, so that new files replace current ones whenever it exists
+        :param paths: Paths of main area, overflow and index
+        :return: None
+        """
+        new_superblock_path = superblock_path(reorganized_path(paths[0]))
+        if not os.path.exists(new_superblock_path):
+            return
+        for path in paths:
+            if os.path.exists(reorganized_path(path)):
+                os.replace(reorganized_path(path), path)
+        os.replace(new_superblock_path, superblock_path(paths[0]))
+
+    def use_latches(self) -> None:
+        """
+        Latch pages of current files, done again whenever files are swapped
+        :return: None
+        """
+        self.database.use_latches(self.latches)
+        if isinstance(self.index_file, MultiLevelIndex):
+            self.index_file.buffer_pool.make_thread_safe()
+
+    def use_tracer(self, tracer: typing.Optional[Tracer]) -> None:
+        """
+        Record spans of operations and of work they do, trace is written when file is closed
+        :param tracer: Tracer, None to stop tracing
+        :return: None
+        """
+        self.tracer = tracer
+        self.database.use_tracer(tracer)
+        self.index_file.tracer = tracer
+
+    @contextlib.contextmanager
+    def operation(self, write: bool = False) -> typing.Iterator[None]:
+        """
+        Run operation which may run at once with operations of other threads, pages it touches stay latched until it
+        ends and files are not reorganized meanwhile, no-op unless concurrency mode is latched
+        :param write: Operation changes pages
+        :return: None
+        """
+        if self.latches is None:
+            yield
+            return
+        with self.barrier.shared(), self.latches.operation(write):
+            yield
+
+    @contextlib.contextmanager
+    def structure_change(self) -> typing.Iterator[None]:
+        """
+        Run change of whole files, it waits for running operations and no other operation starts until it ends,
+        no-op unless concurrency mode is latched
+        :return: None
+        """
+        if self.latches is None:
+            yield
+            return
+        with self.barrier.exclusive():
+            yield
+
+    @contextlib.contextmanager
+    def mutation(self, operation: int, *records: typing.Union[GradesRecord, str]) -> typing.Iterator[None]:
+        """
+        Run write operation, files are marked as modified and operation is logged to write-ahead log before it is
+        applied, so that in sync mode it is durable before any page changes, background reorganization has to be
+        finished before, since its checkpoint truncates log, keys of operation stay latched until it is
+        applied so that conflicting operations are applied in order of the log, checkpoint is made every
+        WAL_CHECKPOINT_OPERATIONS operations
+        :param operation: Operation to log
+        :param records: Records or keys of deleted records
+        :return: None
+        """
+        if self.wal is not None and self.wal.position - self.checkpoint_position >= self.config["WAL_CHECKPOINT_OPERATIONS"]:
+            self.checkpoint()
+        keys = [record if isinstance(record, str) else record.key for record in records] if self.key_latches is not None else []
+        with self.key_latches.hold(keys) if self.key_latches is not None else contextlib.nullcontext():
+            with self.operation(write=True):
+                self.database.counters.operations += 1
+                self.database.mark_modified()
+                if self.wal is not None:
+                    for record in records:
+                        self.wal.append(operation, record)
+                yield
+
+    def checkpoint(self) -> None:
+        """
+        Commit write-ahead log, write back pages changed since last checkpoint, sync files and save superblock
+        describing them, log is truncated and journal is started again and attached to files once superblock is
+        durable, also for newly created files whose first superblock is written by their first checkpoint, files which are
+        only read by background reorganization are left as they are
+        :return: None
+        """
+        with self.structure_change():
+            if self.wal is not None:
+                self.wal.commit()
+                self.checkpoint_position = self.wal.position
+            if self.background_reorganization is not None or (self.database.superblock_clean and not self.checkpoint_position):
+                return
+            self.database.sync()
+            self.index_file.dump_to_file()
+            if self.wal is None:
+                self.database.write_superblock()
+                return
+            self.database.write_superblock(0, self.wal.epoch + 1)
+            self.wal.reset(self.wal.epoch + 1)
+            self.journal.reset(self.database.epoch, self.paths)
+            self.use_journal()
+            self.checkpoint_position = 0
+
+    def reorganize_if_needed(self) -> None:
+        """
+        Reorganize file if policy still asks for it once running operations ended, other thread may have done it already
+        :return: None
+        """
+        with self.structure_change():
+            if self.reorganization_policy.should_reorganize(self.database):
+                self.reorganize()
+
+    @traced("add")
+    @measured("add")
     def add_record(self, record: GradesRecord) -> None:
         """
         Add new record to file, reorganize afterwards if needed
         :param record: Record to be added
         :return: None
         """
-        page_number = self.index_file.get_page_to_insert(record)
-        reorganize = self.database.add_record(record, page_number)
+        reorganize = False
+        self.finish_background_reorganization()
+        with self.mutation(OPERATION_ADD, record):
+            if self.background_reorganization is not None:
+                self.background_reorganization.delta.put(record)
+            else:
+                page_number = self.index_file.get_page_to_insert(record)
+                self.database.add_record(record, page_number)
+                reorganize = self.reorganization_policy.should_reorganize(self.database, 1)
+        if reorganize:
+            self.reorganize_if_needed()
+
+    @traced("add_batch")
+    @measured("add_batch")
+    def add_records(self, records: typing.Iterable[GradesRecord]) -> None:
+        """
+        Add batch of records, records are sorted and every page of main area receives its records at once,
+        file is reorganized at most once after the whole batch, pages are visited in descending order so that
+        latches are taken in the same order as by single operations
+        :param records: Records to be added
+        :return: None
+        """
+        records = list(records)
+        reorganize = False
+        self.finish_background_reorganization()
+        with self.mutation(OPERATION_ADD, *records):
+            if self.background_reorganization is not None:
+                for record in records:
+                    self.background_reorganization.delta.put(record)
+            else:
+                records = sorted(records, key=lambda record: record.key)
+                groups = [(page_number, list(page_records)) for page_number, page_records in itertools.groupby(records, key=self.index_file.get_page_to_insert)]
+                for page_number, page_records in reversed(groups):
+                    self.database.add_records(page_records, page_number)
+                    if self.latches is not None:
+                        self.latches.release_structure()
+                reorganize = self.reorganization_policy.should_reorganize(self.database, len(records))
         if reorganize:
-            self.reorganize()
+            self.reorganize_if_needed()
+
+    @traced("get")
+    @measured("get")
+    def get_record(self, key: str) -> typing.Optional[GradesRecord]:
+        """
+        Get record with matching key, overflow is read only if the key may be there, overflow pages read are counted
+        for reorganization policy
+        :param key: Key of record to be returned
+        :return: Record with matching key, None if there is no such record
+        """
+        self.finish_background_reorganization()
+        counters = self.database.counters
+        counters.operations += 1
+        counters.lookups += 1
+        overflow_reads = counters.overflow_reads
+        try:
+            return self.find_record(key)
+        finally:
+            counters.lookup_overflow_reads += counters.overflow_reads - overflow_reads
 
-    def get_record(self, key: str) -> GradesRecord:
+    def find_record(self, key: str) -> typing.Optional[GradesRecord]:
         """
-        Get record with matching key
+        Get record with matching key for other operations, lookup is not measured nor traced as operation of its own
         :param key: Key of record to be returned
-        :return: Record with matching key
+        :return: Record with matching key, None if there is no such record
+        """
+        self.finish_background_reorganization()
+        with self.operation():
+            page_number = self.index_file.get_page_of_key(key)
+            if (reorganization := self.background_reorganization) is not None:
+                if key in reorganization.delta:
+                    return reorganization.delta.get(key)
+                with reorganization.lock:
+                    return self.database.get_record(key, page_number)
+            return self.database.get_record(key, page_number)
+
+    @traced("get_batch")
+    @measured("get_batch")
+    def get_records(self, keys: typing.Iterable[str]) -> typing.Dict[str, typing.Optional[GradesRecord]]:
+        """
+        Get records with matching keys, every main area page is read once for all keys belonging to it, pages are
+        visited in descending order so that latches are taken in the same order as by single operations
+        :param keys: Keys of records to be returned
+        :return: Record of every key, None if there is no such record
+        """
+        self.finish_background_reorganization()
+        self.database.counters.operations += 1
+        records = {}
+        with self.operation():
+            groups = [(page_number, list(page_keys)) for page_number, page_keys in itertools.groupby(sorted(set(keys)), key=self.index_file.get_page_of_key)]
+            for page_number, page_keys in reversed(groups):
+                if (reorganization := self.background_reorganization) is None:
+                    records.update(self.database.get_records(page_keys, page_number))
+                    continue
+                records.update({key: reorganization.delta.get(key) for key in page_keys if key in reorganization.delta})
+                with reorganization.lock:
+                    records.update(self.database.get_records([key for key in page_keys if key not in reorganization.delta], page_number))
+        return records
+
+    def scan(self, start_key: typing.Optional[str] = None, end_key: typing.Optional[str] = None, include_deleted: bool = False,
+             reverse: bool = False, limit: typing.Optional[int] = None) -> typing.Generator[GradesRecord, None, None]:
+        """
+        Lazily yield records with keys in range, only pages holding the range are read
+        :param start_key: Smallest key to yield, None to start at the beginning of file
+        :param end_key: Greatest key to yield, None to go to the end of file
+        :param include_deleted: Yield deleted records as well
+        :param reverse: Yield records in descending order of keys
+        :param limit: Maximum number of records to yield, None for no limit
+        :return: Records ordered by key
         """
-        page_number = self.index_file.get_page_of_key(key)
-        page = self.database.read_page(page_number)
-        return self.database.get_record_by_key(key, page)
+        records = self.scan_records(start_key, end_key, include_deleted, reverse, limit)
+        return self.metrics.measure_generator("scan", records) if self.metrics.subscribers else records
 
+    def scan_records(self, start_key: typing.Optional[str], end_key: typing.Optional[str], include_deleted: bool, reverse: bool,
+                     limit: typing.Optional[int]) -> typing.Generator[GradesRecord, None, None]:
+        """
+        Lazily yield records with keys in range, dummy record and deleted records unless requested are skipped
+        :param start_key: Smallest key to yield, None to start at the beginning of file
+        :param end_key: Greatest key to yield, None to go to the end of file
+        :param include_deleted: Yield deleted records as well
+        :param reverse: Yield records in descending order of keys
+        :param limit: Maximum number of records to yield, None for no limit
+        :return: Records ordered by key
+        """
+        if limit is not None and limit <= 0:
+            return
+        self.finish_background_reorganization()
+        self.database.counters.operations += 1
+        records = self.scan_backward(start_key, end_key) if reverse else self.scan_forward(start_key, end_key)
+        if (reorganization := self.background_reorganization) is not None:
+            records = reorganization.delta.overlay(reorganization.locked(records), start_key, end_key, reverse)
+        for record in records:
+            if record.deleted and not include_deleted:
+                continue
+            if self.is_dummy_record(record):
+                continue
+            yield record
+            if limit is not None:
+                limit -= 1
+                if limit == 0:
+                    return
+
+    def is_dummy_record(self, record: GradesRecord) -> bool:
+        """
+        Check if record is the dummy one, which is never shown
+        :param record: Record read from file
+        :return: True if record is dummy, False otherwise
+        """
+        if self.background_reorganization is not None and record.key in self.background_reorganization.delta:
+            return False
+        return bool(self.database.dummy_record) and record.key == self.database.dummy_record_key
+
+    def find_range_start(self, key: typing.Optional[str]) -> typing.Tuple[int, int]:
+        """
+        Get location in main area from which records with keys not less than key follow
+        :param key: Key to locate, None for beginning of file
+        :return: Page index and offset in main area
+        """
+        if key is None or not len(self.index_file):
+            return 0, 0
+        location = self.database.find_previous_record_in_main_area({}, self.index_file.get_page_of_key(key), key)
+        return location if location is not None else (0, 0)
+
+    def scan_forward(self, start_key: typing.Optional[str], end_key: typing.Optional[str]) -> typing.Generator[GradesRecord, None, None]:
+        """
+        Yield records with keys in range in ascending order, walk stops at first key past range, records of a single
+        main area page with its chains are read at a time and no page stays latched while they are yielded
+        :param start_key: Smallest key, None for no bound
+        :param end_key: Greatest key, None for no bound
+        :return: Records ordered by key
+        """
+        last_key, resume_key, generation = None, None, None
+        while True:
+            with self.operation(), trace(self.tracer, "scan.page"):
+                if generation != self.generation:  # records moved between pages, find place of last yielded key again
+                    generation, resume_key = self.generation, last_key
+                    page_index, offset = self.find_range_start(last_key if last_key is not None else start_key)
+                page = self.database.read_page(page_index)
+                if page is None:
+                    return
+                records = [record for record, _, _, _, _ in self.database.get_records_of_page(page_index, page, offset)]
+            for record in records:
+                if end_key is not None and record.key > end_key:
+                    return
+                if (start_key is None or record.key >= start_key) and (resume_key is None or record.key > resume_key):
+                    last_key = record.key
+                    yield record
+            page_index, offset = page_index + 1, 0
+
+    def scan_backward(self, start_key: typing.Optional[str], end_key: typing.Optional[str]) -> typing.Generator[GradesRecord, None, None]:
+        """
+        Yield records with keys in range in descending order, chains are singly linked so records of a single
+        main area page with its chains are buffered at a time
+        :param start_key: Smallest key, None for no bound
+        :param end_key: Greatest key, None for no bound
+        :return: Records ordered by key descending
+        """
+        last_key, resume_key, generation = None, None, None
+        while True:
+            with self.operation(), trace(self.tracer, "scan.page"):
+                if generation != self.generation:  # records moved between pages, find place of last yielded key again
+                    generation, resume_key = self.generation, last_key
+                    if last_key is None and end_key is None:
+                        page_index = self.database.number_of_main_pages() - 1
+                    else:
+                        page_index, _ = self.find_range_start(last_key if last_key is not None else end_key)
+                if page_index < 0:
+                    return
+                page = self.database.read_page(page_index)
+                records = [record for record, _, _, _, _ in self.database.get_records_of_page(page_index, page)]
+            for record in reversed(records):
+                if start_key is not None and record.key < start_key:
+                    return
+                if (end_key is None or record.key <= end_key) and (resume_key is None or record.key < resume_key):
+                    last_key = record.key
+                    yield record
+            page_index -= 1
+
+    @traced("delete")
+    @measured("delete")
     def delete_record(self, key: str) -> None:
         """
         Delete record with matching key
         :param key: Key of record to be deleted
         :return: None
         """
-        page_number = self.index_file.get_page_of_key(key)
-        self.database.delete_record(key, page_number)
+        self.finish_background_reorganization()
+        with self.mutation(OPERATION_DELETE, key):
+            if self.background_reorganization is not None:
+                if self.find_record(key) is not None:
+                    self.background_reorganization.delta.delete(key)
+                return
+            page_number = self.index_file.get_page_of_key(key)
+            self.database.delete_record(key, page_number)
 
+    @traced("update")
+    @measured("update")
     def update_record(self, new_record: GradesRecord) -> None:
         """
         Update record with key matching to new one
         :param new_record: New record to replace the old one with matching key
         :return: None
         """
-        page_number = self.index_file.get_page_of_key(new_record.key)
-        self.database.update_record(new_record, page_number)
+        self.finish_background_reorganization()
+        with self.mutation(OPERATION_UPDATE, new_record):
+            if self.background_reorganization is not None:
+                if self.find_record(new_record.key) is not None:
+                    self.background_reorganization.delta.put(new_record)
+                return
+            page_number = self.index_file.get_page_of_key(new_record.key)
+            self.database.update_record(new_record, page_number)
 
+    @traced("reorganize", always=True)
+    @measured("reorganize")
     def reorganize(self) -> None:
         """
-        Reorganize file
+        Reorganize file, only damaged ranges of pages are rewritten in partial mode and new files are built by
+        worker thread in background mode, pages are filled up to ALPHA chosen by reorganization policy
         :return: None
         """
+        start = time.perf_counter()
+        self.reorganizations += 1
+        try:
+            if self.config["REORGANIZATION_MODE"] == "background":
+                if self.background_reorganization is None:
+                    self.reorganization_policy.next_alpha(self.database)
+                self.start_background_reorganization()
+                return
+            self.finish_background_reorganization(wait=True)
+            with self.structure_change():
+                self.reorganization_policy.next_alpha(self.database)
+                disk_operations = self.database.disk_operations
+                if not (self.config["REORGANIZATION_MODE"] == "partial" and self.partial_reorganize()):
+                    records = (record for record, _, _, _, _ in self.database.get_all_records() if not record.deleted)
+                    self.rebuild(records, self.database.number_of_records)
+                self.reorganization_policy.reorganized(self.database, self.database.disk_operations - disk_operations)
+        finally:
+            self.reorganization_time += time.perf_counter() - start
+
+    def start_background_reorganization(self) -> None:
+        """
+        Start building reorganized files from snapshot of current ones in worker thread, from now on changes go
+        to delta log and current files are only read
+        :return: None
+        """
+        if self.background_reorganization is not None:
+            return
+        database, expected_number_of_records = self.database, self.database.number_of_records
+        log_position = self.wal.position if self.wal is not None else 0  # entries logged later are replayed after crash
+
+        def build(reorganization: BackgroundReorganization) -> typing.Tuple[Database, typing.Union[IndexFile, MultiLevelIndex], int, int]:
+            records = (record for record, _, _, _, _ in reorganization.locked(database.get_all_records()) if not record.deleted)
+            new_database, new_index_file = self.build_files(records, expected_number_of_records)
+            replayed = len(reorganization.delta)  # changes logged so far are replayed by worker
+            for key, record in reorganization.delta.changes(0, replayed):
+                self.apply_change(new_database, new_index_file, key, record)
+            return new_database, new_index_file, replayed, log_position
+
+        self.background_reorganization = BackgroundReorganization(build)
+        if PRINT_DEBUG: print("BACKGROUND REORGANIZATION STARTED!")
+
+    def finish_background_reorganization(self, wait: bool = False) -> None:
+        """
+        Swap in files built in background and replay changes logged after worker replayed the delta log
+        :param wait: Wait for worker thread if it has not finished yet, also for reorganizations started by replay
+        :return: None
+        """
+        while (reorganization := self.background_reorganization) is not None and (wait or reorganization.done()):
+            self.background_reorganization = None
+            new_database, new_index_file, replayed, log_position = reorganization.wait()
+            self.swap_files(new_database, new_index_file, log_position)
+            self.database.mark_modified()
+            for key, record in reorganization.delta.changes(replayed):
+                self.apply_change(self.database, self.index_file, key, record)
+            if self.wal is not None:
+                self.checkpoint()
+            if PRINT_DEBUG: print(f"REORGANIZED IN BACKGROUND, REPLAYED {len(reorganization.delta) - replayed} CHANGES AFTER SWAP!")
+            self.reorganization_policy.reorganized(self.database)  # pages read by worker are not told apart from those of operations
+            if self.reorganization_policy.should_reorganize(self.database):
+                self.reorganize()
+
+    @staticmethod
+    def apply_change(database: Database, index_file: typing.Union[IndexFile, MultiLevelIndex], key: str, record: typing.Optional[GradesRecord]) -> bool:
+        """
+        Apply change from delta log to database
+        :param database: Database to change
+        :param index_file: Index of database
+        :param key: Key of changed record
+        :param record: New state of record, None if it was deleted
+        :return: True if file should be reorganized, False otherwise
+        """
+        page_number = index_file.get_page_of_key(key)
+        if record is None:
+            database.delete_record(key, page_number)
+            return False
+        if database.get_record(key, page_number) is not None:
+            database.update_record(record, page_number)
+            return False
+        return database.add_record(record, index_file.get_page_to_insert(record))
+
+    def partial_reorganize(self) -> bool:
+        """
+        Rewrite only ranges of pages with longest overflow chains, index entries of the ranges are replaced in place
+        and overflow slots of their chains are reused by following insertions
+        :return: True if any range was reorganized, False if there was nothing to reclaim
+        """
+        ranges = self.database.find_damaged_ranges(self.config["PARTIAL_REORGANIZATION_FRACTION"])
+        for first_page, end_page in reversed(ranges):  # later ranges first, so that earlier ones are not shifted
+            new_keys, following_key = self.database.rewrite_pages(first_page, end_page, self.reorganization_policy.alpha)
+            with trace(self.tracer, "reorganize.index_update", always=True):
+                self.index_file.replace_pages(first_page, end_page, new_keys, following_key)
+            self.generation += 1
+        if PRINT_DEBUG and ranges: print(f"PARTIALLY REORGANIZED {len(ranges)} RANGES!")
+        return bool(ranges)
+
+    @traced("bulk_load")
+    @measured("bulk_load")
+    def bulk_load(self, records: typing.Iterable[GradesRecord]) -> None:
+        """
+        Add many records at once, records are sorted (externally if they do not fit in memory), merged with existing
+        records and written to main area page by page without using overflow, records are not logged to write-ahead
+        log since new files replace current ones in a single durable swap followed by checkpoint
+        :param records: Records to be added in any order, for repeated keys the last record is kept
+        :return: None
+        """
+        self.finish_background_reorganization(wait=True)
+        with self.structure_change():
+            self.database.mark_modified()
+            sorted_records = sort_records(self.detect_dummy_record(records), self.config["BULK_LOAD_SORT_BUFFER"],
+                                          len(str(self.config["MAX_KEY"])), os.path.dirname(self.database.path) or None)
+            existing_records = (record for record, _, _, _, _ in self.database.get_all_records() if not record.deleted)
+            merged_records = heapq.merge(existing_records, sorted_records, key=lambda record: record.key)
+            self.rebuild(self.unique_records(merged_records))
+            self.reorganization_policy.reorganized(self.database)
+
+    def detect_dummy_record(self, records: typing.Iterable[GradesRecord]) -> typing.Generator[GradesRecord, None, None]:
+        """
+        Pass records through, real record with key of dummy record replaces the dummy one
+        :param records: Records to be added
+        :return: Same records
+        """
+        for record in records:
+            if self.database.dummy_record and record.key == self.database.dummy_record_key:
+                self.database.dummy_record = False
+            yield record
+
+    @staticmethod
+    def unique_records(records: typing.Iterable[GradesRecord]) -> typing.Generator[GradesRecord, None, None]:
+        """
+        Keep only last of consecutive records with equal keys
+        :param records: Records sorted by key
+        :return: Records with unique keys
+        """
+        previous = None
+        for record in records:
+            if previous is not None and previous.key != record.key:
+                yield previous
+            previous = record
+        if previous is not None:
+            yield previous
+
+    def rebuild(self, records: typing.Iterable[GradesRecord], expected_number_of_records: typing.Optional[int] = None) -> None:
+        """
+        Write records sorted by key to new main area filled up to ALPHA of reorganization policy, build new index and
+        replace old files, with write-ahead log checkpoint follows so that the log is truncated
+        :param records: Non-deleted records sorted by key
+        :param expected_number_of_records: Number of records used to preallocate main area, None to skip it
+        :return: None
+        """
+        self.swap_files(*self.build_files(records, expected_number_of_records), self.wal.position if self.wal is not None else 0)
+        if self.wal is not None:
+            self.checkpoint()
+
+    def build_files(self, records: typing.Iterable[GradesRecord], expected_number_of_records: typing.Optional[int] = None) -> typing.Tuple[Database, typing.Union[IndexFile, MultiLevelIndex]]:
+        """
+        Write records sorted by key to new main area filled up to ALPHA of reorganization policy next to current files
+        and build new index, current files are not touched
+        :param records: Non-deleted records sorted by key
+        :param expected_number_of_records: Number of records used to preallocate main area, None to skip it
+        :return: New database and index
+        """
         old_paths = [self.database.path, self.database.overflow.path, self.index_file.path]
-        new_paths = [old_path.split(".")[0] + "_reorg." + old_path.split(".")[1] for old_path in old_paths]
-
-        new_number_of_pages = math.ceil(self.database.number_of_records / (BLOCKING_FACTOR * ALPHA))
-        new_database, new_index_file = Database(new_paths[0], new_paths[1]), IndexFile(new_paths[2])
-        new_database.initialize_empty_pages(new_number_of_pages)
-
-        page = b""
-        current_page_index = 0
-        num = 0
-        for record, _, _, _, _ in self.database.get_all_records():
-            if not new_index_file.entries:
-                new_index_file.add_index(record.key, 0)
-            if record.deleted:
-                continue
-            if new_database.page_size(page) >= RECORD_SIZE * BLOCKING_FACTOR * ALPHA:
-                new_database.write_page(current_page_index, page)
-                current_page_index += 1
-                page = b""
-                new_index_file.add_index(record.key, current_page_index)
-            new_record = copy.deepcopy(record)
-            new_record.add_overflow((-1, -1))
-            page += new_record.to_bytes()
-            num += 1
-        new_database.write_page(current_page_index, page)
-
-        for old_path in old_paths:
-            os.remove(old_path)
-        for i, new_path in enumerate(new_paths):
-            os.rename(new_path, old_paths[i])
-        new_database.path = old_paths[0]
-        new_database.overflow.path = old_paths[1]
-        new_index_file.path = old_paths[2]
+        new_paths = [reorganized_path(old_path) for old_path in old_paths]
+
+        new_database, new_index_file = Database(new_paths[0], new_paths[1], initialize=False, config=self.config), create_index_file(new_paths[2], config=self.config)
+        new_database.use_tracer(self.tracer)
+        new_index_file.tracer = self.tracer
+        alpha = self.reorganization_policy.alpha
+        expected_number_of_pages = None
+        if expected_number_of_records is not None:
+            expected_number_of_pages = math.ceil(expected_number_of_records / (self.config["BLOCKING_FACTOR"] * alpha))
+
+        with trace(self.tracer, "reorganize.page_build", always=True) as span:
+            if span is not None:  # scan of old files runs interleaved with building pages, so only its time is reported
+                records = TimedIterator(records)
+            for page_index, first_key in new_database.load_sorted_records(records, new_database.page_size * alpha, expected_number_of_pages):
+                new_index_file.add_index(first_key, page_index)
+            if span is not None:
+                span.update(scan_us=records.time * 1e6, records=records.items)
         new_database.dummy_record = self.database.dummy_record
         new_database.dummy_record_key = self.database.dummy_record_key
-        new_database.disk_operations = self.database.disk_operations
+        with trace(self.tracer, "reorganize.index_dump", always=True):
+            new_index_file.dump_to_file()
+        return new_database, new_index_file
+
+    @traced("reorganize.swap", always=True)
+    def swap_files(self, new_database: Database, new_index_file: typing.Union[IndexFile, MultiLevelIndex], log_position: int = 0) -> None:
+        """
+        Close current files and atomically move new ones in their place, with write-ahead log new files are synced and
+        their superblock is written next to them first, so that swap interrupted by crash is finished by finish_swap
+        :param new_database: New database built next to current one
+        :param new_index_file: New index built next to current one
+        :param log_position: Number of entries of write-ahead log reflected in new files
+        :return: None
+        """
+        old_paths = self.paths
+        self.database.mark_modified()
+        if self.wal is not None:
+            self.wal.commit()
+            new_database.epoch = self.database.epoch
+            new_database.sync()
+            new_database.write_superblock(log_position, self.wal.epoch)
+            self.database.use_journal(None)  # current files are no longer needed after crash
+            self.index_file.use_journal(None)
+        new_superblock_path = new_database.superblock_path
+        self.database.close()
+        self.index_file.close()
+        new_database.move(old_paths[0], old_paths[1])
+        new_index_file.move(old_paths[2])
+        if self.wal is not None:
+            os.replace(new_superblock_path, superblock_path(old_paths[0]))
+            self.journal.reset(new_database.epoch, old_paths)
+        new_database.counters.absorb(self.database.counters)
+        new_database.buffer_pool.hits += self.database.buffer_pool.hits
+        new_database.buffer_pool.misses += self.database.buffer_pool.misses
         self.database = new_database
         self.index_file = new_index_file
-        if PRINT_DEBUG: print("REORGANIZED!")
-        new_index_file.dump_to_file()
+        self.generation += 1
+        if self.latches is not None:
+            self.use_latches()
+        if self.journal is not None:
+            self.use_journal()
+
+    def flush(self) -> None:
+        """
+        Write back all pages held in buffer pool, commit write-ahead log and save superblock, background reorganization
+        is finished first
+        :return: None
+        """
+        self.finish_background_reorganization(wait=True)
+        self.checkpoint()
+
+    def close(self) -> None:
+        """
+        Write back all pages, save superblock and close files, file can be opened again with open
+        :return: None
+        """
+        self.finish_background_reorganization(wait=True)
+        with self.structure_change():
+            self.checkpoint()
+            if self.wal is not None:
+                self.wal.close()
+                self.journal.close()
+            self.database.close()
+            self.index_file.close()
+        if self.tracer is not None:
+            self.tracer.write()
 
     def print_records(self, only_existing: bool = True) -> None:
         """
@@ -123,4 +793,6 @@ class SeqIndFile:
         :param only_existing: Print only non-deleted records
         :return: None
         """
-        self.database.print_all_records(0, only_existing)
+        self.finish_background_reorganization(wait=True)
+        with self.structure_change():
+            self.database.print_all_records(0, only_existing)
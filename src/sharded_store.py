@@ -0,0 +1,323 @@
+import bisect
+import itertools
+import json
+import math
+import os
+import shutil
+import typing
+from concurrent.futures import ProcessPoolExecutor
+from config import CONFIG, Config
+from record import GradesRecord
+from seq_ind_file import SeqIndFile
+
+SHARD_MAP_FILE = "shards.json"
+
+ShardPaths = typing.Tuple[str, str, str, str]  # database, overflow, index, write-ahead log
+
+
+def shard_paths(directory: str, shard_id: int) -> ShardPaths:
+    """
+    Get paths of files of shard
+    :param directory: Directory of sharded store
+    :param shard_id: Identifier of shard
+    :return: Paths of database, overflow, index and write-ahead log
+    """
+    shard_directory = os.path.join(directory, f"shard_{shard_id}")
+    return tuple(os.path.join(shard_directory, name) for name in ("database.dat", "overflow.dat", "index.dat", "database.wal"))
+
+
+def create_shard(paths: ShardPaths, config: Config) -> SeqIndFile:
+    """
+    Create empty shard, its directory is created if needed
+    :param paths: Paths of files of shard
+    :param config: Settings of shard
+    :return: New shard
+    """
+    os.makedirs(os.path.dirname(paths[0]), exist_ok=True)
+    return SeqIndFile(*paths, config=config)
+
+
+def bulk_load_shard(paths: ShardPaths, config: Config, records: typing.List[GradesRecord]) -> None:
+    """
+    Bulk load records into closed shard, run by worker process
+    :param paths: Paths of files of shard
+    :param config: Settings of shard
+    :param records: Records belonging to shard
+    :return: None
+    """
+    shard = SeqIndFile.open(*paths, config=config)
+    shard.bulk_load(records)
+    shard.close()
+
+
+def scan_shard(paths: ShardPaths, config: Config, start_key: typing.Optional[str], end_key: typing.Optional[str], include_deleted: bool, reverse: bool,
+               limit: typing.Optional[int]) -> typing.List[GradesRecord]:
+    """
+    Scan range of closed shard, run by worker process
+    :param paths: Paths of files of shard
+    :param config: Settings of shard
+    :param start_key: Smallest key, None for no bound
+    :param end_key: Greatest key, None for no bound
+    :param include_deleted: Return deleted records as well
+    :param reverse: Records in descending order of keys
+    :param limit: Maximum number of records, None for no limit
+    :return: Records ordered by key
+    """
+    shard = SeqIndFile.open(*paths, config=config)
+    records = list(shard.scan(start_key, end_key, include_deleted, reverse, limit))
+    shard.close()
+    return records
+
+
+def reorganize_shard(paths: ShardPaths, config: Config) -> None:
+    """
+    Reorganize closed shard, run by worker process
+    :param paths: Paths of files of shard
+    :param config: Settings of shard
+    :return: None
+    """
+    shard = SeqIndFile.open(*paths, config=config)
+    shard.reorganize()
+    shard.close()
+
+
+def split_shard(paths: ShardPaths, config: Config, lower_paths: ShardPaths, upper_paths: ShardPaths) -> typing.Optional[str]:
+    """
+    Copy records of closed shard into two new shards at its median key, run by worker process
+    :param paths: Paths of files of shard
+    :param config: Settings of shards
+    :param lower_paths: Paths of files of shard receiving keys less than median
+    :param upper_paths: Paths of files of shard receiving median and greater keys
+    :return: Median key, None if shard has too few records to be split
+    """
+    shard = SeqIndFile.open(*paths, config=config)
+    keys = [record.key for record in shard.scan()]
+    if len(keys) < 2:
+        shard.close()
+        return None
+    split_key = keys[len(keys) // 2]
+    for new_paths, records in ((lower_paths, shard.scan(end_key=keys[len(keys) // 2 - 1])), (upper_paths, shard.scan(split_key))):
+        new_shard = create_shard(new_paths, config)
+        new_shard.bulk_load(records)
+        new_shard.close()
+    shard.close()
+    return split_key
+
+
+class ShardedSeqIndFile:
+    """Sequential-indexed files each holding a range of keys, point operations are routed to shard of key and whole-shard work runs in worker processes"""
+    def __init__(self, directory: str, number_of_shards: typing.Optional[int] = None, processes: typing.Optional[int] = None, create: bool = True,
+                 config: Config = CONFIG):
+        self.directory = directory
+        self.config = config
+        number_of_shards = number_of_shards if number_of_shards is not None else config["SHARDS"]
+        self.processes = processes if processes is not None else config["SHARD_PROCESSES"]
+        self.pool: typing.Optional[ProcessPoolExecutor] = None
+        if create:
+            width = math.ceil((config["MAX_KEY"] + 1) / number_of_shards)
+            self.first_keys = [str(shard * width).rjust(len(str(config["MAX_KEY"])), "0") for shard in range(number_of_shards)]
+            self.shard_ids = list(range(number_of_shards))
+            self.next_shard_id = number_of_shards
+            os.makedirs(directory, exist_ok=True)
+            self.shards = [create_shard(shard_paths(directory, shard_id), config) for shard_id in self.shard_ids]
+            self.save_shard_map()
+        else:
+            with open(os.path.join(directory, SHARD_MAP_FILE), "r") as shard_map:
+                state = json.load(shard_map)
+            self.first_keys, self.shard_ids, self.next_shard_id = state["first_keys"], state["shard_ids"], state["next_shard_id"]
+            self.shards = [SeqIndFile.open(*shard_paths(directory, shard_id), config=config) for shard_id in self.shard_ids]
+        self.operations = [0] * len(self.shards)  # operations routed to every shard since last rebalance
+
+    @classmethod
+    def open(cls, directory: str, processes: typing.Optional[int] = None, config: Config = CONFIG) -> "ShardedSeqIndFile":
+        """
+        Open existing sharded store
+        :param directory: Directory of sharded store
+        :param processes: Number of worker processes, SHARD_PROCESSES of settings if None
+        :param config: Settings of shards
+        :return: Opened store
+        """
+        return cls(directory, processes=processes, create=False, config=config)
+
+    def save_shard_map(self) -> None:
+        """
+        Atomically save boundaries and identifiers of shards
+        :return: None
+        """
+        path = os.path.join(self.directory, SHARD_MAP_FILE)
+        with open(path + ".tmp", "w") as shard_map:
+            json.dump({"first_keys": self.first_keys, "shard_ids": self.shard_ids, "next_shard_id": self.next_shard_id}, shard_map, indent=4)
+            shard_map.flush()
+            os.fsync(shard_map.fileno())
+        os.replace(path + ".tmp", path)
+
+    def shard_of_key(self, key: str) -> int:
+        """
+        Get position of shard holding key
+        :param key: Key of record
+        :return: Position of shard
+        """
+        return max(bisect.bisect_right(self.first_keys, key) - 1, 0)
+
+    def route(self, key: str) -> SeqIndFile:
+        """
+        Get shard holding key and count operation on it
+        :param key: Key of record
+        :return: Shard of key
+        """
+        position = self.shard_of_key(key)
+        self.operations[position] += 1
+        return self.shards[position]
+
+    def add_record(self, record: GradesRecord) -> None:
+        """
+        Add new record to its shard
+        :param record: Record to be added
+        :return: None
+        """
+        self.route(record.key).add_record(record)
+
+    def add_records(self, records: typing.Iterable[GradesRecord]) -> None:
+        """
+        Add batch of records, every shard receives its records as one batch
+        :param records: Records to be added
+        :return: None
+        """
+        records = sorted(records, key=lambda record: record.key)
+        for position, shard_records in itertools.groupby(records, key=lambda record: self.shard_of_key(record.key)):
+            shard_records = list(shard_records)
+            self.operations[position] += len(shard_records)
+            self.shards[position].add_records(shard_records)
+
+    def get_record(self, key: str) -> typing.Optional[GradesRecord]:
+        """
+        Get record with matching key from its shard
+        :param key: Key of record to be returned
+        :return: Record with matching key, None if there is no such record
+        """
+        return self.route(key).get_record(key)
+
+    def update_record(self, new_record: GradesRecord) -> None:
+        """
+        Update record with key matching to new one in its shard
+        :param new_record: New record to replace the old one with matching key
+        :return: None
+        """
+        self.route(new_record.key).update_record(new_record)
+
+    def delete_record(self, key: str) -> None:
+        """
+        Delete record with matching key from its shard
+        :param key: Key of record to be deleted
+        :return: None
+        """
+        self.route(key).delete_record(key)
+
+    def run_on_shards(self, function: typing.Callable, positions: typing.List[int], arguments: typing.List[tuple]) -> list:
+        """
+        Close shards and run function on each of them in worker processes, shards are opened again afterwards
+        :param function: Function taking paths of files of shard, settings and its arguments
+        :param positions: Positions of shards
+        :param arguments: Further arguments of function for every shard
+        :return: Results of function in order of shards
+        """
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.processes)
+        for position in positions:
+            self.shards[position].close()
+        try:
+            futures = [self.pool.submit(function, shard_paths(self.directory, self.shard_ids[position]), self.config, *shard_arguments)
+                       for position, shard_arguments in zip(positions, arguments)]
+            return [future.result() for future in futures]
+        finally:
+            for position in positions:
+                self.shards[position] = SeqIndFile.open(*shard_paths(self.directory, self.shard_ids[position]), config=self.config)
+
+    def bulk_load(self, records: typing.Iterable[GradesRecord]) -> None:
+        """
+        Add many records at once, records are partitioned by shard and shards are loaded in parallel
+        :param records: Records to be added in any order, for repeated keys the last record is kept
+        :return: None
+        """
+        partitions: typing.Dict[int, typing.List[GradesRecord]] = {}
+        for record in records:
+            partitions.setdefault(self.shard_of_key(record.key), []).append(record)
+        positions = sorted(partitions)
+        self.run_on_shards(bulk_load_shard, positions, [(partitions[position],) for position in positions])
+
+    def scan(self, start_key: typing.Optional[str] = None, end_key: typing.Optional[str] = None, include_deleted: bool = False,
+             reverse: bool = False, limit: typing.Optional[int] = None) -> typing.Generator[GradesRecord, None, None]:
+        """
+        Yield records with keys in range, shards overlapping the range are scanned in parallel
+        :param start_key: Smallest key to yield, None to start at the beginning of store
+        :param end_key: Greatest key to yield, None to go to the end of store
+        :param include_deleted: Yield deleted records as well
+        :param reverse: Yield records in descending order of keys
+        :param limit: Maximum number of records to yield, None for no limit
+        :return: Records ordered by key
+        """
+        if limit is not None and limit <= 0:
+            return
+        first = self.shard_of_key(start_key) if start_key is not None else 0
+        last = self.shard_of_key(end_key) if end_key is not None else len(self.shards) - 1
+        positions = list(range(first, last + 1))
+        results = self.run_on_shards(scan_shard, positions, [(start_key, end_key, include_deleted, reverse, limit)] * len(positions))
+        records = itertools.chain.from_iterable(reversed(results) if reverse else results)
+        yield from itertools.islice(records, limit)
+
+    def reorganize(self) -> None:
+        """
+        Reorganize all shards in parallel
+        :return: None
+        """
+        positions = list(range(len(self.shards)))
+        self.run_on_shards(reorganize_shard, positions, [()] * len(positions))
+
+    def rebalance(self) -> None:
+        """
+        Split shards which received more than SHARD_SPLIT_FACTOR times the mean number of operations since last
+        rebalance at their median key, hot shards are split in parallel
+        :return: None
+        """
+        mean = sum(self.operations) / len(self.operations)
+        hot = [position for position, operations in enumerate(self.operations) if mean and operations > self.config["SHARD_SPLIT_FACTOR"] * mean]
+        if not hot:
+            return
+        new_ids = {position: (self.next_shard_id + 2 * i, self.next_shard_id + 2 * i + 1) for i, position in enumerate(hot)}
+        self.next_shard_id += 2 * len(hot)
+        split_keys = self.run_on_shards(split_shard, hot, [tuple(shard_paths(self.directory, shard_id) for shard_id in new_ids[position]) for position in hot])
+
+        old_ids = []
+        for position, split_key in reversed(list(zip(hot, split_keys))):
+            if split_key is None:
+                continue
+            self.shards[position].close()
+            old_ids.append(self.shard_ids[position])
+            lower_id, upper_id = new_ids[position]
+            self.shard_ids[position:position + 1] = [lower_id, upper_id]
+            self.first_keys[position + 1:position + 1] = [split_key]
+            self.shards[position:position + 1] = [SeqIndFile.open(*shard_paths(self.directory, shard_id), config=self.config) for shard_id in (lower_id, upper_id)]
+        self.save_shard_map()
+        for shard_id in old_ids:
+            shutil.rmtree(os.path.dirname(shard_paths(self.directory, shard_id)[0]))
+        self.operations = [0] * len(self.shards)
+        if self.config["PRINT_DEBUG"]: print(f"SPLIT {len(old_ids)} SHARDS, {len(self.shards)} SHARDS NOW!")
+
+    def flush(self) -> None:
+        """
+        Flush all shards
+        :return: None
+        """
+        for shard in self.shards:
+            shard.flush()
+
+    def close(self) -> None:
+        """
+        Close all shards and stop worker processes
+        :return: None
+        """
+        for shard in self.shards:
+            shard.close()
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
@@ -0,0 +1,130 @@
+import os
+import struct
+import typing
+from array import array
+
+SUPERBLOCK_MAGIC = b"SEQINDSB"
+SUPERBLOCK_HEADER = struct.Struct("<8sBBIIqqqqqqqbqqqqqIIqqq")  # see Superblock.to_bytes for fields
+CLEAN_FLAG_POSITION = 9
+ENTRY_TYPECODE = "q"
+
+
+def superblock_path(database_path: str) -> str:
+    """
+    Get path of superblock of main area file
+    :param database_path: Path of main area file
+    :return: Path of superblock
+    """
+    return os.path.splitext(database_path)[0] + ".meta"
+
+
+class Superblock:
+    """State of file kept in memory while it is open, saved next to main area so that file is reopened without scanning it"""
+    def __init__(self, format_version: int, blocking_factor: int, record_size: int):
+        self.format_version = format_version
+        self.blocking_factor = blocking_factor
+        self.record_size = record_size
+        self.clean = True  # files were not modified since superblock was written
+        self.number_of_records = 0
+        self.page_map = array(ENTRY_TYPECODE)
+        self.free_pages = array(ENTRY_TYPECODE)
+        self.next_physical_page = 0
+        self.overflow_cursor = (0, 0)
+        self.free_slot_head = (-1, -1)
+        self.number_of_free_slots = 0
+        self.buckets: typing.Dict[int, int] = {}
+        self.dummy_record: typing.Optional[bool] = None
+        self.dummy_record_key: typing.Optional[str] = None
+        self.epoch = 0  # number of superblocks written, journal of other epoch does not belong to this one
+        self.log_epoch = 0  # epoch of write-ahead log, entries of log of other epoch are already reflected in files
+        self.log_position = 0  # number of entries of write-ahead log reflected in files
+        self.filter_bits = 0
+        self.filter_hashes = 0
+        self.filters = b""
+
+    def to_bytes(self) -> bytes:
+        dummy_record = -1 if self.dummy_record is None else int(self.dummy_record)
+        dummy_record_key = -1 if self.dummy_record_key is None else int(self.dummy_record_key)
+        header = SUPERBLOCK_HEADER.pack(SUPERBLOCK_MAGIC, self.format_version, self.clean, self.blocking_factor, self.record_size,
+                                        self.number_of_records, self.next_physical_page, *self.overflow_cursor, *self.free_slot_head,
+                                        self.number_of_free_slots, dummy_record, dummy_record_key, self.log_position,
+                                        len(self.page_map), len(self.free_pages), len(self.buckets),
+                                        self.filter_bits, self.filter_hashes, len(self.filters), self.epoch, self.log_epoch)
+        buckets = array(ENTRY_TYPECODE, [entry for bucket in self.buckets.items() for entry in bucket])
+        return header + self.page_map.tobytes() + self.free_pages.tobytes() + buckets.tobytes() + self.filters
+
+    @classmethod
+    def from_bytes(cls, data: bytes, key_length: int) -> "Superblock":
+        """
+        Parse superblock
+        :param data: Superblock in bytes
+        :param key_length: Number of digits of keys
+        :return: Parsed superblock
+        """
+        (magic, format_version, clean, blocking_factor, record_size, number_of_records, next_physical_page, overflow_page,
+         overflow_offset, free_slot_page, free_slot_offset, number_of_free_slots, dummy_record, dummy_record_key, log_position,
+         number_of_pages, number_of_free_pages, number_of_buckets, filter_bits, filter_hashes, filters_size, epoch, log_epoch) = SUPERBLOCK_HEADER.unpack_from(data)
+        if magic != SUPERBLOCK_MAGIC:
+            raise ValueError("File does not start with sequential-indexed file superblock")
+        superblock = cls(format_version, blocking_factor, record_size)
+        superblock.clean = bool(clean)
+        superblock.number_of_records = number_of_records
+        superblock.next_physical_page = next_physical_page
+        superblock.overflow_cursor = (overflow_page, overflow_offset)
+        superblock.free_slot_head = (free_slot_page, free_slot_offset)
+        superblock.number_of_free_slots = number_of_free_slots
+        superblock.dummy_record = None if dummy_record == -1 else bool(dummy_record)
+        superblock.dummy_record_key = None if dummy_record_key == -1 else str(dummy_record_key).rjust(key_length, "0")
+        superblock.epoch, superblock.log_epoch, superblock.log_position = epoch, log_epoch, log_position
+        superblock.filter_bits, superblock.filter_hashes = filter_bits, filter_hashes
+
+        entries = memoryview(data)[SUPERBLOCK_HEADER.size:]
+        entry_size = array(ENTRY_TYPECODE).itemsize
+        arrays_size = (number_of_pages + number_of_free_pages + 2 * number_of_buckets) * entry_size
+        arrays = entries[:arrays_size].cast(ENTRY_TYPECODE)
+        superblock.page_map = array(ENTRY_TYPECODE, arrays[:number_of_pages])
+        superblock.free_pages = array(ENTRY_TYPECODE, arrays[number_of_pages:number_of_pages + number_of_free_pages])
+        buckets = arrays[number_of_pages + number_of_free_pages:]
+        superblock.buckets = dict(zip(buckets[0::2], buckets[1::2]))
+        superblock.filters = bytes(entries[arrays_size:arrays_size + filters_size])
+        return superblock
+
+    def write(self, path: str) -> None:
+        """
+        Atomically replace superblock at path with this one and make it durable
+        :param path: Path of superblock
+        :return: None
+        """
+        with open(path + ".tmp", "wb") as superblock_file:
+            superblock_file.write(self.to_bytes())
+            superblock_file.flush()
+            os.fsync(superblock_file.fileno())
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def read(cls, path: str, key_length: int) -> typing.Optional["Superblock"]:
+        """
+        Read superblock
+        :param path: Path of superblock
+        :param key_length: Number of digits of keys
+        :return: Parsed superblock, None if there is none
+        """
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as superblock_file:
+            return cls.from_bytes(superblock_file.read(), key_length)
+
+    @staticmethod
+    def mark_dirty(path: str) -> None:
+        """
+        Mark superblock as no longer describing files, done before files are first modified after it was written
+        :param path: Path of superblock
+        :return: None
+        """
+        if not os.path.exists(path):
+            return
+        with open(path, "r+b") as superblock_file:
+            superblock_file.seek(CLEAN_FLAG_POSITION)
+            superblock_file.write(b"\0")
+            superblock_file.flush()
+            os.fsync(superblock_file.fileno())
@@ -0,0 +1,92 @@
+import csv
+import itertools
+import json
+import os
+import tempfile
+import time
+import typing
+from concurrent.futures import ProcessPoolExecutor
+from config import CONFIG, Config
+from record import GradesRecord
+from seq_ind_file import SeqIndFile
+
+RESULT_FIELDS = ["alpha", "max_overflow_pages", "disk_operations", "time"]
+
+
+def apply_command(seq_ind_file: SeqIndFile, input_line: typing.List[str]) -> None:
+    """
+    Apply command of experiment data to file
+    :param seq_ind_file: File to apply command to
+    :param input_line: Command letter followed by its arguments
+    :return: None
+    """
+    key_length = len(str(seq_ind_file.config["MAX_KEY"]))
+    if input_line[0] == "R":
+        seq_ind_file.reorganize()
+    elif input_line[0] == "D":
+        seq_ind_file.delete_record(input_line[1].rjust(key_length, "0"))
+    else:
+        record = GradesRecord(input_line[1].rjust(key_length, "0"), int(input_line[2]), [input_line[i] for i in [3, 4, 5]])
+        seq_ind_file.update_record(record) if input_line[0] == "U" else seq_ind_file.add_record(record)
+
+
+def run_point(config: Config, data_source: str) -> typing.Dict[str, typing.Any]:
+    """
+    Replay experiment data into new file in temporary directory of worker, run by worker process
+    :param config: Settings of point of grid
+    :param data_source: Path of experiment data
+    :return: Settings of point with number of disk operations and time of replay
+    """
+    with open(data_source) as input_file:
+        commands = [line.rstrip("\n").split(" ") for line in input_file]
+    with tempfile.TemporaryDirectory(prefix="sweep-") as directory:
+        start = time.time()
+        seq_ind_file = SeqIndFile(*(os.path.join(directory, name) for name in ("database.dat", "overflow.dat", "index_file.dat")), config=config)
+        for input_line in commands:
+            apply_command(seq_ind_file, input_line)
+        seq_ind_file.close()
+        end = time.time()
+    return {"alpha": config["ALPHA"], "max_overflow_pages": config["MAX_OVERFLOW_PAGE_NO"],
+            "disk_operations": seq_ind_file.database.disk_operations, "time": end - start}
+
+
+def sweep(alphas: typing.Iterable[float], max_overflow_pages: typing.Iterable[int], data_source: str,
+          processes: typing.Optional[int] = None, config: Config = CONFIG) -> typing.Iterator[typing.Dict[str, typing.Any]]:
+    """
+    Replay experiment data for every combination of ALPHA and MAX_OVERFLOW_PAGE_NO, points are run in parallel by
+    worker processes each with its own settings and files
+    :param alphas: Values of ALPHA
+    :param max_overflow_pages: Values of MAX_OVERFLOW_PAGE_NO
+    :param data_source: Path of experiment data
+    :param processes: Number of worker processes, number of cores if None
+    :param config: Settings shared by all points
+    :return: Result of every point in order of grid, ALPHA changing slowest
+    """
+    grid = [config.replace(ALPHA=alpha, MAX_OVERFLOW_PAGE_NO=pages) for alpha, pages in itertools.product(alphas, max_overflow_pages)]
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        yield from pool.map(run_point, grid, itertools.repeat(data_source))
+
+
+def save_results(results: typing.List[typing.Dict[str, typing.Any]], path: str) -> None:
+    """
+    Save results of sweep as JSON and CSV
+    :param results: Results of points
+    :param path: Path of results without extension
+    :return: None
+    """
+    with open(path + ".json", "w") as json_results:
+        json.dump(results, json_results, indent=4)
+    with open(path + ".csv", "w", newline="") as csv_results:
+        writer = csv.DictWriter(csv_results, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def load_results(path: str) -> typing.List[typing.Dict[str, typing.Any]]:
+    """
+    Load results of sweep saved as JSON
+    :param path: Path of results without extension
+    :return: Results of points
+    """
+    with open(path + ".json", "r") as json_results:
+        return json.load(json_results)
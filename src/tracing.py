@@ -0,0 +1,172 @@
+import argparse
+import contextlib
+import functools
+import json
+import os
+import random
+import sys
+import threading
+import time
+import typing
+
+MAX_TRACE_EVENTS = 1000000
+
+
+class Tracer:
+    """Recorder of nested spans written as Chrome trace events, whole top-level operations are sampled at once"""
+    def __init__(self, path: str, sample_rate: float = 1.0, max_events: int = MAX_TRACE_EVENTS):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.max_events = max_events
+        self.events: typing.List[typing.Dict[str, typing.Any]] = []
+        self.dropped_events = 0
+        self.thread_names: typing.Dict[int, str] = {}
+        self.local = threading.local()
+        self.random = random.Random()
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+
+    @contextlib.contextmanager
+    def span(self, name: str, always: bool = False, **args: typing.Any) -> typing.Iterator[typing.Dict[str, typing.Any]]:
+        """
+        Record span, nested spans follow sampling decision of top-level span of thread
+        :param name: Name of span
+        :param always: Record span and spans nested in it even though enclosing operation was not sampled
+        :param args: Arguments shown with span
+        :return: Arguments of span, further ones can be added before it ends
+        """
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        sampled = always or (stack[-1] if stack else self.random.random() < self.sample_rate)
+        stack.append(sampled)
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            stack.pop()
+            if sampled:
+                self.add_event(name, start, time.perf_counter(), args)
+
+    def add_event(self, name: str, start: float, end: float, args: typing.Dict[str, typing.Any]) -> None:
+        """
+        Add complete event of span, events past limit are dropped and counted
+        :param name: Name of span
+        :param start: Time at the beginning of span
+        :param end: Time at the end of span
+        :param args: Arguments shown with span
+        :return: None
+        """
+        if len(self.events) >= self.max_events:
+            self.dropped_events += 1
+            return
+        thread = threading.current_thread()
+        if thread.ident not in self.thread_names:
+            self.thread_names[thread.ident] = thread.name
+        event = {"name": name, "ph": "X", "ts": (start - self.origin) * 1e6, "dur": (end - start) * 1e6, "pid": self.pid, "tid": thread.ident}
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    def write(self) -> None:
+        """
+        Write recorded spans as Chrome trace, readable by chrome://tracing and Perfetto
+        :return: None
+        """
+        metadata = [{"name": "thread_name", "ph": "M", "pid": self.pid, "tid": ident, "args": {"name": name}} for ident, name in self.thread_names.items()]
+        with open(self.path, "w") as trace:
+            json.dump({"traceEvents": metadata + self.events, "displayTimeUnit": "ms",
+                       "otherData": {"sample_rate": self.sample_rate, "dropped_events": self.dropped_events}}, trace)
+
+
+class TimedIterator:
+    """Iterator measuring time spent producing its items, used where producing and consuming are interleaved"""
+    def __init__(self, iterable: typing.Iterable):
+        self.iterator = iter(iterable)
+        self.time = 0.0
+        self.items = 0
+
+    def __iter__(self) -> "TimedIterator":
+        return self
+
+    def __next__(self) -> typing.Any:
+        start = time.perf_counter()
+        try:
+            item = next(self.iterator)
+        finally:
+            self.time += time.perf_counter() - start
+        self.items += 1
+        return item
+
+
+def trace(tracer: typing.Optional[Tracer], name: str, always: bool = False, **args: typing.Any) -> typing.ContextManager:
+    """
+    Record span if tracing is enabled
+    :param tracer: Tracer, None if tracing is disabled
+    :param name: Name of span
+    :param always: Record span even though enclosing operation was not sampled
+    :param args: Arguments shown with span
+    :return: Context of span, its value are arguments of span or None if tracing is disabled
+    """
+    return tracer.span(name, always, **args) if tracer is not None else contextlib.nullcontext()
+
+
+def traced(name: str, always: bool = False) -> typing.Callable:
+    """
+    Decorate method of object with tracer, so that its every call is recorded as span
+    :param name: Name of span
+    :param always: Record span even though enclosing operation was not sampled
+    :return: Decorator
+    """
+    def decorator(method: typing.Callable) -> typing.Callable:
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.tracer is None:
+                return method(self, *args, **kwargs)
+            with self.tracer.span(name, always):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def summarize(trace_path: str, top: int = 20) -> typing.List[typing.Dict[str, typing.Any]]:
+    """
+    Sum time of spans of trace by name, self time excludes spans nested in them in the same thread
+    :param trace_path: Path of Chrome trace
+    :param top: Number of names to return
+    :return: Count, total, self and maximum time in microseconds of names with greatest self time
+    """
+    with open(trace_path, "r") as trace_file:
+        events = [event for event in json.load(trace_file)["traceEvents"] if event.get("ph") == "X"]
+    summary: typing.Dict[str, typing.Dict[str, typing.Any]] = {}
+    events.sort(key=lambda event: (event["tid"], event["ts"], -event["dur"]))
+    stack: typing.List[typing.Dict[str, typing.Any]] = []
+    for event in events:
+        while stack and (stack[-1]["tid"] != event["tid"] or stack[-1]["ts"] + stack[-1]["dur"] <= event["ts"]):
+            stack.pop()
+        if stack:
+            summary[stack[-1]["name"]]["self"] -= event["dur"]
+        entry = summary.setdefault(event["name"], {"name": event["name"], "count": 0, "total": 0.0, "self": 0.0, "max": 0.0})
+        entry["count"] += 1
+        entry["total"] += event["dur"]
+        entry["self"] += event["dur"]
+        entry["max"] = max(entry["max"], event["dur"])
+        stack.append(event)
+    return sorted(summary.values(), key=lambda entry: entry["self"], reverse=True)[:top]
+
+
+def main(arguments: typing.Optional[typing.List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Summarize hottest spans of Chrome trace of sequential-indexed file")
+    parser.add_argument("trace", help="path of trace")
+    parser.add_argument("--top", type=int, default=20, help="number of spans to show")
+    arguments = parser.parse_args(arguments)
+
+    print(f"{'SPAN':<28} {'COUNT':>9} {'TOTAL MS':>11} {'SELF MS':>11} {'MEAN US':>10} {'MAX US':>10}")
+    for entry in summarize(arguments.trace, arguments.top):
+        print(f"{entry['name']:<28} {entry['count']:>9} {entry['total'] / 1e3:>11.2f} {entry['self'] / 1e3:>11.2f} "
+              f"{entry['total'] / entry['count']:>10.1f} {entry['max']:>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
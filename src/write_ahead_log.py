@@ -0,0 +1,153 @@
+import os
+import struct
+import threading
+import time
+import typing
+import zlib
+from record import GradesRecord, BinaryRecordCodec
+
+WAL_HEADER = struct.Struct("<8sq")  # magic, epoch
+WAL_MAGIC = b"SEQINDWL"
+WAL_ENTRY = struct.Struct("<BII")  # operation, length of payload, crc32 of payload
+OPERATION_ADD = 1
+OPERATION_UPDATE = 2
+OPERATION_DELETE = 3
+
+
+class WriteAheadLog:
+    """Log of changes to file written before the changes are applied to pages, many changes are made durable by one fsync"""
+    def __init__(self, path: str, commit_interval: float, commit_size: int, key_length: int, create: bool = True, epoch: int = 0):
+        self.path = path
+        self.commit_interval = commit_interval
+        self.commit_size = commit_size
+        self.codec = BinaryRecordCodec(key_length)
+        self.pending = bytearray()
+        self.pending_entries = 0
+        self.lock = threading.Lock()  # guards pending entries shared with commit timer
+        self.timer: typing.Optional[threading.Timer] = None
+        self.last_commit = time.monotonic()
+        self.commits = 0
+        self.logged_entries = 0
+        self.position = 0  # number of entries in log
+        self.epoch = epoch  # changed whenever log is truncated by checkpoint
+        if not create:
+            header = b""
+            if os.path.exists(path):
+                with open(path, "rb") as log:
+                    header = log.read(WAL_HEADER.size)
+            if len(header) == WAL_HEADER.size and header.startswith(WAL_MAGIC):
+                _, self.epoch = WAL_HEADER.unpack(header)
+            else:  # log without complete header has no committed entries, it is started again with epoch matching no superblock
+                create, self.epoch = True, -1
+        self.file = open(path, "wb" if create else "ab")
+        if create:
+            self.write_header()
+
+    def write_header(self) -> None:
+        """
+        Write header of empty log and make it durable
+        :return: None
+        """
+        self.file.write(WAL_HEADER.pack(WAL_MAGIC, self.epoch))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def entries(self) -> typing.Generator[typing.Tuple[int, typing.Union[GradesRecord, str]], None, None]:
+        """
+        Yield committed entries of log, log is cut after the last complete entry so that a torn write is dropped
+        :return: Operation and record or key of deleted record
+        """
+        with open(self.path, "rb") as log:
+            data = log.read()
+        position = WAL_HEADER.size
+        while position + WAL_ENTRY.size <= len(data):
+            operation, length, checksum = WAL_ENTRY.unpack_from(data, position)
+            payload = data[position + WAL_ENTRY.size:position + WAL_ENTRY.size + length]
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                break
+            position += WAL_ENTRY.size + length
+            self.position += 1
+            yield operation, self.decode(operation, payload)
+        if position < len(data):
+            self.file.truncate(position)
+
+    def decode(self, operation: int, payload: bytes) -> typing.Union[GradesRecord, str]:
+        """
+        Decode payload of entry
+        :param operation: Operation of entry
+        :param payload: Payload in bytes
+        :return: Record or key of deleted record
+        """
+        if operation == OPERATION_DELETE:
+            return payload.decode()
+        record = self.codec.decode_at(payload, 0)
+        record.add_overflow((-1, -1))
+        return record
+
+    def append(self, operation: int, record: typing.Union[GradesRecord, str]) -> None:
+        """
+        Append entry to log, it is committed together with other entries once enough of them are pending or commit
+        interval passed
+        :param operation: Operation of entry
+        :param record: Record or key of deleted record
+        :return: None
+        """
+        if operation == OPERATION_DELETE:
+            payload = record.encode()
+        else:
+            payload = self.codec.encode(record)
+        with self.lock:
+            self.pending += WAL_ENTRY.pack(operation, len(payload), zlib.crc32(payload)) + payload
+            self.pending_entries += 1
+            self.logged_entries += 1
+            self.position += 1
+            due = self.pending_entries >= self.commit_size or time.monotonic() - self.last_commit >= self.commit_interval
+            if not due and self.timer is None:
+                self.timer = threading.Timer(self.commit_interval, self.commit)
+                self.timer.daemon = True
+                self.timer.start()
+        if due:
+            self.commit()
+
+    def commit(self) -> None:
+        """
+        Write pending entries and make them durable with a single fsync
+        :return: None
+        """
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            self.last_commit = time.monotonic()
+            if not self.pending_entries:
+                return
+            self.file.write(self.pending)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.pending.clear()
+            self.pending_entries = 0
+            self.commits += 1
+
+    def reset(self, epoch: int) -> None:
+        """
+        Truncate log once its entries are reflected in files of checkpoint, pending entries have to be committed first
+        :param epoch: New epoch of log, saved as log epoch in superblock of checkpoint
+        :return: None
+        """
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            self.file.seek(0)
+            self.file.truncate()
+            self.epoch = epoch
+            self.write_header()
+            self.position = 0
+
+    def close(self) -> None:
+        """
+        Commit pending entries and close log
+        :return: None
+        """
+        self.commit()
+        self.file.close()